@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.config import SEARCH_MAX_CONCURRENT, SEARCH_MAX_QUEUE, SEARCH_DEGRADE_QUEUE_DEPTH
+from app.metrics import SEARCH_QUEUE_DEPTH, SEARCH_REJECTED
+
+# Set when the current request was served with degraded settings, read by the route
+search_degraded: contextvars.ContextVar[bool] = contextvars.ContextVar("search_degraded", default=False)
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. FAISS CPU indexes are not safe to search while add()
+    reallocates their storage, so searches hold the read side and index updates the
+    write side. A waiting writer blocks new readers, so steady search load cannot starve an add.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class AdmissionController:
+    """
+    Bounds concurrent searches and the queue in front of them.
+    Work runs in a thread pool so the event loop keeps accepting (and shedding)
+    requests while models run. A full queue is rejected at once with 503; a
+    request whose deadline passes while queued gets 503, and while running 504.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = SEARCH_MAX_CONCURRENT,
+        max_queue: int = SEARCH_MAX_QUEUE,
+        degrade_queue_depth: int = SEARCH_DEGRADE_QUEUE_DEPTH,
+    ):
+        self.max_queue = max_queue
+        self.degrade_queue_depth = degrade_queue_depth
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="search")
+
+    @property
+    def overloaded(self) -> bool:
+        return self.waiting >= self.degrade_queue_depth
+
+    def _reject(self, reason: str, status_code: int, detail: str):
+        SEARCH_REJECTED.labels(reason).inc()
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": "1"})
+
+    async def run(self, deadline: Deadline, fn, *args):
+        """
+        Wait for a slot, then run fn(*args) in the search thread pool within the deadline.
+        """
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full", 503, "Search service is overloaded, try again")
+
+        self.waiting += 1
+        SEARCH_QUEUE_DEPTH.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline.remaining())
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout", 503, "Search deadline expired while queued")
+        finally:
+            self.waiting -= 1
+            SEARCH_QUEUE_DEPTH.dec()
+
+        # The slot is held until the work really finishes, even if we answer 504 earlier,
+        # so abandoned searches still count against the concurrency bound
+        ctx = contextvars.copy_context()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, ctx.run, fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline.remaining())
+        except asyncio.TimeoutError:
+            self._reject("deadline_exceeded", 504, "Search deadline exceeded")
@@ -0,0 +1,27 @@
+from typing import List
+from PIL import Image, ImageOps
+
+CROP_FRACTION = 0.85
+ROTATION_DEGREES = 8
+
+def _center_crop(image: Image.Image, fraction: float) -> Image.Image:
+    width, height = image.size
+    crop_w, crop_h = int(width * fraction), int(height * fraction)
+    left, top = (width - crop_w) // 2, (height - crop_h) // 2
+    return image.crop((left, top, left + crop_w, top + crop_h))
+
+def augmented_views(image: Image.Image) -> List[Image.Image]:
+    """
+    Query views for test-time augmentation: the original image plus flipped,
+    slightly rotated, center-cropped and grayscale copies, all in RGB.
+    """
+    image = image.convert("RGB")
+    fill = (255, 255, 255)  # catalog shots are on white backgrounds
+    return [
+        image,
+        ImageOps.mirror(image),
+        image.rotate(ROTATION_DEGREES, resample=Image.BICUBIC, fillcolor=fill),
+        image.rotate(-ROTATION_DEGREES, resample=Image.BICUBIC, fillcolor=fill),
+        _center_crop(image, CROP_FRACTION),
+        ImageOps.grayscale(image).convert("RGB"),
+    ]
@@ -0,0 +1,107 @@
+from typing import Optional, Tuple
+import faiss
+import numpy as np
+
+
+def train_itq(vectors: np.ndarray, iterations: int = 50, seed: int = 0) -> np.ndarray:
+    """
+    Iterative Quantization (Gong & Lazebnik): an orthogonal rotation R minimizing
+    ||sign(VR) - VR||, so the sign bits lose less of the geometry than with raw axes.
+    vectors should already be centered.
+    """
+    rng = np.random.default_rng(seed)
+    dim = vectors.shape[1]
+    rotation, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    for _ in range(iterations):
+        codes = np.sign(vectors @ rotation)
+        # Orthogonal Procrustes: R = U W^T for the SVD of V^T B
+        u, _, wt = np.linalg.svd(vectors.T @ codes)
+        rotation = u @ wt
+    return rotation.astype("float32")
+
+
+class BinaryQuantizer:
+    """
+    Float embeddings -> packed sign bits, one bit per dimension, after optional centering
+    and rotation ("sign" uses neither rotation nor centering, "itq" learns both).
+    """
+    def __init__(self, mean: Optional[np.ndarray] = None, rotation: Optional[np.ndarray] = None):
+        self.mean = mean
+        self.rotation = rotation
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, method: str = "sign", iterations: int = 50) -> "BinaryQuantizer":
+        if method == "sign":
+            return cls()
+        if method == "itq":
+            mean = vectors.mean(axis=0).astype("float32")
+            return cls(mean, train_itq(vectors - mean, iterations))
+        raise ValueError(f"Unknown binary quantizer: {method}")
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype="float32")
+        vectors = vectors.reshape(-1, vectors.shape[-1])
+        if self.mean is not None:
+            vectors = vectors - self.mean
+        if self.rotation is not None:
+            vectors = vectors @ self.rotation
+        return np.packbits(vectors > 0, axis=1)
+
+    def save(self, path: str):
+        arrays = {}
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+        if self.rotation is not None:
+            arrays["rotation"] = self.rotation
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "BinaryQuantizer":
+        with np.load(path) as data:
+            return cls(data["mean"] if "mean" in data else None, data["rotation"] if "rotation" in data else None)
+
+
+class BinaryCoarseIndex:
+    """
+    FAISS binary index (Hamming distance on packed sign bits) behind the float Index
+    interface used by app.search.search: float queries are encoded on the way in,
+    and scores come back as negated Hamming distances so that higher is better.
+    32x smaller than IndexFlatIP; meant as the candidate stage of TwoStageFaissSearch.
+    Saved as {path} (faiss binary index) and {path}.quantizer.npz.
+    """
+    def __init__(self, index: faiss.IndexBinary, quantizer: BinaryQuantizer):
+        self.index = index
+        self.quantizer = quantizer
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, quantizer: BinaryQuantizer, hnsw_m: int = 0, batch_size: int = 65536) -> "BinaryCoarseIndex":
+        dim_bits = vectors.shape[1]
+        index = faiss.IndexBinaryHNSW(dim_bits, hnsw_m) if hnsw_m else faiss.IndexBinaryFlat(dim_bits)
+        binary = cls(index, quantizer)
+        for start in range(0, len(vectors), batch_size):
+            binary.add(np.asarray(vectors[start:start + batch_size]))
+        return binary
+
+    def add(self, vectors: np.ndarray):
+        self.index.add(self.quantizer.encode(vectors))
+
+    def search(self, queries: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        distances, labels = self.index.search(self.quantizer.encode(queries), k)
+        return -distances.astype("float32"), labels
+
+    def save(self, path: str):
+        faiss.write_index_binary(self.index, path)
+        self.quantizer.save(path + ".quantizer.npz")
+
+    @classmethod
+    def load(cls, path: str) -> "BinaryCoarseIndex":
+        return cls(faiss.read_index_binary(path), BinaryQuantizer.load(path + ".quantizer.npz"))
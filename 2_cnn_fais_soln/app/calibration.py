@@ -0,0 +1,183 @@
+import contextvars
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+
+CALIBRATION_SUFFIX = ".calib.json"
+
+# Target time for the FAISS stage of the current request; None searches with the index defaults
+latency_budget_ms: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("latency_budget_ms", default=None)
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def search_knob(index: faiss.Index) -> Optional[str]:
+    """
+    Name of the speed/recall parameter of an index: "nprobe" (IVF), "efSearch" (HNSW) or None (exhaustive).
+    """
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexIVF):
+        return "nprobe"
+    if isinstance(index, faiss.IndexHNSW):
+        return "efSearch"
+    return None
+
+
+def default_knob_values(index: faiss.Index) -> List[int]:
+    knob = search_knob(index)
+    if knob == "nprobe":
+        nlist = _unwrap(index).nlist
+        return [v for v in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512) if v <= nlist]
+    if knob == "efSearch":
+        return [16, 32, 64, 128, 256, 512]
+    return []
+
+
+def search_parameters(index: faiss.Index, value: int) -> Optional[faiss.SearchParameters]:
+    """
+    Per-call search parameters setting the index's knob to value. Unlike setting
+    nprobe/efSearch on the index, this is safe with concurrent searches.
+    """
+    knob = search_knob(index)
+    if knob == "nprobe":
+        params = faiss.SearchParametersIVF(nprobe=int(value))
+    elif knob == "efSearch":
+        params = faiss.SearchParametersHNSW(efSearch=int(value))
+    else:
+        return None
+    if isinstance(faiss.downcast_index(index), faiss.IndexPreTransform):
+        wrapper = faiss.SearchParametersPreTransform()
+        wrapper.index_params = params
+        wrapper.referenced_objects = [params]  # keep the inner parameters alive
+        return wrapper
+    return params
+
+
+class SearchCalibration:
+    """
+    Measured recall/latency of an index for each value of its knob,
+    used to pick the most accurate setting that fits a latency budget.
+    """
+    def __init__(self, knob: str, top_k: int, ntotal: int, points: List[dict], created_at: float = None):
+        self.knob = knob
+        self.top_k = top_k
+        self.ntotal = ntotal
+        self.points = sorted(points, key=lambda p: p["p95_ms"])
+        self.created_at = created_at or time.time()
+
+    def choose(self, budget_ms: float) -> dict:
+        """
+        Highest-recall point whose p95 latency fits the budget, or the fastest point if none does.
+        """
+        fitting = [p for p in self.points if p["p95_ms"] <= budget_ms]
+        if not fitting:
+            return self.points[0]
+        return max(fitting, key=lambda p: (p["recall"], -p["p95_ms"]))
+
+    def to_dict(self) -> dict:
+        return {
+            "knob": self.knob,
+            "top_k": self.top_k,
+            "ntotal": self.ntotal,
+            "created_at": self.created_at,
+            "points": self.points,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SearchCalibration":
+        return cls(data["knob"], data["top_k"], data["ntotal"], data["points"], data.get("created_at"))
+
+
+def calibrate(
+    index: faiss.Index,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    top_k: int = 10,
+    values: Sequence[int] = None,
+) -> Optional[SearchCalibration]:
+    """
+    Measure recall@top_k against ground_truth (exact neighbour ids, one row per query)
+    and single-query latency percentiles for each knob value.
+    Returns None for indexes without a knob.
+    """
+    knob = search_knob(index)
+    if knob is None:
+        return None
+    points = []
+    for value in values or default_knob_values(index):
+        params = search_parameters(index, value)
+        index.search(queries[:1], top_k, params=params)  # warm-up
+        timings = []
+        found = np.empty((len(queries), top_k), dtype="int64")
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            _, found[i:i + 1] = index.search(query.reshape(1, -1), top_k, params=params)
+            timings.append((time.perf_counter() - start) * 1000)
+        hits = sum(len(set(e) & set(f)) for e, f in zip(ground_truth[:, :top_k].tolist(), found.tolist()))
+        points.append({
+            "value": int(value),
+            "recall": round(hits / ground_truth[:, :top_k].size, 4),
+            "p50_ms": round(float(np.percentile(timings, 50)), 4),
+            "p95_ms": round(float(np.percentile(timings, 95)), 4),
+        })
+    return SearchCalibration(knob, top_k, index.ntotal, points)
+
+
+def calibration_path(index_path: str) -> str:
+    return index_path + CALIBRATION_SUFFIX
+
+
+def save_calibration(calibration: SearchCalibration, index_path: str):
+    with open(calibration_path(index_path), "w") as f:
+        json.dump(calibration.to_dict(), f, indent=2)
+
+
+def load_calibration(index_path: str) -> Optional[SearchCalibration]:
+    path = calibration_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return SearchCalibration.from_dict(json.load(f))
+
+
+# Calibrations of the loaded indexes, keyed by id() since faiss indexes are not hashable by value
+_calibrations: Dict[int, SearchCalibration] = {}
+
+
+def register_calibration(index: faiss.Index, calibration: SearchCalibration):
+    _calibrations[id(index)] = calibration
+
+
+def unregister_calibration(index: faiss.Index):
+    # Before an index is dropped, so a later object reusing its id() does not inherit the table
+    _calibrations.pop(id(index), None)
+
+
+def apply_calibration(index: faiss.Index, calibration: SearchCalibration, budget_ms: float = None) -> dict:
+    """
+    Set the knob of index itself to the point chosen for budget_ms (the highest-recall one without
+    a budget), for offline jobs that search the index directly. Returns the chosen point.
+    """
+    point = calibration.choose(budget_ms) if budget_ms else max(calibration.points, key=lambda p: p["recall"])
+    faiss.ParameterSpace().set_index_parameter(index, calibration.knob, point["value"])
+    return point
+
+
+def params_for_budget(index: faiss.Index) -> Optional[faiss.SearchParameters]:
+    """
+    Search parameters for index under the current request's latency budget,
+    or None (index defaults) without a budget or a calibration.
+    """
+    budget = latency_budget_ms.get()
+    calibration = _calibrations.get(id(index))
+    if budget is None or calibration is None:
+        return None
+    return search_parameters(index, calibration.choose(budget)["value"])
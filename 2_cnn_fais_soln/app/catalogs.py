@@ -0,0 +1,182 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.model import extract_embedding, extract_clip_embedding, extract_embeddings_batch, extract_clip_embeddings_batch
+from app.search import load_index, search
+from app.calibration import load_calibration, register_calibration, unregister_calibration
+from app.index_info import index_bytes
+from app.services.cnn_faiss import CNNFaissSearch
+from app.services.clip_faiss import CLIPFaissSearch
+from app.controllers.search_controller import SearchController
+from app.controllers.products_controller import ProductsController
+from app.controllers.add_controller import AddController
+from app.admission import AdmissionController, ReadWriteLock
+from app.db.mongo import CatalogCollections
+from app.metrics import CATALOG_EVENTS
+from app.config import MONGO_DB_NAME, CATALOG_MEMORY_BUDGET_BYTES
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class Catalog:
+    """
+    The controllers serving one catalog, and what the registry needs to evict it.
+    """
+    def __init__(self, name: str, search_controller: SearchController, products_controller: ProductsController,
+                 add_controller: AddController, images_folder: str, nbytes: int = 0, indexes: List = ()):
+        self.name = name
+        self.search_controller = search_controller
+        self.products_controller = products_controller
+        self.add_controller = add_controller
+        self.images_folder = images_folder
+        self.nbytes = nbytes
+        self.indexes = list(indexes)
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+    def refresh_nbytes(self):
+        # Adds grow the indexes, so the memory budget is checked against their current size
+        if self.indexes:
+            self.nbytes = sum(index_bytes(loaded_index) for loaded_index in self.indexes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "bytes": self.nbytes,
+            "vectors": {"cnn": self.add_controller.faiss_cnn_index.ntotal, "clip": self.add_controller.faiss_clip_index.ntotal},
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+        }
+
+
+def load_catalog(root: str, name: str, admission: AdmissionController, latency_budget_ms: float = None) -> Catalog:
+    """
+    A named catalog from root/<name>: cnn.index and clip.index (with their calibration sidecars)
+    and images/, with its metadata in the Mongo database <MONGO_DB_NAME>_<name>.
+    Named catalogs serve cnn_faiss and clip_faiss searches, products and adds; the optional
+    structures of the default catalog (PQ/binary stages, geometric re-rank, text search,
+    perceptual hashes, thumbnails, product cache) are not loaded for them.
+    """
+    folder = os.path.join(root, name)
+    cnn_path, clip_path = os.path.join(folder, "cnn.index"), os.path.join(folder, "clip.index")
+    cnn_index, clip_index = load_index(cnn_path), load_index(clip_path)
+    for loaded_index, index_path in [(cnn_index, cnn_path), (clip_index, clip_path)]:
+        calibration = load_calibration(index_path)
+        if calibration is not None:
+            register_calibration(loaded_index, calibration)
+
+    collections = CatalogCollections(f"{MONGO_DB_NAME}_{name}")
+    images_folder = os.path.join(folder, "images")
+    index_lock = ReadWriteLock()
+    search_controller = SearchController(
+        CNNFaissSearch(cnn_index, extract_embedding, search, extract_embeddings_batch, collections.embedding_cnn_faiss_metadata_col),
+        CLIPFaissSearch(clip_index, extract_clip_embedding, search, extract_clip_embeddings_batch, collections.embedding_clip_faiss_metadata_col),
+        admission=admission,
+        latency_budget_ms=latency_budget_ms,
+        index_lock=index_lock,
+    )
+    products_controller = ProductsController(None, collections.products_col, collections.embedding_cnn_faiss_metadata_col)
+    add_controller = AddController(
+        cnn_index,
+        clip_index,
+        collections=collections,
+        images_folder=images_folder,
+        faiss_cnn_index_path=cnn_path,
+        faiss_clip_index_path=clip_path,
+        index_labels=(f"{name}/cnn", f"{name}/clip"),
+        thumbnails_folder=None,
+        index_lock=index_lock,
+    )
+    catalog = Catalog(name, search_controller, products_controller, add_controller, images_folder,
+                      index_bytes(cnn_index) + index_bytes(clip_index), [cnn_index, clip_index])
+    add_controller.on_publish = catalog.refresh_nbytes
+    return catalog
+
+
+class CatalogRegistry:
+    """
+    The default catalog (always loaded) and named catalogs under root, loaded on first use.
+    Loaded named catalogs are kept while their indexes fit in memory_budget bytes; past that the
+    least recently used ones are dropped. A catalog in the middle of an add is never dropped, and
+    since every add is saved before it returns, a reload picks up where it left off.
+    Searches already holding an evicted catalog finish on it.
+    """
+    def __init__(self, default: Catalog, root: Optional[str], admission: AdmissionController,
+                 latency_budget_ms: float = None, memory_budget: int = CATALOG_MEMORY_BUDGET_BYTES):
+        self.default = default
+        self.root = root
+        self.admission = admission
+        self.latency_budget_ms = latency_budget_ms
+        self.memory_budget = memory_budget
+        self.loaded: Dict[str, Catalog] = OrderedDict()  # least recently used first
+        self._load_lock = threading.Lock()  # one catalog load at a time
+        self._lru_lock = threading.Lock()  # held briefly, also from the event loop
+
+    def names(self) -> List[str]:
+        names = [self.default.name]
+        if self.root and os.path.isdir(self.root):
+            names += sorted(
+                entry for entry in os.listdir(self.root)
+                if CATALOG_NAME_PATTERN.match(entry) and os.path.exists(os.path.join(self.root, entry, "cnn.index"))
+            )
+        return names
+
+    async def get(self, name: Optional[str] = None) -> Catalog:
+        """
+        The catalog called name (the default one when empty), loading it off the event loop if needed.
+        """
+        if not name or name == self.default.name:
+            return self.default
+        with self._lru_lock:
+            catalog = self.loaded.get(name)
+            if catalog is not None:
+                self.loaded.move_to_end(name)
+        if catalog is None:
+            catalog = await run_in_threadpool(self._load, name)
+        catalog.last_used = time.time()
+        return catalog
+
+    def _load(self, name: str) -> Catalog:
+        if not self.root or not CATALOG_NAME_PATTERN.match(name) or not os.path.exists(os.path.join(self.root, name, "cnn.index")):
+            raise HTTPException(status_code=404, detail=f"Unknown catalog: {name}")
+        with self._load_lock:
+            # Concurrent first requests for a catalog load it once
+            with self._lru_lock:
+                catalog = self.loaded.get(name)
+            if catalog is not None:
+                return catalog
+            start_time = time.perf_counter()
+            catalog = load_catalog(self.root, name, self.admission, self.latency_budget_ms)
+            CATALOG_EVENTS.labels(name, "load").inc()
+            logger.info("Loaded catalog %s (%d bytes of indexes) in %.2f s", name, catalog.nbytes, time.perf_counter() - start_time)
+            with self._lru_lock:
+                self.loaded[name] = catalog
+                self._evict(keep=name)
+            return catalog
+
+    def _evict(self, keep: str):
+        # Called with _lru_lock held
+        total = sum(catalog.nbytes for catalog in self.loaded.values())
+        for name in list(self.loaded):
+            if total <= self.memory_budget:
+                break
+            catalog = self.loaded[name]
+            # Taken for good: requests still holding the evicted copy get 409 on add instead of
+            # writing index files a reloaded copy would overwrite
+            if name == keep or not catalog.add_controller.write_lock.acquire(blocking=False):
+                continue
+            catalog.add_controller.evicted = True
+            self.loaded.pop(name)
+            for loaded_index in catalog.indexes:
+                unregister_calibration(loaded_index)
+            total -= catalog.nbytes
+            CATALOG_EVENTS.labels(name, "evict").inc()
+            logger.info("Evicted catalog %s, %d bytes of indexes still loaded", name, total)
@@ -12,8 +12,120 @@ CLIP_FAISS_INDEX_PATH = os.getenv("CLIP_FAISS_INDEX_PATH")
 SHOE_PRODUCT_JSON_PATH=os.getenv("SHOE_PRODUCT_JSON_PATH")
 IMAGE_PATHS_JSON=os.getenv("IMAGE_PATHS_JSON")
 
-FAISS_HYBRID_INDEX_PATH = os.getenv("FAISS_HYBRID_INDEX_PATH")
-EMBEDDING_META_HYBRID_INDEX=os.getenv("EMBEDDING_META_HYBRID_INDEX")
-KMEANS_MODEL_PATH=os.getenv("KMEANS_MODEL_PATH")
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "visual_product_db")
+EMBEDDING_CLIP_FAISS_METADATA_COLLECTION = os.getenv("EMBEDDING_CLIP_FAISS_METADATA_COLLECTION")
 
-EMBEDDING_CLIP_FAISS_METADATA_COLLECTION = os.getenv("EMBEDDING_CLIP_FAISS_METADATA_COLLECTION")
\ No newline at end of file
+# Optional PCA reduction of the 2048-d ResNet embeddings (0 keeps raw vectors)
+CNN_PCA_DIM = int(os.getenv("CNN_PCA_DIM", "0"))
+CNN_PCA_WHITEN = os.getenv("CNN_PCA_WHITEN", "false").lower() == "true"
+
+# Approximate main indexes as faiss index_factory strings (e.g. "IVF1024,Flat", "HNSW32,Flat"); empty keeps exact search
+CNN_INDEX_FACTORY = os.getenv("CNN_INDEX_FACTORY", "")
+CLIP_INDEX_FACTORY = os.getenv("CLIP_INDEX_FACTORY", "")
+# Recall/latency calibration of approximate indexes, and the default FAISS latency budget (0 = index defaults)
+CALIBRATION_QUERIES = int(os.getenv("CALIBRATION_QUERIES", "500"))
+CALIBRATION_TOP_K = int(os.getenv("CALIBRATION_TOP_K", "10"))
+SEARCH_LATENCY_BUDGET_MS = float(os.getenv("SEARCH_LATENCY_BUDGET_MS", "0"))
+
+# Two-stage retrieval: full-precision embedding stores plus compressed PQ indexes
+CNN_EMBEDDINGS_PATH = os.getenv("CNN_EMBEDDINGS_PATH")
+CLIP_EMBEDDINGS_PATH = os.getenv("CLIP_EMBEDDINGS_PATH")
+CNN_PQ_INDEX_PATH = os.getenv("CNN_PQ_INDEX_PATH")
+CLIP_PQ_INDEX_PATH = os.getenv("CLIP_PQ_INDEX_PATH")
+CNN_PQ_M = int(os.getenv("CNN_PQ_M", "64"))
+CLIP_PQ_M = int(os.getenv("CLIP_PQ_M", "32"))
+TWO_STAGE_CANDIDATES = int(os.getenv("TWO_STAGE_CANDIDATES", "200"))
+
+# Binary-quantized first stage (1 bit per dimension) with exact float re-scoring
+CNN_BINARY_INDEX_PATH = os.getenv("CNN_BINARY_INDEX_PATH")
+CLIP_BINARY_INDEX_PATH = os.getenv("CLIP_BINARY_INDEX_PATH")
+BINARY_QUANTIZER = os.getenv("BINARY_QUANTIZER", "itq")  # "sign" or "itq"
+BINARY_HNSW_M = int(os.getenv("BINARY_HNSW_M", "0"))  # 0 = exhaustive IndexBinaryFlat
+BINARY_CANDIDATES = int(os.getenv("BINARY_CANDIDATES", "400"))
+ITQ_ITERATIONS = int(os.getenv("ITQ_ITERATIONS", "50"))
+ITQ_TRAIN_SIZE = int(os.getenv("ITQ_TRAIN_SIZE", "100000"))
+
+# Geometric re-verification with ORB local features
+LOCAL_FEATURES_PATH = os.getenv("LOCAL_FEATURES_PATH")  # file prefix of the local feature store
+GEOMETRIC_CANDIDATES = int(os.getenv("GEOMETRIC_CANDIDATES", "20"))
+GEOMETRIC_MIN_INLIERS = int(os.getenv("GEOMETRIC_MIN_INLIERS", "12"))
+GEOMETRIC_WORKERS = int(os.getenv("GEOMETRIC_WORKERS", "4"))
+
+# Text search: precomputed CLIP embeddings of product names for hybrid ranking
+ITEM_NAME_EMBEDDINGS_PATH = os.getenv("ITEM_NAME_EMBEDDINGS_PATH")
+TEXT_SEARCH_NAME_WEIGHT = float(os.getenv("TEXT_SEARCH_NAME_WEIGHT", "0.3"))
+
+# Resident product catalog cache (0 disables it)
+PRODUCT_CACHE_MAX_SIZE = int(os.getenv("PRODUCT_CACHE_MAX_SIZE", "500000"))
+PRODUCT_CACHE_POLL_SECONDS = float(os.getenv("PRODUCT_CACHE_POLL_SECONDS", "5"))
+
+# Logging: level and format ("json" or "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Admin endpoints and profiling (admin endpoints are disabled without a token)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Shared inference process (python -m app.inference_server); unset keeps models in each worker
+INFERENCE_SOCKET_PATH = os.getenv("INFERENCE_SOCKET_PATH")
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "32"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "10"))
+INFERENCE_FALLBACK = os.getenv("INFERENCE_FALLBACK", "true").lower() == "true"
+
+# Admission control for searches: concurrency, queue bound, deadline and degradation
+SEARCH_MAX_CONCURRENT = int(os.getenv("SEARCH_MAX_CONCURRENT", "4"))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "32"))
+SEARCH_DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS", "2000"))
+SEARCH_DEGRADE_QUEUE_DEPTH = int(os.getenv("SEARCH_DEGRADE_QUEUE_DEPTH", "8"))
+SEARCH_DEGRADED_TOP_K = int(os.getenv("SEARCH_DEGRADED_TOP_K", "5"))
+
+# Near-duplicate detection job (run_duplicates.py)
+DUPLICATE_CNN_THRESHOLD = float(os.getenv("DUPLICATE_CNN_THRESHOLD", "0.95"))
+DUPLICATE_CLIP_THRESHOLD = float(os.getenv("DUPLICATE_CLIP_THRESHOLD", "0.97"))
+DUPLICATE_BLOCK_SIZE = int(os.getenv("DUPLICATE_BLOCK_SIZE", "4096"))
+DUPLICATE_MAX_NEIGHBORS = int(os.getenv("DUPLICATE_MAX_NEIGHBORS", "32"))  # k for indexes without range_search
+DUPLICATE_THREADS = int(os.getenv("DUPLICATE_THREADS", str(os.cpu_count() or 1)))
+DUPLICATE_PAIRS_PATH = os.getenv("DUPLICATE_PAIRS_PATH")  # optional JSON Lines file of all duplicate pairs
+DUPLICATE_CLUSTERS_PATH = os.getenv("DUPLICATE_CLUSTERS_PATH")  # JSON Lines file; unset writes the duplicate_clusters collection
+
+# Thumbnails served from /thumbs: precomputed folder, sizes, and the on-demand LRU disk cache
+THUMBNAILS_FOLDER = os.getenv("THUMBNAILS_FOLDER")  # unset disables /thumbs
+THUMBNAIL_SIZES = [int(s) for s in os.getenv("THUMBNAIL_SIZES", "128,256").split(",") if s.strip()]
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", str(os.cpu_count() or 1)))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+# Perceptual-hash fast path for (near-)exact copies of catalog images; unset path disables it
+PHASH_INDEX_PATH = os.getenv("PHASH_INDEX_PATH")  # file prefix of the hash index
+PHASH_KIND = os.getenv("PHASH_KIND", "phash")  # "phash" or "dhash"
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "4"))  # bits out of 64
+PHASH_FILL_TOP_K = os.getenv("PHASH_FILL_TOP_K", "false").lower() == "true"  # fill hash hits up to top_k with the requested method
+PHASH_WORKERS = int(os.getenv("PHASH_WORKERS", str(os.cpu_count() or 1)))
+
+# Catalog writes: /add_product and bulk ingest jobs share one write lock
+CATALOG_WRITE_LOCK_TIMEOUT_SECONDS = float(os.getenv("CATALOG_WRITE_LOCK_TIMEOUT_SECONDS", "30"))  # then 409
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))  # products embedded per forward pass
+INGEST_KEEP_JOBS = int(os.getenv("INGEST_KEEP_JOBS", "20"))  # finished jobs kept for GET /admin/ingest
+
+# Uploads: size limit, streaming chunk size, decompression-bomb limit and reduced-size query decoding
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 ** 2)))  # per file, larger uploads get 413
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 ** 2)))  # whole request body, checked before parsing
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 ** 2)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))  # width x height, larger images get 400
+QUERY_DECODE_SIZE = int(os.getenv("QUERY_DECODE_SIZE", "448"))  # JPEG queries decode at the smallest scale >= this; 0 = full size
+
+# Named catalogs served next to the default one: CATALOGS_ROOT/<name>/{cnn.index, clip.index, images/},
+# metadata in the Mongo database <MONGO_DB_NAME>_<name>; unset root serves the default catalog only
+CATALOGS_ROOT = os.getenv("CATALOGS_ROOT")
+DEFAULT_CATALOG_NAME = os.getenv("DEFAULT_CATALOG_NAME", "default")
+CATALOG_MEMORY_BUDGET_BYTES = int(os.getenv("CATALOG_MEMORY_BUDGET_BYTES", str(8 * 1024 ** 3)))  # indexes of named catalogs
+
+# Drift monitoring of query embeddings and top-1 scores against the catalog statistics saved at build time
+DRIFT_WINDOW = int(os.getenv("DRIFT_WINDOW", "1000"))  # recent searches per method / model
+DRIFT_RESERVOIR_SIZE = int(os.getenv("DRIFT_RESERVOIR_SIZE", "5000"))  # uniform sample of all searches since startup
+DRIFT_SCORE_DROP = float(os.getenv("DRIFT_SCORE_DROP", "0.05"))  # flag when the recent median top-1 is this far below baseline
+CATALOG_STATS_SAMPLE = int(os.getenv("CATALOG_STATS_SAMPLE", "2000"))  # catalog vectors used as queries for the baseline
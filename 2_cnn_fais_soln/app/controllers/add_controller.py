@@ -1,32 +1,94 @@
 import os
 import string
 import secrets
+import threading
+import numpy as np
 from fastapi import UploadFile, HTTPException
-from PIL import Image
+from starlette.concurrency import run_in_threadpool
 from bson import ObjectId
-from app.model import extract_embedding, extract_clip_embedding
-from app.db.mongo import products_col, embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col
+from app.model import extract_embedding, extract_clip_embedding, extract_text_embeddings_batch
+from app.local_features import extract_local_features
+from app.db.mongo import products_col, embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, catalog_meta_col
+from app.data_loading import transform_product, product_text
+from app.product_cache import bump_products_version
+from app.admission import ReadWriteLock
+from app.metrics import INDEX_VERSION
 from app.search import save_index
-from app.config import SHOE_IMAGES_FOLDER, FAISS_INDEX_PATH, CLIP_FAISS_INDEX_PATH
+from app.thumbnails import generate_thumbnails
+from app.uploads import save_upload, decode_image
+from app.config import (
+    SHOE_IMAGES_FOLDER,
+    FAISS_INDEX_PATH,
+    CLIP_FAISS_INDEX_PATH,
+    CNN_PQ_INDEX_PATH,
+    CLIP_PQ_INDEX_PATH,
+    CNN_BINARY_INDEX_PATH,
+    CLIP_BINARY_INDEX_PATH,
+    THUMBNAILS_FOLDER,
+    THUMBNAIL_SIZES,
+    THUMBNAIL_QUALITY,
+    CATALOG_WRITE_LOCK_TIMEOUT_SECONDS,
+)
 
 class AddController:
     def __init__(
         self,
         faiss_cnn_index, 
-        faiss_clip_index
+        faiss_clip_index,
+        cnn_store=None,
+        clip_store=None,
+        cnn_pq_index=None,
+        clip_pq_index=None,
+        local_feature_store=None,
+        product_cache=None,
+        hash_index=None,
+        cnn_binary_index=None,
+        clip_binary_index=None,
+        item_name_store=None,
+        index_lock: ReadWriteLock = None,
+        collections=None,
+        images_folder: str = SHOE_IMAGES_FOLDER,
+        faiss_cnn_index_path: str = FAISS_INDEX_PATH,
+        faiss_clip_index_path: str = CLIP_FAISS_INDEX_PATH,
+        index_labels=("cnn", "clip"),
+        thumbnails_folder: str = THUMBNAILS_FOLDER,
     ):
         self.faiss_cnn_index = faiss_cnn_index
         self.faiss_clip_index = faiss_clip_index
+        # Optional two-stage structures, kept row-aligned with the main indexes
+        self.cnn_store = cnn_store
+        self.clip_store = clip_store
+        self.cnn_pq_index = cnn_pq_index
+        self.clip_pq_index = clip_pq_index
+        self.local_feature_store = local_feature_store
+        self.product_cache = product_cache
+        self.hash_index = hash_index
+        self.cnn_binary_index = cnn_binary_index
+        self.clip_binary_index = clip_binary_index
+        # KeyedEmbeddingStore of item_name embeddings for hybrid text search
+        self.item_name_store = item_name_store
         self.extract_embedding = extract_embedding
         self.extract_clip_embedding = extract_clip_embedding
         self.save_index = save_index
-        self.images_folder = SHOE_IMAGES_FOLDER  # e.g. "../data/shoe_images"
-        self.products_col = products_col
-        self.embedding_cnn_faiss_metadata_col = embedding_cnn_faiss_metadata_col
-        self.embedding_clip_faiss_metadata_col = embedding_clip_faiss_metadata_col
-        self.faiss_cnn_index_path = FAISS_INDEX_PATH
-        self.faiss_clip_index_path = CLIP_FAISS_INDEX_PATH
+        self.images_folder = images_folder  # e.g. "../data/shoe_images"
+        # A named catalog passes its CatalogCollections; the default catalog uses app.db.mongo's
+        self.products_col = collections.products_col if collections else products_col
+        self.embedding_cnn_faiss_metadata_col = collections.embedding_cnn_faiss_metadata_col if collections else embedding_cnn_faiss_metadata_col
+        self.embedding_clip_faiss_metadata_col = collections.embedding_clip_faiss_metadata_col if collections else embedding_clip_faiss_metadata_col
+        self.catalog_meta_col = collections.catalog_meta_col if collections else catalog_meta_col
+        self.faiss_cnn_index_path = faiss_cnn_index_path
+        self.faiss_clip_index_path = faiss_clip_index_path
+        self.index_labels = index_labels  # faiss_index_version labels
+        self.thumbnails_folder = thumbnails_folder
         self.embedding_metadata = []  # Initialize or load from file if needed
+        # Serializes catalog writers: /add_product calls and bulk ingest jobs (app/ingest.py)
+        self.write_lock = threading.Lock()
+        # Shared with the SearchController reading the same indexes: adds and saves exclude searches
+        self.index_lock = index_lock or ReadWriteLock()
+        # Set by CatalogRegistry when it evicts the catalog, whose write_lock it then keeps
+        self.evicted = False
+        # Called after every publish, e.g. Catalog.refresh_nbytes
+        self.on_publish = None
 
     def _generate_image_id(self, length=7):
         alphabet = string.ascii_uppercase + string.digits
@@ -39,6 +101,32 @@ class AddController:
         item_name: list,
         main_image: UploadFile,
         other_images: list = None,
+    ):
+        if self.evicted:
+            raise self._evicted_error()
+        # Waiting happens in a worker thread so the event loop keeps serving searches
+        if not await run_in_threadpool(self.write_lock.acquire, True, CATALOG_WRITE_LOCK_TIMEOUT_SECONDS):
+            if self.evicted:
+                raise self._evicted_error()
+            raise HTTPException(status_code=409, detail="The catalog is busy with a bulk ingest, try again later",
+                                headers={"Retry-After": "30"})
+        try:
+            return await self._add_product(item_id, product_type, item_name, main_image, other_images)
+        finally:
+            self.write_lock.release()
+
+    def _evicted_error(self) -> HTTPException:
+        # The next request gets the catalog reloaded from the saved files
+        return HTTPException(status_code=409, detail="The catalog was unloaded to free memory, retry the request",
+                             headers={"Retry-After": "1"})
+
+    async def _add_product(
+        self,
+        item_id: str,
+        product_type: list,
+        item_name: list,
+        main_image: UploadFile,
+        other_images: list = None,
     ):
         # Check if item_id already exists in products collection
         if self.products_col.find_one({"item_id": item_id}):
@@ -46,85 +134,56 @@ class AddController:
 
         if not main_image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Main image must be an image")
+        other_images = other_images or []
+        if any(not img_file.content_type.startswith("image/") for img_file in other_images):
+            raise HTTPException(status_code=400, detail="One of the other images is not an image")
 
-        main_image_id = item_id + self._generate_image_id()
-        main_image_path = await self._save_image(main_image, main_image_id)
+        # Every image is saved and decoded before anything is indexed, so a refused upload
+        # (400/413) leaves no FAISS rows or files behind
+        image_ids, image_paths, images = [], [], []
+        try:
+            for upload in [main_image] + other_images:
+                image_id = item_id + self._generate_image_id()
+                path = await self._save_image(upload, image_id)
+                # Opened once, at full size like the catalog images the indexes were built from
+                images.append(self._decode_saved(path))
+                image_ids.append(image_id)
+                image_paths.append(path)
+        except HTTPException:
+            for path in image_paths:
+                os.remove(path)
+            raise
 
-        # Open image once
-        with Image.open(main_image_path) as img:
-            image_rgb = img.convert("RGB")
+        # Extract embeddings
+        emb_cnn = np.stack([self.extract_embedding(image).reshape(-1) for image in images])
+        emb_clip = np.stack([self.extract_clip_embedding(image).reshape(-1) for image in images])
+        local_features = [(image_id, self._extract_local_features(image)) for image_id, image in zip(image_ids, images)]
+        image_hashes = [self._image_hash(image) for image in images]
+        rel_paths = [self._get_relative_image_path(path) for path in image_paths]
 
-            # Extract embeddings
-            main_image_emb_cnn = self.extract_embedding(image_rgb)
-            main_image_emb_clip = self.extract_clip_embedding(image_rgb)
-
-        main_image_rel_path = self._get_relative_image_path(main_image_path)
-
-        # Add embeddings to FAISS indexes and get new indices
-        main_faiss_index_cnn = self.faiss_cnn_index.ntotal
-        self.faiss_cnn_index.add(main_image_emb_cnn.reshape(1, -1))
-
-        main_faiss_index_clip = self.faiss_clip_index.ntotal
-        self.faiss_clip_index.add(main_image_emb_clip.reshape(1, -1))
-
-        # Prepare metadata documents
-        main_image_meta_cnn = {
-            "faiss_index": main_faiss_index_cnn,
-            "image_id": main_image_id,
-            "image_path": main_image_rel_path,
-            "item_id": item_id,
-        }
-        main_image_meta_clip = {
-            "faiss_index": main_faiss_index_clip,
-            "image_id": main_image_id,
-            "image_path": main_image_rel_path,
-            "item_id": item_id,
-        }
+        # Add embeddings to FAISS indexes; the rows of one call are contiguous
+        first_cnn, first_clip = await run_in_threadpool(self._add_embeddings, emb_cnn, emb_clip)
 
-        # --- Other images ---
-        other_image_metas_cnn = []
-        other_image_metas_clip = []
-
-        if other_images:
-            for img_file in other_images:
-                if not img_file.content_type.startswith("image/"):
-                    raise HTTPException(status_code=400, detail="One of the other images is not an image")
-                img_id = item_id + self._generate_image_id()
-                img_path = await self._save_image(img_file, img_id)
-
-                with Image.open(img_path) as img:
-                    image_rgb = img.convert("RGB")
-                    emb_cnn = self.extract_embedding(image_rgb)
-                    emb_clip = self.extract_clip_embedding(image_rgb)
-
-                img_rel_path = self._get_relative_image_path(img_path)
-
-                faiss_index_cnn = self.faiss_cnn_index.ntotal
-                self.faiss_cnn_index.add(emb_cnn.reshape(1, -1))
-
-                faiss_index_clip = self.faiss_clip_index.ntotal
-                self.faiss_clip_index.add(emb_clip.reshape(1, -1))
-
-                other_image_metas_cnn.append({
-                    "faiss_index": faiss_index_cnn,
-                    "image_id": img_id,
-                    "image_path": img_rel_path,
-                    "item_id": item_id,
-                })
-                other_image_metas_clip.append({
-                    "faiss_index": faiss_index_clip,
-                    "image_id": img_id,
-                    "image_path": img_rel_path,
-                    "item_id": item_id,
-                })
+        # Prepare metadata documents, main image first
+        metas_cnn = [
+            {"faiss_index": first_cnn + i, "image_id": image_id, "image_path": rel_path, "item_id": item_id}
+            for i, (image_id, rel_path) in enumerate(zip(image_ids, rel_paths))
+        ]
+        metas_clip = [
+            {"faiss_index": first_clip + i, "image_id": image_id, "image_path": rel_path, "item_id": item_id}
+            for i, (image_id, rel_path) in enumerate(zip(image_ids, rel_paths))
+        ]
+        main_image_id = image_ids[0]
+        other_image_ids = image_ids[1:]
 
         # Insert metadata into MongoDB
-        self.embedding_cnn_faiss_metadata_col.insert_many([main_image_meta_cnn] + other_image_metas_cnn)
-        self.embedding_clip_faiss_metadata_col.insert_many([main_image_meta_clip] + other_image_metas_clip)
+        self.embedding_cnn_faiss_metadata_col.insert_many(metas_cnn)
+        self.embedding_clip_faiss_metadata_col.insert_many(metas_clip)
 
-        # Save updated FAISS indexes
-        self.save_index(self.faiss_cnn_index, self.faiss_cnn_index_path)
-        self.save_index(self.faiss_clip_index, self.faiss_clip_index_path)
+        if self.local_feature_store is not None:
+            self.local_feature_store.append([i for i, _ in local_features], [f for _, f in local_features])
+        if self.hash_index is not None:
+            self.hash_index.append([(m["image_id"], m["item_id"], m["image_path"]) for m in metas_cnn], image_hashes)
 
         # Insert product metadata into MongoDB
         product_doc = {
@@ -132,17 +191,100 @@ class AddController:
             "product_type": product_type,
             "item_name": item_name,
             "main_image_id": main_image_id,
-            "other_image_id": [m["image_id"] for m in other_image_metas_cnn],
+            "other_image_id": other_image_ids,
         }
         self.products_col.insert_one(product_doc)
+        self._add_item_names([product_doc])
+        await run_in_threadpool(self.publish)
+        # Precomputed once the product is live, so the first search hit is served without on-demand rendering
+        for rel_path in rel_paths:
+            self._generate_thumbnails(rel_path)
+        if self.product_cache is not None:
+            self.product_cache.put(transform_product(product_doc, {m["image_id"]: m for m in metas_cnn}))
 
         return {
             "message": "Product added successfully to both CNN and CLIP indexes",
             "item_id": item_id,
             "main_image_id": main_image_id,
-            "other_image_ids": [m["image_id"] for m in other_image_metas_cnn],
+            "other_image_ids": other_image_ids,
         }
 
+    def publish(self):
+        """
+        Persist the updated indexes and tell other workers that the catalog changed.
+        """
+        with self.index_lock.write():
+            self._save_indexes()
+        bump_products_version(self.catalog_meta_col)
+        if self.on_publish is not None:
+            self.on_publish()
+
+    def _save_indexes(self):
+        self.save_index(self.faiss_cnn_index, self.faiss_cnn_index_path)
+        self.save_index(self.faiss_clip_index, self.faiss_clip_index_path)
+        for label in self.index_labels:
+            INDEX_VERSION.labels(label).inc()
+        if self.cnn_pq_index is not None:
+            self.save_index(self.cnn_pq_index, CNN_PQ_INDEX_PATH)
+        if self.clip_pq_index is not None:
+            self.save_index(self.clip_pq_index, CLIP_PQ_INDEX_PATH)
+        if self.cnn_binary_index is not None:
+            self.cnn_binary_index.save(CNN_BINARY_INDEX_PATH)
+        if self.clip_binary_index is not None:
+            self.clip_binary_index.save(CLIP_BINARY_INDEX_PATH)
+
+    def _add_embeddings(self, emb_cnn, emb_clip):
+        """
+        Append the embeddings of one image (1-d) or several (one row each) to every
+        CNN and CLIP structure. Returns the (cnn, clip) faiss_index of the first one.
+        """
+        emb_cnn = emb_cnn.reshape(-1, emb_cnn.shape[-1])
+        emb_clip = emb_clip.reshape(-1, emb_clip.shape[-1])
+        with self.index_lock.write():
+            return self._add_rows(emb_cnn, emb_clip)
+
+    def _add_rows(self, emb_cnn, emb_clip):
+
+        faiss_index_cnn = self.faiss_cnn_index.ntotal
+        self.faiss_cnn_index.add(emb_cnn)
+        if self.cnn_store is not None:
+            self.cnn_store.append(emb_cnn)
+        if self.cnn_pq_index is not None:
+            self.cnn_pq_index.add(emb_cnn)
+        if self.cnn_binary_index is not None:
+            self.cnn_binary_index.add(emb_cnn)
+
+        faiss_index_clip = self.faiss_clip_index.ntotal
+        self.faiss_clip_index.add(emb_clip)
+        if self.clip_store is not None:
+            self.clip_store.append(emb_clip)
+        if self.clip_pq_index is not None:
+            self.clip_pq_index.add(emb_clip)
+        if self.clip_binary_index is not None:
+            self.clip_binary_index.add(emb_clip)
+
+        return faiss_index_cnn, faiss_index_clip
+
+    def _add_item_names(self, product_docs: list):
+        # New products join hybrid text ranking with their own name score instead of 0
+        if self.item_name_store is not None and product_docs:
+            embeddings = extract_text_embeddings_batch([product_text(doc) for doc in product_docs])
+            self.item_name_store.append([doc["item_id"] for doc in product_docs], embeddings)
+
+    def _extract_local_features(self, image):
+        if self.local_feature_store is None:
+            return None
+        return extract_local_features(image)
+
+    def _image_hash(self, image):
+        if self.hash_index is None:
+            return None
+        return self.hash_index.hash(image)
+
+    def _generate_thumbnails(self, image_rel_path: str):
+        if self.thumbnails_folder:
+            generate_thumbnails(image_rel_path, self.images_folder, self.thumbnails_folder, THUMBNAIL_SIZES, THUMBNAIL_QUALITY)
+
     async def _save_image(self, file: UploadFile, image_id: str) -> str:
         ext = os.path.splitext(file.filename)[1]
         filename = f"{image_id}{ext}"
@@ -151,12 +293,19 @@ class AddController:
         os.makedirs(save_dir, exist_ok=True)
         save_path = os.path.join(save_dir, filename)
 
-        contents = await file.read()
-        with open(save_path, "wb") as f:
-            f.write(contents)
+        # Streamed to disk, so a large upload is never held in memory whole
+        await save_upload(file, save_path)
 
         return save_path  # Return absolute path
 
+    def _decode_saved(self, path: str):
+        try:
+            return decode_image(path)
+        except HTTPException:
+            # Not indexed, so the file would only be an orphan
+            os.remove(path)
+            raise
+
     def _get_relative_image_path(self, absolute_path: str) -> str:
         # Return path relative to self.images_folder (e.g. "new/XXXXX.jpg")
         return os.path.relpath(absolute_path, self.images_folder).replace("\\", "/")
@@ -1,21 +1,62 @@
+import logging
 from fastapi import HTTPException
 from typing import Optional, List, Dict
 from app.db.mongo import products_col, embedding_cnn_faiss_metadata_col
+from app.data_loading import transform_product
+from app.product_cache import ProductCache
+
+logger = logging.getLogger(__name__)
 
 class ProductsController:
-    def __init__(self):
-        pass
+    def __init__(self, cache: ProductCache = None, products_col=products_col, embedding_metadata_col=embedding_cnn_faiss_metadata_col):
+        self.cache = cache
+        self.products_col = products_col
+        self.embedding_metadata_col = embedding_metadata_col
 
     async def get_product(self, item_id: str) -> Optional[dict]:
+        if self.cache is not None:
+            cached = self.cache.get(item_id)
+            if cached is not None:
+                return cached
+            # Taken before the read, so an invalidation landing during it keeps the result out of the cache
+            generation = self.cache.generation()
         product = self._fetch_product(item_id)
         image_ids = self._collect_image_ids(product)
         embedding_dict = self._fetch_embedding_metadata(image_ids)
         transformed_product = self._transform_product(product, embedding_dict)
+        if self.cache is not None:
+            self.cache.put(transformed_product, since=generation)
         return transformed_product
 
+    async def get_products(self, item_ids: List[str]) -> List[dict]:
+        """
+        Resolve several products with one $in query for the products and one
+        for their image paths. Unknown item_ids are skipped; order follows item_ids.
+        """
+        found = {}
+        if self.cache is not None:
+            for item_id in item_ids:
+                cached = self.cache.get(item_id)
+                if cached is not None:
+                    found[item_id] = cached
+        missing = [i for i in item_ids if i not in found]
+        generation = self.cache.generation() if self.cache is not None else None
+
+        if missing:
+            products = list(self.products_col.find({"item_id": {"$in": missing}}, {"_id": 0}))
+            image_ids = [img_id for p in products for img_id in self._collect_image_ids(p)]
+            embedding_dict = self._fetch_embedding_metadata(image_ids)
+            for product in products:
+                transformed_product = self._transform_product(product, embedding_dict)
+                found[product["item_id"]] = transformed_product
+                if self.cache is not None:
+                    self.cache.put(transformed_product, since=generation)
+
+        return [found[i] for i in item_ids if i in found]
+
     def _fetch_product(self, item_id: str) -> dict:
-        print("Fetching product with item_id:", item_id)
-        product = products_col.find_one({"item_id": item_id})
+        logger.debug("Fetching product with item_id: %s", item_id)
+        product = self.products_col.find_one({"item_id": item_id})
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         product.pop("_id", None)  # Remove MongoDB internal _id field
@@ -31,26 +72,8 @@ class ProductsController:
         return image_ids
 
     def _fetch_embedding_metadata(self, image_ids: List[str]) -> Dict[str, dict]:
-        embedding_docs = embedding_cnn_faiss_metadata_col.find({"image_id": {"$in": image_ids}})
+        embedding_docs = self.embedding_metadata_col.find({"image_id": {"$in": image_ids}})
         return {doc["image_id"]: doc for doc in embedding_docs}
 
     def _transform_product(self, product: dict, embedding_dict: Dict[str, dict]) -> dict:
-        main_img_id = product.get("main_image_id")
-        main_image = {
-            "image_id": main_img_id,
-            "image_path": embedding_dict.get(main_img_id, {}).get("image_path", "") if main_img_id else ""
-        }
-
-        other_images = []
-        for img_id in product.get("other_image_id", []):
-            img_path = embedding_dict.get(img_id, {}).get("image_path", "")
-            if img_path:
-                other_images.append({"image_id": img_id, "image_path": img_path})
-
-        return {
-            "item_id": product["item_id"],
-            "product_type": product.get("product_type", []),
-            "item_name": product.get("item_name", []),
-            "main_image": main_image,
-            "other_images": other_images,
-        }
+        return transform_product(product, embedding_dict)
@@ -1,25 +1,161 @@
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-import io
+import logging
 from typing import List
 from app.models.search_models import SearchRequest, SearchResultItem
 from app.services.cnn_faiss import CNNFaissSearch
 from app.services.clip_faiss import CLIPFaissSearch
+from app.metrics import current_method, stage_timer, record_cache, SEARCH_DEGRADED
+from app.admission import AdmissionController, Deadline, ReadWriteLock, search_degraded
+from app.profiling import run_profiled
+from app.calibration import latency_budget_ms as latency_budget_var
+from app.uploads import read_upload, decode_image
+from app.config import SEARCH_DEADLINE_MS, SEARCH_DEGRADED_TOP_K, PHASH_MAX_DISTANCE, PHASH_FILL_TOP_K, QUERY_DECODE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Cheaper method to fall back to when the service is overloaded. Only pairs that are cheaper
+# whatever was built; main.py adds cnn_faiss/clip_faiss -> *_two_stage when that really saves work.
+DEGRADED_METHODS = {
+    "cnn_geometric": "cnn_faiss",
+    "clip_geometric": "clip_faiss",
+    "cnn_clip_rerank": "cnn_faiss",
+}
 
 class SearchController:
-    def __init__(self, cnn_faiss_search: CNNFaissSearch, clip_faiss_search=CLIPFaissSearch):
+    def __init__(
+        self,
+        cnn_faiss_search: CNNFaissSearch,
+        clip_faiss_search=CLIPFaissSearch,
+        admission: AdmissionController = None,
+        deadline_ms: float = SEARCH_DEADLINE_MS,
+        degraded_top_k: int = SEARCH_DEGRADED_TOP_K,
+        latency_budget_ms: float = None,
+        index_lock: ReadWriteLock = None,
+    ):
         self.cnn_faiss_search = cnn_faiss_search
         self.clip_faiss_search = clip_faiss_search
+        # method name -> service exposing `search_image(image, top_k)`, called from a search thread
+        self.services = {
+            "cnn_faiss": cnn_faiss_search,
+            "clip_faiss": clip_faiss_search,
+        }
+
+        self.text_search = None
+        # PerceptualHashIndex answering (near-)exact copies of catalog images before any model runs
+        self.hash_index = None
+        self.hash_max_distance = PHASH_MAX_DISTANCE
+        # Off: any hash hit is the whole answer. On: the requested method fills the remaining top_k slots
+        self.hash_fill_top_k = PHASH_FILL_TOP_K
+        # DriftMonitor fed with the top-1 score of every image search
+        self.drift_monitor = None
+        self.admission = admission or AdmissionController()
+        self.deadline_ms = deadline_ms
+        self.degraded_top_k = degraded_top_k
+        self.latency_budget_ms = latency_budget_ms
+        self.degraded_methods = dict(DEGRADED_METHODS)
+        # Shared with the AddController writing to the same indexes
+        self.index_lock = index_lock or ReadWriteLock()
+
+    def register_service(self, method: str, service):
+        self.services[method] = service
+
+    def _deadline(self, deadline_ms: float = None) -> Deadline:
+        # Clients may ask for a tighter deadline, never a looser one
+        if deadline_ms is None or deadline_ms > self.deadline_ms:
+            deadline_ms = self.deadline_ms
+        return Deadline(deadline_ms / 1000)
+
+    def _set_latency_budget(self, latency_budget_ms: float = None):
+        # A budget of 0 makes calibrated indexes use their fastest setting
+        if search_degraded.get():
+            latency_budget_ms = 0.0
+        elif latency_budget_ms is None:
+            latency_budget_ms = self.latency_budget_ms
+        latency_budget_var.set(latency_budget_ms)
 
-    async def search(self, file: UploadFile, params: SearchRequest) -> List[SearchResultItem]:
+    def _degrade(self, method: str, top_k: int, tta: str):
+        """
+        Cheaper settings for the request when the queue is building up:
+        a lighter method, no TTA and a capped top_k.
+        """
+        if not self.admission.overloaded:
+            return method, top_k, tta
+        cheaper = self.degraded_methods.get(method)
+        degraded = (
+            method if cheaper not in self.services else cheaper,
+            min(top_k, self.degraded_top_k),
+            "none",
+        )
+        if degraded != (method, top_k, tta):
+            SEARCH_DEGRADED.labels(method).inc()
+            search_degraded.set(True)
+            logger.info("Overloaded, degrading search %s/%s/%s to %s/%s/%s", method, top_k, tta, *degraded)
+        return degraded
+
+    async def search_text(
+        self, query: str, top_k: int, hybrid: bool = False, deadline_ms: float = None, latency_budget_ms: float = None
+    ) -> List[SearchResultItem]:
+        if self.text_search is None:
+            raise HTTPException(status_code=400, detail="Text search is not available")
+        if not query.strip():
+            raise HTTPException(status_code=400, detail="Query must not be empty")
+        if hybrid and not self.text_search.supports_hybrid:
+            raise HTTPException(status_code=400, detail="Hybrid text search needs item_name embeddings")
+        current_method.set("text_hybrid" if hybrid else "text")
+        deadline = self._deadline(deadline_ms)
+        if self.admission.overloaded:
+            hybrid = False
+            top_k = min(top_k, self.degraded_top_k)
+            search_degraded.set(True)
+        self._set_latency_budget(latency_budget_ms)
+        return await self.admission.run(deadline, self._search_text_blocking, query, top_k, hybrid)
+
+    def _search_text_blocking(self, query: str, top_k: int, hybrid: bool) -> List[SearchResultItem]:
+        with self.index_lock.read():
+            return run_profiled(self.text_search.search_text, query, top_k, hybrid)
+
+    async def search(self, file: UploadFile, params: SearchRequest, deadline_ms: float = None) -> List[SearchResultItem]:
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
-        img_bytes = await file.read()
-        image = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        print(f"Search params: {params}")
-        if params.method == "cnn_faiss":
-            return await self.cnn_faiss_search.search_image(image, params.top_k)
-        elif params.method == "clip_faiss":
-            return await self.clip_faiss_search.search_image(image, params.top_k)
-        else:
+        service = self.services.get(params.method)
+        if service is None:
             raise HTTPException(status_code=400, detail=f"Unknown search method: {params.method}")
+        tta = getattr(params, "tta", "none")
+        if tta != "none" and getattr(service, "extract_batch", None) is None:
+            raise HTTPException(status_code=400, detail=f"Method {params.method} does not support tta")
+        deadline = self._deadline(deadline_ms)
+
+        method, top_k, tta = self._degrade(params.method, params.top_k, tta)
+        self._set_latency_budget(getattr(params, "latency_budget_ms", None))
+        service = self.services[method]
+        current_method.set(method)
+        img_bytes = await read_upload(file)
+        logger.debug("Search params: method=%s top_k=%s tta=%s", method, top_k, tta)
+        return await self.admission.run(deadline, self._search_blocking, service, img_bytes, top_k, tta)
+
+    def _search_blocking(self, service, img_bytes: bytes, top_k: int, tta: str) -> List[SearchResultItem]:
+        # Decoding, inference, FAISS and Mongo all block, so the whole search runs off the event loop
+        with stage_timer("decode"):
+            # The models only see 224 x 224, so large JPEGs are decoded at a reduced scale
+            image = decode_image(img_bytes, QUERY_DECODE_SIZE)
+        matches = []
+        if self.hash_index is not None:
+            with stage_timer("phash"):
+                matches = self.hash_index.search(self.hash_index.hash(image), self.hash_max_distance, top_k)
+            record_cache("phash", hit=bool(matches))
+            if matches and (not self.hash_fill_top_k or len(matches) >= top_k):
+                return matches
+        with self.index_lock.read():
+            if tta != "none":
+                results = run_profiled(service.search_image_tta, image, top_k, tta)
+            else:
+                results = run_profiled(service.search_image, image, top_k)
+        if self.drift_monitor is not None and results:
+            # Fused TTA scores are not comparable with the catalog baseline, so they are tracked apart
+            method = current_method.get() if tta == "none" else f"{current_method.get()}_tta_{tta}"
+            self.drift_monitor.record_top_score(method, results[0]["score"])
+        if matches:
+            # Copies of the query rank first, the requested method fills the remaining slots
+            matched_ids = {match["image_id"] for match in matches}
+            results = matches + [r for r in results if r["image_id"] not in matched_ids][:top_k - len(matches)]
+        return results
@@ -1,37 +1,49 @@
 from typing import List, Dict
-from app.search import load_embedding_metadata, load_product_metadata
+from app.manifest_io import iter_records
+
+def transform_product(product: dict, embedding_dict: Dict[str, dict]) -> dict:
+    """
+    Product record as served by /products: image ids resolved to image paths.
+    embedding_dict maps image_id -> embedding metadata doc.
+    """
+    main_img_id = product.get("main_image_id")
+    main_image_path = embedding_dict.get(main_img_id, {}).get("image_path", "") if main_img_id else ""
+
+    other_images = []
+    for img_id in product.get("other_image_id", []):
+        path = embedding_dict.get(img_id, {}).get("image_path", "")
+        if path:
+            other_images.append({"image_id": img_id, "image_path": path})
+
+    return {
+        "item_id": product["item_id"],
+        "product_type": product.get("product_type", []),
+        "item_name": product.get("item_name", []),
+        "main_image": {
+            "image_id": main_img_id,
+            "image_path": main_image_path,
+        },
+        "other_images": other_images,
+    }
+
+def product_text(product: dict) -> str:
+    """
+    Text encoded for hybrid text search: the (preferably English) item name and the product types.
+    ABO item_name is a list of {language_tag, value}.
+    """
+    names = product.get("item_name") or []
+    english = [n["value"] for n in names if n.get("language_tag", "").startswith("en")]
+    name = (english or [n.get("value", "") for n in names] or [""])[0]
+    return " ".join([name] + list(product.get("product_type", [])))
 
 def load_and_transform_data(
     product_json_path: str,
     embedding_meta_index_path: str,
 ) -> (List[Dict]|Dict[str, Dict]):
 
-    products = load_product_metadata(product_json_path)
-    embedding_metadata = load_embedding_metadata(embedding_meta_index_path)
-
-    embedding_metadata_dict = {item["image_id"]: item for item in embedding_metadata}
-
-    transformed_products = []
-    for product in products:
-        main_img_id = product.get("main_image_id")
-        main_image_path = embedding_metadata_dict.get(main_img_id, {}).get("image_path", "")
-
-        other_images = []
-        for img_id in product.get("other_image_id", []):
-            path = embedding_metadata_dict.get(img_id, {}).get("image_path", "")
-            if path:
-                other_images.append({"image_id": img_id, "image_path": path})
-
-        transformed_products.append({
-            "item_id": product["item_id"],
-            "product_type": product.get("product_type", []),
-            "item_name": product.get("item_name", []),
-            "main_image": {
-                "image_id": main_img_id,
-                "image_path": main_image_path,
-            },
-            "other_images": other_images,
-        })
+    embedding_metadata_dict = {item["image_id"]: item for item in iter_records(embedding_meta_index_path)}
+
+    transformed_products = [transform_product(product, embedding_metadata_dict) for product in iter_records(product_json_path)]
 
     product_dict = {p["item_id"]: p for p in transformed_products}
 
@@ -1,9 +1,23 @@
 from pymongo import MongoClient
-from app.config import EMBEDDING_CLIP_FAISS_METADATA_COLLECTION
+from app.config import EMBEDDING_CLIP_FAISS_METADATA_COLLECTION, MONGO_URI, MONGO_DB_NAME
 
-client = MongoClient("mongodb://localhost:27017")
-db = client["visual_product_db"]
+client = MongoClient(MONGO_URI)
+db = client[MONGO_DB_NAME]
 
 products_col = db["products"]
 embedding_cnn_faiss_metadata_col = db["embedding_cnn_faiss_metadata"]
-embedding_clip_faiss_metadata_col = db[EMBEDDING_CLIP_FAISS_METADATA_COLLECTION]  
\ No newline at end of file
+embedding_clip_faiss_metadata_col = db[EMBEDDING_CLIP_FAISS_METADATA_COLLECTION]
+catalog_meta_col = db["catalog_meta"]  # version counters used for cache invalidation
+duplicate_clusters_col = db["duplicate_clusters"]  # written by run_duplicates.py
+
+
+class CatalogCollections:
+    """
+    The collections of one named catalog, kept in its own database (see app/catalogs.py).
+    """
+    def __init__(self, db_name: str):
+        catalog_db = client[db_name]
+        self.products_col = catalog_db["products"]
+        self.embedding_cnn_faiss_metadata_col = catalog_db["embedding_cnn_faiss_metadata"]
+        self.embedding_clip_faiss_metadata_col = catalog_db[EMBEDDING_CLIP_FAISS_METADATA_COLLECTION]
+        self.catalog_meta_col = catalog_db["catalog_meta"]
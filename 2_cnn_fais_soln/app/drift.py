@@ -0,0 +1,220 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+import numpy as np
+from app.metrics import SEARCH_TOP1_SCORE, QUERY_CENTROID_DISTANCE
+
+STATS_SUFFIX = ".stats.json"
+
+# Methods whose result scores are plain inner products of the model's vectors,
+# i.e. comparable with the top-1 scores measured on the index at build time
+BASELINE_MODELS = {
+    "cnn_faiss": "cnn",
+    "cnn_two_stage": "cnn",
+    "cnn_binary": "cnn",
+    "clip_faiss": "clip",
+    "clip_two_stage": "clip",
+    "clip_binary": "clip",
+}
+
+
+def summarize(values) -> Optional[dict]:
+    values = np.asarray(values, dtype="float64")
+    if not len(values):
+        return None
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 6),
+        "p5": round(float(p5), 6),
+        "p50": round(float(p50), 6),
+        "p95": round(float(p95), 6),
+    }
+
+
+def catalog_stats(vectors: np.ndarray, index, sample_size: int, chunk_rows: int = 100000) -> dict:
+    """
+    Statistics of the catalog seen as a query stream, the baseline of DriftMonitor:
+    the centroid of all vectors, and for a sample of rows their norm, cosine distance
+    to the centroid and top-1 score against the index (the row itself excluded).
+    """
+    centroid = np.zeros(vectors.shape[1], dtype="float64")
+    for start in range(0, len(vectors), chunk_rows):
+        centroid += np.asarray(vectors[start:start + chunk_rows]).sum(axis=0, dtype="float64")
+    centroid /= len(vectors)
+    centroid_unit = centroid / (np.linalg.norm(centroid) or 1.0)
+
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+    sample = np.ascontiguousarray(vectors[rows], dtype="float32")
+    norms = np.linalg.norm(sample, axis=1)
+    distances = 1.0 - (sample @ centroid_unit) / np.maximum(norms, 1e-12)
+
+    scores, ids = index.search(sample, 2)
+    top1 = [row_scores[1] if row_ids[0] == row else row_scores[0] for row, row_scores, row_ids in zip(rows, scores, ids)]
+    top1 = [score for score in top1 if np.isfinite(score)]
+
+    return {
+        "computed_at": time.time(),
+        "ntotal": int(index.ntotal),
+        "sample_size": int(len(rows)),
+        "centroid": centroid.astype("float32").tolist(),
+        "norm": summarize(norms),
+        "centroid_distance": summarize(distances),
+        "top1_score": summarize(top1),
+    }
+
+
+def stats_path(index_path: str) -> str:
+    return index_path + STATS_SUFFIX
+
+
+def save_catalog_stats(stats: dict, index_path: str):
+    with open(stats_path(index_path), "w") as f:
+        json.dump(stats, f)
+
+
+def load_catalog_stats(index_path: str) -> Optional[dict]:
+    path = stats_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class RunningSample:
+    """
+    One stream of values kept in fixed memory: the last `window` values, with their
+    running sum for the gauges, and a uniform reservoir (Algorithm R) of everything seen.
+    """
+    def __init__(self, window: int, reservoir_size: int, seed: int = 0):
+        self.recent = deque(maxlen=window)
+        self.recent_sum = 0.0
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self.seen = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def add(self, value: float) -> float:
+        """
+        Record value and return the mean of the window.
+        """
+        with self._lock:
+            if len(self.recent) == self.recent.maxlen:
+                self.recent_sum -= self.recent[0]
+            self.recent.append(value)
+            self.recent_sum += value
+            self.seen += 1
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(value)
+            else:
+                slot = self._random.randrange(self.seen)
+                if slot < self.reservoir_size:
+                    self.reservoir[slot] = value
+            return self.recent_sum / len(self.recent)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            recent, reservoir, seen = list(self.recent), list(self.reservoir), self.seen
+        return {"seen": seen, "recent": summarize(recent), "since_start": summarize(reservoir)}
+
+
+class DriftMonitor:
+    """
+    Running statistics of the query stream of this worker (embedding norms, cosine distance
+    to the catalog centroid and top-1 scores per method), compared with the catalog
+    statistics saved next to each index at build time (keyed "cnn" / "clip").
+
+    A method is flagged once half a window was seen and its recent median top-1 score is
+    more than score_drop below the catalog's; a model when the recent median distance to
+    the centroid is beyond the 95th percentile of the catalog's own distances.
+    """
+    def __init__(self, baselines: Dict[str, Optional[dict]], window: int, reservoir_size: int, score_drop: float):
+        self.baselines = {model: stats for model, stats in baselines.items() if stats}
+        self.window = window
+        self.reservoir_size = reservoir_size
+        self.score_drop = score_drop
+        self._centroids = {}
+        for model, stats in self.baselines.items():
+            centroid = np.asarray(stats["centroid"], dtype="float32")
+            self._centroids[model] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.norms: Dict[str, RunningSample] = {}
+        self.centroid_distances: Dict[str, RunningSample] = {}
+        self.top1_scores: Dict[str, RunningSample] = {}
+        self._lock = threading.Lock()
+
+    def _sample(self, samples: Dict[str, RunningSample], key: str) -> RunningSample:
+        sample = samples.get(key)
+        if sample is None:
+            with self._lock:
+                sample = samples.setdefault(key, RunningSample(self.window, self.reservoir_size))
+        return sample
+
+    def record_embedding(self, model: str, embedding: np.ndarray):
+        vector = np.asarray(embedding, dtype="float32").ravel()
+        norm = float(np.linalg.norm(vector))
+        self._sample(self.norms, model).add(norm)
+        centroid = self._centroids.get(model)
+        if centroid is not None and norm > 0 and centroid.shape == vector.shape:
+            distance = 1.0 - float(vector @ centroid) / norm
+            QUERY_CENTROID_DISTANCE.labels(model).set(self._sample(self.centroid_distances, model).add(distance))
+
+    def record_top_score(self, method: str, score: float):
+        SEARCH_TOP1_SCORE.labels(method).set(self._sample(self.top1_scores, method).add(float(score)))
+
+    def observe(self, model: str, extract_fn: Callable) -> Callable:
+        """
+        extract_fn recording every embedding it returns, for the search services.
+        """
+        def extract(image):
+            embedding = extract_fn(image)
+            self.record_embedding(model, embedding)
+            return embedding
+        return extract
+
+    def report(self) -> dict:
+        models = {}
+        for model in sorted(set(self.norms) | set(self.baselines)):
+            baseline = self.baselines.get(model)
+            entry = {
+                "baseline": {key: baseline[key] for key in ("computed_at", "ntotal", "sample_size")} if baseline else None,
+                "norm": self.norms[model].to_dict() if model in self.norms else None,
+                "centroid_distance": self.centroid_distances[model].to_dict() if model in self.centroid_distances else None,
+                "drifted": False,
+            }
+            if baseline:
+                if entry["norm"] is not None:
+                    entry["norm"]["baseline"] = baseline["norm"]
+                if entry["centroid_distance"] is not None:
+                    entry["centroid_distance"]["baseline"] = baseline["centroid_distance"]
+                    recent = entry["centroid_distance"]["recent"]
+                    entry["drifted"] = (
+                        recent["count"] >= self.window // 2
+                        and recent["p50"] > baseline["centroid_distance"]["p95"]
+                    )
+            models[model] = entry
+
+        methods = {}
+        for method, sample in sorted(self.top1_scores.items()):
+            entry = sample.to_dict()
+            entry["drifted"] = False
+            baseline = self.baselines.get(BASELINE_MODELS.get(method))
+            if baseline and baseline.get("top1_score"):
+                entry["baseline"] = baseline["top1_score"]
+                recent = entry["recent"]
+                entry["p50_change"] = round(recent["p50"] - baseline["top1_score"]["p50"], 6)
+                entry["drifted"] = recent["count"] >= self.window // 2 and entry["p50_change"] < -self.score_drop
+            methods[method] = entry
+
+        return {
+            "window": self.window,
+            "score_drop": self.score_drop,
+            "drifted": any(entry["drifted"] for entry in list(models.values()) + list(methods.values())),
+            "models": models,
+            "methods": methods,
+        }
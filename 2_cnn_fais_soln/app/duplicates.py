@@ -0,0 +1,174 @@
+import json
+import logging
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+import faiss
+import numpy as np
+from app.embedding_store import IndexVectors
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_WRITE_BATCH = 1000
+
+
+class UnionFind:
+    """
+    Disjoint sets over arbitrary hashable keys (item_ids), with path halving and union by size.
+    """
+    def __init__(self):
+        self.parent: Dict[str, str] = {}
+        self.size: Dict[str, int] = {}
+
+    def find(self, key: str) -> str:
+        if key not in self.parent:
+            self.parent[key] = key
+            self.size[key] = 1
+            return key
+        while self.parent[key] != key:
+            self.parent[key] = self.parent[self.parent[key]]
+            key = self.parent[key]
+        return key
+
+    def union(self, a: str, b: str):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
+    def groups(self) -> Iterator[List[str]]:
+        members: Dict[str, List[str]] = {}
+        for key in self.parent:
+            members.setdefault(self.find(key), []).append(key)
+        for group in members.values():
+            if len(group) > 1:
+                yield sorted(group)
+
+
+def load_faiss_positions(metadata_col, ntotal: int) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+    """
+    image_id and item_id of every faiss_index position, as two lists indexed by position.
+    """
+    image_ids: List[Optional[str]] = [None] * ntotal
+    item_ids: List[Optional[str]] = [None] * ntotal
+    for doc in metadata_col.find({}, {"faiss_index": 1, "image_id": 1, "item_id": 1, "_id": 0}):
+        position = doc["faiss_index"]
+        if position < ntotal:
+            image_ids[position] = doc["image_id"]
+            item_ids[position] = doc.get("item_id")
+    return image_ids, item_ids
+
+
+def vector_blocks(index: faiss.Index, store=None, block_size: int = 4096) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (first position, vectors) blocks of the catalog, from the embedding store when
+    available (exact vectors, memory-mapped) and otherwise from the index if it is flat.
+    """
+    if store is None and not IndexVectors.is_exact(index):
+        raise ValueError(f"{type(faiss.downcast_index(index)).__name__} does not keep exact vectors: "
+                         "duplicate detection needs the embedding store of this index")
+    ntotal = index.ntotal if store is None else min(index.ntotal, len(store))
+    for start in range(0, ntotal, block_size):
+        count = min(block_size, ntotal - start)
+        if store is not None:
+            block = np.ascontiguousarray(store.vectors[start:start + count])
+        else:
+            block = index.reconstruct_n(start, count)
+        yield start, block
+
+
+def similar_pairs(index: faiss.Index, block: np.ndarray, start: int, threshold: float, k: int) -> Iterator[Tuple[int, int, float]]:
+    """
+    (query position, neighbour position, score) for neighbours above threshold, each pair once:
+    from the query at its lower position. Uses range_search, or k-NN search for indexes without
+    range search support (e.g. HNSW). A pair an approximate index only finds from the higher
+    position is missed, which keeps the job free of state across blocks.
+    """
+    try:
+        lims, scores, neighbours = index.range_search(block, threshold)
+        queries = start + np.repeat(np.arange(len(block)), np.diff(lims).astype("int64"))
+    except RuntimeError:
+        scores, neighbours = index.search(block, k)
+        queries = start + np.repeat(np.arange(len(block)), k)
+        scores, neighbours = scores.ravel(), neighbours.ravel()
+        keep = scores >= threshold
+        queries, scores, neighbours = queries[keep], scores[keep], neighbours[keep]
+
+    # Self matches, padding (-1) and the copy of each pair found from its higher position are dropped
+    keep = neighbours > queries
+    yield from zip(queries[keep].tolist(), neighbours[keep].tolist(), scores[keep].tolist())
+
+
+def find_duplicate_pairs(
+    name: str,
+    index: faiss.Index,
+    metadata_col,
+    union_find: UnionFind,
+    threshold: float,
+    store=None,
+    block_size: int = 4096,
+    k: int = 32,
+    pairs_file=None,
+) -> int:
+    """
+    Self-search the whole index in blocks and union the item_ids of images scoring
+    at least threshold. Pairs within one item are ignored. Each cross-item pair is
+    written as a JSON line to pairs_file if given. Returns the number of pairs found.
+    """
+    image_ids, item_ids = load_faiss_positions(metadata_col, index.ntotal)
+    found = 0
+    start_time = time.perf_counter()
+    for start, block in vector_blocks(index, store, block_size):
+        for query, neighbour, score in similar_pairs(index, block, start, threshold, k):
+            item_a, item_b = item_ids[query], item_ids[neighbour]
+            if item_a is None or item_b is None or item_a == item_b:
+                continue
+            union_find.union(item_a, item_b)
+            found += 1
+            if pairs_file is not None:
+                pairs_file.write(json.dumps({
+                    "index": name,
+                    "image_a": image_ids[query], "item_a": item_a,
+                    "image_b": image_ids[neighbour], "item_b": item_b,
+                    "score": round(score, 6),
+                }) + "\n")
+        done = start + len(block)
+        elapsed = time.perf_counter() - start_time
+        logger.info("%s: %s/%s vectors searched, %s duplicate pairs, %.1f vectors/s", name, done, index.ntotal, found, done / elapsed)
+    return found
+
+
+def iter_clusters(union_find: UnionFind) -> Iterator[dict]:
+    for cluster_id, item_ids in enumerate(union_find.groups()):
+        yield {"cluster_id": cluster_id, "item_ids": item_ids, "size": len(item_ids)}
+
+
+def write_clusters_jsonl(clusters: Iterator[dict], path: str) -> int:
+    count = 0
+    with open(path, "w") as f:
+        for cluster in clusters:
+            f.write(json.dumps(cluster) + "\n")
+            count += 1
+    return count
+
+
+def write_clusters_mongo(clusters: Iterator[dict], clusters_col) -> int:
+    """
+    Replace the collection's clusters, inserting in batches.
+    """
+    clusters_col.delete_many({})
+    count = 0
+    batch = []
+    for cluster in clusters:
+        batch.append(cluster)
+        if len(batch) >= CLUSTER_WRITE_BATCH:
+            clusters_col.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        clusters_col.insert_many(batch, ordered=False)
+        count += len(batch)
+    clusters_col.create_index("item_ids")
+    return count
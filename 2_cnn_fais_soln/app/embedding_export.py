@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+ROW_FIELDS = ["faiss_index", "image_id", "item_id", "image_path"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def _write_rows(path_prefix: str, rows: List[dict]) -> str:
+    """
+    Metadata of one chunk as Parquet when pyarrow is installed, otherwise JSON Lines. Returns the file name.
+    """
+    pa = _pyarrow()
+    if pa is not None:
+        path = path_prefix + ".parquet"
+        table = pa.table({field: [row.get(field) for row in rows] for field in ROW_FIELDS})
+        pa.parquet.write_table(table, path)
+    else:
+        path = path_prefix + ".jsonl"
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps({field: row.get(field) for field in ROW_FIELDS}) + "\n")
+    return os.path.basename(path)
+
+
+def _read_rows(path: str) -> List[dict]:
+    if path.endswith(".parquet"):
+        pa = _pyarrow()
+        if pa is None:
+            raise RuntimeError(f"pyarrow is required to read {path}")
+        return pa.parquet.read_table(path).to_pylist()
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _metadata_rows(metadata_col, start: int, end: int) -> List[dict]:
+    # First document of every referenced position in [start, end); rows nothing points at are dropped
+    rows = {}
+    for doc in metadata_col.find({"faiss_index": {"$gte": start, "$lt": end}}, {"_id": 0}).sort("faiss_index", 1):
+        rows.setdefault(doc["faiss_index"], doc)
+    return list(rows.values())
+
+
+def export_embeddings(
+    out_dir: str,
+    store,
+    metadata_col,
+    model: Optional[str],
+    source: str,
+    chunk_rows: int = 100000,
+) -> dict:
+    """
+    Write catalog vectors with their ids to out_dir:
+      manifest.json           dim, count, model, source and the chunk list
+      vectors-00000.npy       float32 rows, memory-mappable with np.load(mmap_mode="r")
+      rows-00000.parquet      faiss_index, image_id, item_id, image_path of each row
+                              (rows-00000.jsonl without pyarrow)
+    store is an EmbeddingStore, or IndexVectors for an index that keeps exact vectors.
+    Rows without a metadata document are left out; faiss_index keeps the exported position.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = []
+    count = 0
+    dim = store.dim if hasattr(store, "dim") else store.index.d
+    for start in range(0, len(store), chunk_rows):
+        end = min(start + chunk_rows, len(store))
+        rows = _metadata_rows(metadata_col, start, end)
+        if not rows:
+            continue
+        positions = np.array([row["faiss_index"] for row in rows], dtype=np.int64)
+        name = f"{len(chunks):05d}"
+        vectors = np.asarray(store.get(positions), dtype="float32")
+        dim = vectors.shape[1]
+        np.save(os.path.join(out_dir, f"vectors-{name}.npy"), vectors)
+        rows_file = _write_rows(os.path.join(out_dir, f"rows-{name}"), rows)
+        chunks.append({"vectors": f"vectors-{name}.npy", "rows": rows_file, "count": len(rows)})
+        count += len(rows)
+        logger.info("Exported rows %d - %d (%d so far)", start, end, count)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "model": model,
+        "source": source,
+        "dim": dim,
+        "dtype": "float32",
+        "count": count,
+        "chunks": chunks,
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(export_dir: str) -> dict:
+    with open(os.path.join(export_dir, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding export format: {manifest.get('format_version')}")
+    return manifest
+
+
+def iter_export(export_dir: str) -> Iterator[Tuple[np.ndarray, List[dict]]]:
+    """
+    (vectors, rows) of each chunk, vectors memory-mapped. Also the entry point for analytics jobs.
+    """
+    for chunk in load_manifest(export_dir)["chunks"]:
+        vectors = np.load(os.path.join(export_dir, chunk["vectors"]), mmap_mode="r")
+        yield vectors, _read_rows(os.path.join(export_dir, chunk["rows"]))
+
+
+def load_export(export_dir: str) -> Tuple[np.ndarray, List[dict]]:
+    """
+    All vectors of an export as one matrix, with their rows in the same order.
+    """
+    vectors, rows = [], []
+    for chunk_vectors, chunk_rows in iter_export(export_dir):
+        vectors.append(chunk_vectors)
+        rows.extend(chunk_rows)
+    if not vectors:
+        return np.zeros((0, load_manifest(export_dir)["dim"]), dtype="float32"), rows
+    return np.concatenate(vectors), rows
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from typing import List, Optional
+import faiss
+import numpy as np
+
+class EmbeddingStore:
+    """
+    Append-only float32 embedding matrix kept on disk and read through a memory map.
+    Row i holds the full-precision vector stored at faiss_index i.
+    The dimension is kept in a small JSON sidecar next to the raw file.
+    """
+    def __init__(self, path: str, dim: int = None):
+        self.path = path
+        self.meta_path = path + ".json"
+        if dim is None:
+            with open(self.meta_path, "r") as f:
+                dim = json.load(f)["dim"]
+        elif not os.path.exists(self.meta_path):
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": dim, "dtype": "float32"}, f)
+        self.dim = dim
+        self.refresh()
+
+    @classmethod
+    def create(cls, path: str, dim: int) -> "EmbeddingStore":
+        # Start an empty store, replacing any previous one
+        open(path, "wb").close()
+        with open(path + ".json", "w") as f:
+            json.dump({"dim": dim, "dtype": "float32"}, f)
+        return cls(path, dim)
+
+    def refresh(self):
+        rows = os.path.getsize(self.path) // (4 * self.dim) if os.path.exists(self.path) else 0
+        if rows:
+            self.vectors = np.memmap(self.path, dtype="float32", mode="r", shape=(rows, self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim), dtype="float32")
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def append(self, embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32").reshape(-1, self.dim)
+        with open(self.path, "ab") as f:
+            f.write(embeddings.tobytes())
+        self.refresh()
+
+    def get(self, ids) -> np.ndarray:
+        return np.asarray(self.vectors[np.asarray(ids, dtype="int64")])
+
+
+class KeyedEmbeddingStore:
+    """
+    EmbeddingStore whose rows are looked up by key, e.g. item_id. The keys are a JSON Lines
+    sidecar written after the vectors, so both files only grow and every complete key line
+    points at a complete row. Rows appended by other workers are picked up on a lookup miss.
+    """
+    def __init__(self, path: str):
+        self.store = EmbeddingStore(path)
+        self.keys_path = path + ".ids.jsonl"
+        if not os.path.exists(self.keys_path) and os.path.exists(path + ".ids.json"):
+            # Stores written before adds were supported kept the keys as one JSON list
+            with open(path + ".ids.json", "r") as f:
+                keys = json.load(f)
+            with open(self.keys_path + ".tmp", "w") as f:
+                f.writelines(json.dumps(key) + "\n" for key in keys)
+            os.replace(self.keys_path + ".tmp", self.keys_path)
+        self.positions = {}
+        self._rows = 0
+        self._keys_bytes = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @classmethod
+    def create(cls, path: str, dim: int) -> "KeyedEmbeddingStore":
+        EmbeddingStore.create(path, dim)
+        open(path + ".ids.jsonl", "w").close()
+        return cls(path)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return bool(path) and os.path.exists(path) and (
+            os.path.exists(path + ".ids.jsonl") or os.path.exists(path + ".ids.json")
+        )
+
+    def refresh(self):
+        with self._lock:
+            if os.path.getsize(self.keys_path) == self._keys_bytes:
+                return
+            with open(self.keys_path, "rb") as f:
+                f.seek(self._keys_bytes)
+                tail = f.read()
+            complete = tail[:tail.rfind(b"\n") + 1]
+            self.store.refresh()
+            for line in complete.splitlines():
+                self.positions[json.loads(line)] = self._rows
+                self._rows += 1
+            self._keys_bytes += len(complete)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get(self, key) -> Optional[np.ndarray]:
+        position = self.positions.get(key)
+        if position is None:
+            self.refresh()
+            position = self.positions.get(key)
+            if position is None:
+                return None
+        return self.store.get([position])[0]
+
+    def append(self, keys: List, embeddings: np.ndarray):
+        self.store.append(embeddings)
+        with open(self.keys_path, "a") as f:
+            f.write("".join(json.dumps(key) + "\n" for key in keys))
+        self.refresh()
+
+
+class IndexVectors:
+    """
+    Same get() interface as EmbeddingStore, reconstructing vectors from a FAISS index.
+    Only valid for flat indexes, which keep the vectors as added (see is_exact).
+    """
+    def __init__(self, index):
+        if not self.is_exact(index):
+            raise ValueError(f"{type(faiss.downcast_index(index)).__name__} does not keep exact vectors")
+        self.index = index
+
+    @staticmethod
+    def is_exact(index) -> bool:
+        # IVF/HNSW/PQ/PCA indexes reconstruct approximations or cannot reconstruct at all
+        return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def get(self, ids) -> np.ndarray:
+        return self.index.reconstruct_batch(np.asarray(ids, dtype="int64"))
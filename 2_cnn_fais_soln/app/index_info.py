@@ -0,0 +1,171 @@
+import json
+import math
+import os
+import time
+from typing import Optional
+import faiss
+import numpy as np
+from app.binary_index import BinaryCoarseIndex
+from app.calibration import search_knob
+
+PROJECTION_SCALES = (2, 5, 10)
+LATENCY_QUERIES = 16
+
+
+def build_info_path(index_path: str) -> str:
+    return index_path + ".build.json"
+
+
+def save_build_info(index_path: str, index, model: str, build_seconds: float, **extra):
+    """
+    Sidecar describing how an index was built, read back by GET /admin/indexes.
+    """
+    info = {
+        "built_at": time.time(),
+        "build_seconds": round(build_seconds, 2),
+        "model": model,
+        "type": index_type(index),
+        "dim": index.d,
+        "ntotal": index.ntotal,
+        **extra,
+    }
+    with open(build_info_path(index_path), "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def load_build_info(index_path: str) -> Optional[dict]:
+    path = build_info_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _downcast(index):
+    if isinstance(index, faiss.IndexBinary):
+        return faiss.downcast_IndexBinary(index)
+    return faiss.downcast_index(index)
+
+
+def index_type(index) -> str:
+    """
+    e.g. "IndexPreTransform > IndexIVFFlat" or "BinaryCoarseIndex > IndexBinaryFlat".
+    """
+    if isinstance(index, BinaryCoarseIndex):
+        return "BinaryCoarseIndex > " + index_type(index.index)
+    index = _downcast(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return "IndexPreTransform > " + index_type(index.index)
+    return type(index).__name__
+
+
+def _faiss_bytes(index) -> int:
+    index = _downcast(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        # One d_in x d_out matrix per transform, PCA or OPQ
+        inner = _downcast(index.index)
+        return index.chain.size() * index.d * inner.d * 4 + _faiss_bytes(inner)
+    if isinstance(index, (faiss.IndexIVF, faiss.IndexBinaryIVF)):
+        # Codes plus an int64 id per vector in the inverted lists
+        return index.ntotal * (index.code_size + 8) + _faiss_bytes(index.quantizer)
+    if isinstance(index, (faiss.IndexHNSW, faiss.IndexBinaryHNSW)):
+        hnsw = index.hnsw
+        links = hnsw.neighbors.size() * 4 + hnsw.levels.size() * 4 + hnsw.offsets.size() * 8
+        return links + _faiss_bytes(index.storage)
+    if hasattr(index, "code_size"):
+        return index.ntotal * index.code_size
+    return index.ntotal * index.d * 4
+
+
+def index_bytes(index) -> int:
+    """
+    Estimated RAM held by an index, from its structure rather than by serializing it.
+    """
+    if isinstance(index, BinaryCoarseIndex):
+        quantizer = index.quantizer
+        arrays = [a for a in (quantizer.mean, quantizer.rotation) if a is not None]
+        return _faiss_bytes(index.index) + sum(a.nbytes for a in arrays)
+    return _faiss_bytes(index)
+
+
+def _is_graph(index) -> bool:
+    if isinstance(index, BinaryCoarseIndex):
+        return isinstance(_downcast(index.index), faiss.IndexBinaryHNSW)
+    return search_knob(index) == "efSearch"
+
+
+def measure_query_ms(index, k: int = 10, queries: int = LATENCY_QUERIES) -> Optional[float]:
+    """
+    Median single-query latency on random unit vectors, like one /search/ call.
+    """
+    if not index.ntotal:
+        return None
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((queries, index.d)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    timings = []
+    for query in vectors:
+        start = time.perf_counter()
+        index.search(query.reshape(1, -1), k)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def metadata_consistency(metadata_col, ntotal: int) -> dict:
+    """
+    Compare the FAISS positions referenced by a metadata collection with the index rows.
+    Rows no document points at (e.g. an add that failed before its metadata insert)
+    still cost memory and scan time and can take top_k slots: they are counted as tombstones.
+    """
+    documents = metadata_col.count_documents({})
+    dangling = metadata_col.count_documents({"faiss_index": {"$gte": ntotal}})
+    referenced = next(metadata_col.aggregate([
+        {"$match": {"faiss_index": {"$lt": ntotal}}},
+        {"$group": {"_id": "$faiss_index"}},
+        {"$count": "rows"},
+    ], allowDiskUse=True), {"rows": 0})["rows"]
+    unreferenced = ntotal - referenced
+    return {
+        "documents": documents,
+        "consistent": documents == ntotal and referenced == ntotal,
+        "unreferenced_rows": unreferenced,
+        "dangling_documents": dangling,
+        "duplicate_documents": documents - dangling - referenced,
+        "tombstone_ratio": round(unreferenced / ntotal, 6) if ntotal else 0.0,
+    }
+
+
+def describe_index(index, index_path: Optional[str] = None, metadata_col=None, measure: bool = True) -> dict:
+    """
+    Type, size, build info, metadata consistency and capacity projections of one loaded index.
+    Projections assume memory grows linearly with the catalog and scan cost linearly
+    (exhaustive and IVF at a fixed nlist) or logarithmically (HNSW graphs).
+    """
+    ntotal = index.ntotal
+    nbytes = index_bytes(index)
+    info = {
+        "type": index_type(index),
+        "dim": index.d,
+        "ntotal": ntotal,
+        "bytes": nbytes,
+        "bytes_per_vector": round(nbytes / ntotal, 1) if ntotal else None,
+        "build": load_build_info(index_path) if index_path else None,
+        "metadata": metadata_consistency(metadata_col, ntotal) if metadata_col is not None else None,
+    }
+    if not measure:
+        return info
+
+    query_ms = measure_query_ms(index)
+    graph = _is_graph(index)
+    info["query_ms"] = query_ms
+    info["latency_scaling"] = "logarithmic" if graph else "linear"
+    info["scan_ns_per_vector"] = round(query_ms * 1e6 / ntotal, 3) if query_ms is not None else None
+    projections = []
+    for scale in PROJECTION_SCALES:
+        projected_ms = None
+        if query_ms is not None:
+            growth = math.log(ntotal * scale) / math.log(ntotal) if graph and ntotal > 1 else scale
+            projected_ms = round(query_ms * growth, 3)
+        projections.append({"scale": scale, "ntotal": ntotal * scale, "bytes": nbytes * scale, "query_ms": projected_ms})
+    info["projections"] = projections
+    return info
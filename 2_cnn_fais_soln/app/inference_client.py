@@ -0,0 +1,78 @@
+import json
+import socket
+import struct
+import threading
+import numpy as np
+
+# Wire format shared with app.inference_server. Each message is:
+#   4-byte big-endian header length | JSON header | raw array bytes
+# Request header:  {"kind": "cnn" | "clip" | "text", "dtype": ..., "shape": [...]}
+# Response header: {"dtype": ..., "shape": [...]} or {"error": "..."}
+HEADER_LENGTH = struct.Struct(">I")
+
+def encode_message(header: dict, array: np.ndarray = None) -> bytes:
+    payload = b""
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, dtype=str(array.dtype), shape=list(array.shape))
+        payload = array.tobytes()
+    header_bytes = json.dumps(header).encode()
+    return HEADER_LENGTH.pack(len(header_bytes)) + header_bytes + payload
+
+def payload_size(header: dict) -> int:
+    if "shape" not in header:
+        return 0
+    return int(np.prod(header["shape"])) * np.dtype(header["dtype"]).itemsize
+
+def decode_array(header: dict, payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+
+
+class InferenceClient:
+    """
+    Client side of the shared inference process. Keeps one Unix socket
+    connection per thread; any socket failure surfaces as ConnectionError.
+    """
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _recv_exactly(self, conn: socket.socket, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = conn.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError("Inference server closed the connection")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def embed(self, kind: str, x: np.ndarray) -> np.ndarray:
+        try:
+            conn = self._connection()
+            conn.sendall(encode_message({"kind": kind}, x))
+            (header_len,) = HEADER_LENGTH.unpack(self._recv_exactly(conn, HEADER_LENGTH.size))
+            header = json.loads(self._recv_exactly(conn, header_len))
+            payload = self._recv_exactly(conn, payload_size(header))
+        except OSError as e:
+            # Includes timeouts and refused/broken connections; reconnect on the next call
+            self._close()
+            raise ConnectionError(str(e)) from e
+        if "error" in header:
+            raise RuntimeError(f"Inference server error: {header['error']}")
+        return decode_array(header, payload).copy()
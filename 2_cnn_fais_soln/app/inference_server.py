@@ -0,0 +1,108 @@
+"""
+Shared embedding process: owns the ResNet50 and CLIP models and serves all API
+workers over a Unix socket. Requests arriving within INFERENCE_BATCH_WAIT_MS of
+each other are run as one forward pass per model.
+
+    python -m app.inference_server
+
+API workers use it when INFERENCE_SOCKET_PATH is set (see app/main.py).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.config import INFERENCE_SOCKET_PATH, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WAIT_MS, LOG_LEVEL, LOG_FORMAT
+from app.inference_client import HEADER_LENGTH, encode_message, payload_size, decode_array
+from app.logging_config import configure_logging
+from app.model import load_models, run_model
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("cnn", "clip", "text")
+
+
+class InferenceServer:
+    def __init__(self, socket_path: str, max_batch: int = 32, batch_wait_ms: float = 5.0):
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.queues = {}
+        # One thread: torch already parallelizes each forward pass internally
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def serve(self):
+        self.queues = {kind: asyncio.Queue() for kind in KINDS}
+        for kind in KINDS:
+            asyncio.create_task(self._batch_loop(kind))
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        logger.info("Inference server listening on %s (max_batch=%d, wait=%.1fms)",
+                    self.socket_path, self.max_batch, self.batch_wait * 1000)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (header_len,) = HEADER_LENGTH.unpack(await reader.readexactly(HEADER_LENGTH.size))
+                header = json.loads(await reader.readexactly(header_len))
+                x = decode_array(header, await reader.readexactly(payload_size(header)))
+                try:
+                    if header.get("kind") not in self.queues:
+                        raise ValueError(f"Unknown model kind: {header.get('kind')}")
+                    future = asyncio.get_running_loop().create_future()
+                    await self.queues[header["kind"]].put((x, future))
+                    writer.write(encode_message({}, await future))
+                except Exception as e:
+                    writer.write(encode_message({"error": str(e)}))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    async def _batch_loop(self, kind: str):
+        queue = self.queues[kind]
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block for the first request, then gather others until the batch is full or the wait expires
+            batch = [await queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.batch_wait
+            while rows < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            start = time.perf_counter()
+            try:
+                embs = await loop.run_in_executor(self.executor, run_model, kind, np.concatenate([x for x, _ in batch]))
+            except Exception as e:
+                logger.exception("Batch of %d %s inputs failed", rows, kind)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            logger.debug("Embedded %d %s inputs from %d requests in %.1fms",
+                         rows, kind, len(batch), (time.perf_counter() - start) * 1000)
+
+            offset = 0
+            for x, future in batch:
+                future.set_result(embs[offset:offset + len(x)])
+                offset += len(x)
+
+
+if __name__ == "__main__":
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    load_models()
+    asyncio.run(InferenceServer(INFERENCE_SOCKET_PATH, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WAIT_MS).serve())
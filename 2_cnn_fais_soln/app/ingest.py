@@ -0,0 +1,310 @@
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image
+from app.model import extract_embeddings_batch, extract_clip_embeddings_batch
+from app.manifest_io import iter_records
+from app.search import iter_batches
+from app.embedding_store import EmbeddingStore
+from app.local_features import LocalFeatureStore
+from app.data_loading import transform_product
+from app.uploads import decode_image
+from app.config import INGEST_BATCH_SIZE, INGEST_KEEP_JOBS
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_ERRORS = 100  # per-product problems kept on the job for polling
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _item_names(value) -> list:
+    # Same shapes as /add_product: ABO [{language_tag, value}] lists or a plain string
+    return [{"language_tag": "en", "value": v} if isinstance(v, str) else v for v in _as_list(value)]
+
+
+def _safe_tar_members(archive: tarfile.TarFile) -> Iterator[tarfile.TarInfo]:
+    # Regular files only, and nothing that would land outside the target folder
+    for member in archive:
+        name = Path(member.name)
+        if member.isfile() and not name.is_absolute() and ".." not in name.parts:
+            yield member
+
+
+class IngestJob:
+    """
+    Bulk load of a JSON Lines product manifest, one product per line:
+        {"item_id": ..., "product_type": [...] | str, "item_name": [...] | str,
+         "main_image": "path", "other_images": ["path", ...]}
+    with image paths relative to an image directory or inside a tar archive.
+
+    Phases: "staging" copies/extracts the images under SHOE_IMAGES_FOLDER/ingest/<job id>;
+    "embedding" validates products and embeds their images in batches into temporary
+    stores; "publishing" takes the catalog write lock, appends everything to the live
+    indexes, writes the metadata and products with bulk inserts and saves the indexes
+    once, then renders the thumbnails. A job that fails before publishing deletes its
+    staged images and has written nothing else; one that fails while publishing may
+    leave part of its rows in the indexes, so its staged images are kept.
+    """
+    def __init__(self, add_controller, manifest_path: str, images_path: str, batch_size: int = INGEST_BATCH_SIZE):
+        self.id = uuid.uuid4().hex[:12]
+        self.add_controller = add_controller
+        self.manifest_path = manifest_path
+        self.images_path = images_path
+        self.batch_size = batch_size
+        self.status = "queued"
+        self.phase = None
+        self.products_total = 0
+        self.products_done = 0
+        self.products_skipped = 0
+        self.images_done = 0
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self.images_folder = add_controller.images_folder
+        self.staging_relpath = f"ingest/{self.id}"
+        self.catalog_written = False  # set once publishing starts changing the live catalog
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            "manifest_path": self.manifest_path,
+            "images_path": self.images_path,
+            "products_total": self.products_total,
+            "products_done": self.products_done,
+            "products_skipped": self.products_skipped,
+            "images_done": self.images_done,
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _error(self, message: str):
+        logger.warning("Ingest %s: %s", self.id, message)
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append(message)
+
+    def run(self):
+        self.status = "running"
+        try:
+            # Staging and embedding only read the catalog; /add_product keeps working meanwhile
+            with tempfile.TemporaryDirectory(prefix=f"ingest-{self.id}-") as tmp_dir:
+                self.phase = "staging"
+                self._stage_images()
+                self.phase = "embedding"
+                staged = self._embed_products(tmp_dir)
+                self.phase = "publishing"
+                self._publish(*staged)
+            self.status = "done"
+        except Exception as e:
+            logger.exception("Ingest %s failed", self.id)
+            self.status = "failed"
+            self._error(f"{type(e).__name__}: {e}")
+            if not self.catalog_written:
+                shutil.rmtree(os.path.join(self.images_folder, self.staging_relpath), ignore_errors=True)
+        finally:
+            self.phase = None
+            self.finished_at = time.time()
+
+    def _stage_images(self):
+        target = os.path.join(self.images_folder, self.staging_relpath)
+        os.makedirs(target, exist_ok=True)
+        if os.path.isdir(self.images_path):
+            shutil.copytree(self.images_path, target, dirs_exist_ok=True)
+        else:
+            # Extracted sequentially, which also suits compressed archives
+            with tarfile.open(self.images_path, "r:*") as archive:
+                archive.extractall(target, members=_safe_tar_members(archive))
+
+    def _existing_item_ids(self, item_ids: List[str]) -> set:
+        docs = self.add_controller.products_col.find({"item_id": {"$in": item_ids}}, {"item_id": 1})
+        return {doc["item_id"] for doc in docs}
+
+    def _load_image(self, relpath: str) -> Tuple[str, Image.Image]:
+        rel_path = f"{self.staging_relpath}/{Path(relpath).as_posix()}"
+        return rel_path, decode_image(os.path.join(self.images_folder, rel_path))
+
+    def _valid_products(self, batch: List[dict], seen: set) -> Iterator[Tuple[dict, List[Tuple[str, Image.Image]]]]:
+        """
+        Products of the batch that can be ingested, with their decoded images (main image first).
+        """
+        existing = self._existing_item_ids([p.get("item_id") for p in batch if p.get("item_id")])
+        for product in batch:
+            item_id = product.get("item_id")
+            if not item_id or not product.get("main_image"):
+                self._error(f"Missing item_id or main_image: {product}")
+            elif item_id in seen or item_id in existing:
+                self._error(f"Product with item_id '{item_id}' already exists")
+            else:
+                try:
+                    images = [self._load_image(p) for p in [product["main_image"]] + _as_list(product.get("other_images"))]
+                except HTTPException as e:
+                    self._error(f"Unreadable image for item_id '{item_id}': {e.detail}")
+                else:
+                    seen.add(item_id)
+                    yield product, images
+                    continue
+            self.products_skipped += 1
+
+    def _embed_products(self, tmp_dir: str):
+        controller = self.add_controller
+        self.products_total = sum(1 for _ in iter_records(self.manifest_path))
+
+        cnn_staged = clip_staged = None
+        feature_staged = LocalFeatureStore.create(os.path.join(tmp_dir, "local")) if controller.local_feature_store is not None else None
+        image_metas, product_docs, hashes = [], [], []
+        seen = set()
+
+        for batch in iter_batches(iter_records(self.manifest_path), self.batch_size):
+            valid = list(self._valid_products(batch, seen))
+            if not valid:
+                continue
+            images = [image for _, product_images in valid for _, image in product_images]
+            emb_cnn = extract_embeddings_batch(images)
+            emb_clip = extract_clip_embeddings_batch(images)
+            if cnn_staged is None:
+                cnn_staged = EmbeddingStore.create(os.path.join(tmp_dir, "cnn.f32"), emb_cnn.shape[1])
+                clip_staged = EmbeddingStore.create(os.path.join(tmp_dir, "clip.f32"), emb_clip.shape[1])
+            cnn_staged.append(emb_cnn)
+            clip_staged.append(emb_clip)
+
+            batch_image_ids, batch_features = [], []
+            for product, product_images in valid:
+                item_id = product["item_id"]
+                image_ids = []
+                for rel_path, image in product_images:
+                    image_id = item_id + controller._generate_image_id()
+                    image_ids.append(image_id)
+                    image_metas.append({"image_id": image_id, "image_path": rel_path, "item_id": item_id})
+                    if feature_staged is not None:
+                        batch_image_ids.append(image_id)
+                        batch_features.append(controller._extract_local_features(image))
+                    if controller.hash_index is not None:
+                        hashes.append(controller._image_hash(image))
+                product_docs.append({
+                    "item_id": item_id,
+                    "product_type": _as_list(product.get("product_type")),
+                    "item_name": _item_names(product.get("item_name")),
+                    "main_image_id": image_ids[0],
+                    "other_image_id": image_ids[1:],
+                })
+            if feature_staged is not None:
+                feature_staged.append(batch_image_ids, batch_features)
+            self.products_done += len(valid)
+            self.images_done += len(images)
+            logger.info("Ingest %s: %d/%d products embedded", self.id, self.products_done, self.products_total)
+
+        return cnn_staged, clip_staged, feature_staged, image_metas, product_docs, hashes
+
+    def _publish(self, cnn_staged, clip_staged, feature_staged, image_metas, product_docs, hashes):
+        if not product_docs:
+            return
+        controller = self.add_controller
+        with controller.write_lock:
+            image_metas, product_docs = self._write_catalog(cnn_staged, clip_staged, feature_staged, image_metas, product_docs, hashes)
+
+        # Rendered once the products are live, so a failed job leaves no thumbnails behind
+        for meta in image_metas:
+            controller._generate_thumbnails(meta["image_path"])
+        if controller.product_cache is not None:
+            metas_by_id = {m["image_id"]: m for m in image_metas}
+            for doc in product_docs:
+                controller.product_cache.put(transform_product(doc, metas_by_id))
+
+    def _write_catalog(self, cnn_staged, clip_staged, feature_staged, image_metas, product_docs, hashes):
+        """
+        Append the staged products to the live catalog, under the write lock.
+        Returns the image metadata and product documents actually written.
+        """
+        controller = self.add_controller
+
+        # /add_product may have added some of the item_ids while this job was embedding
+        taken = self._existing_item_ids([doc["item_id"] for doc in product_docs])
+        for item_id in taken:
+            self._error(f"Product with item_id '{item_id}' already exists")
+        self.products_done -= len(taken)
+        self.products_skipped += len(taken)
+        # Rows of the staged stores are in the original image_metas order
+        staged_rows = np.array([i for i, meta in enumerate(image_metas) if meta["item_id"] not in taken], dtype="int64")
+        hashes = [hashes[i] for i in staged_rows] if hashes else hashes
+        image_metas = [image_metas[i] for i in staged_rows]
+        product_docs = [doc for doc in product_docs if doc["item_id"] not in taken]
+        if not product_docs:
+            return image_metas, product_docs
+
+        self.catalog_written = True
+        cnn_start = clip_start = None
+        for start in range(0, len(staged_rows), self.batch_size * 8):
+            rows = staged_rows[start:start + self.batch_size * 8]
+            first_cnn, first_clip = controller._add_embeddings(cnn_staged.get(rows), clip_staged.get(rows))
+            if cnn_start is None:
+                cnn_start, clip_start = first_cnn, first_clip
+
+        cnn_docs = [dict(meta, faiss_index=cnn_start + i) for i, meta in enumerate(image_metas)]
+        clip_docs = [dict(meta, faiss_index=clip_start + i) for i, meta in enumerate(image_metas)]
+        for chunk in iter_batches(cnn_docs, 1000):
+            controller.embedding_cnn_faiss_metadata_col.insert_many(chunk, ordered=False)
+        for chunk in iter_batches(clip_docs, 1000):
+            controller.embedding_clip_faiss_metadata_col.insert_many(chunk, ordered=False)
+
+        if feature_staged is not None:
+            for chunk in iter_batches([m["image_id"] for m in image_metas], 1000):
+                controller.local_feature_store.append(chunk, [feature_staged.get(image_id) for image_id in chunk])
+        if controller.hash_index is not None:
+            controller.hash_index.append([(m["image_id"], m["item_id"], m["image_path"]) for m in image_metas], hashes)
+
+        for chunk in iter_batches(product_docs, 1000):
+            # insert_many adds _id to the docs, which the product cache must not carry
+            controller.products_col.insert_many([dict(doc) for doc in chunk], ordered=False)
+        for chunk in iter_batches(product_docs, self.batch_size):
+            controller._add_item_names(chunk)
+        controller.publish()
+        return image_metas, product_docs
+
+
+class IngestManager:
+    """
+    Runs ingest jobs one at a time in a background thread and keeps
+    the most recent INGEST_KEEP_JOBS of them for progress polling.
+    """
+    def __init__(self, add_controller, keep: int = INGEST_KEEP_JOBS):
+        self.add_controller = add_controller
+        self.keep = keep
+        self.jobs: Dict[str, IngestJob] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+
+    def submit(self, manifest_path: str, images_path: str) -> IngestJob:
+        job = IngestJob(self.add_controller, manifest_path, images_path)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.keep:
+                oldest = next(iter(self.jobs.values()))
+                if oldest.status in ("queued", "running"):
+                    break
+                self.jobs.pop(oldest.id)
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,187 @@
+import json
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+ORB_MAX_FEATURES = 500
+MAX_IMAGE_SIDE = 512  # local features are computed on a downscaled copy
+RATIO_TEST = 0.75
+MIN_MATCHES_FOR_RANSAC = 8
+RANSAC_REPROJ_THRESHOLD = 5.0
+
+DESCRIPTOR_BYTES = 32  # ORB descriptors are 256-bit
+
+# cv2 objects can't be pickled, so each process lazily creates its own
+_detector = None
+_matcher = None
+
+def _cv2():
+    # OpenCV is only needed with geometric re-verification (LOCAL_FEATURES_PATH), so the API starts without it
+    import cv2
+    return cv2
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        _detector = _cv2().ORB_create(nfeatures=ORB_MAX_FEATURES)
+    return _detector
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        cv2 = _cv2()
+        _matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+    return _matcher
+
+def extract_local_features(image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ORB keypoints and descriptors of a PIL image.
+    Returns (N x 2 float32 keypoint coordinates, N x 32 uint8 descriptors).
+    """
+    gray = image.convert("L")
+    gray.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    keypoints, descriptors = get_detector().detectAndCompute(np.array(gray), None)
+    if descriptors is None:
+        return np.zeros((0, 2), dtype=np.float32), np.zeros((0, DESCRIPTOR_BYTES), dtype=np.uint8)
+    points = np.array([kp.pt for kp in keypoints], dtype=np.float32)
+    return points, descriptors
+
+def extract_local_features_from_path(image_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    with Image.open(image_path) as image:
+        return extract_local_features(image)
+
+def count_inliers(query_points, query_desc, cand_points, cand_desc) -> int:
+    """
+    Number of ratio-test ORB matches consistent with a RANSAC homography.
+    """
+    if len(query_desc) < 2 or len(cand_desc) < 2:
+        return 0
+    pairs = get_matcher().knnMatch(query_desc, cand_desc, k=2)
+    good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < RATIO_TEST * p[1].distance]
+    if len(good) < MIN_MATCHES_FOR_RANSAC:
+        return 0
+    src = query_points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+    dst = cand_points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+    cv2 = _cv2()
+    _, mask = cv2.findHomography(src, dst, cv2.RANSAC, RANSAC_REPROJ_THRESHOLD)
+    return int(mask.sum()) if mask is not None else 0
+
+
+class LocalFeatureStore:
+    """
+    Compact on-disk store of ORB features keyed by image_id, read through memory maps:
+      {prefix}.kp.f32       all keypoint coordinates, concatenated
+      {prefix}.desc.u8      all descriptors, concatenated
+      {prefix}.offsets.i64  row offsets, image i owns rows offsets[i]:offsets[i+1]
+      {prefix}.ids.jsonl    image_id of each image, one JSON string per line
+    Every file is append-only. An append writes the features, then the offsets, then the ids,
+    so readers only use images whose id line is complete and never see a half-written image.
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        if not os.path.exists(self._paths(prefix)[3]) and os.path.exists(prefix + ".ids.json"):
+            self._migrate_legacy(prefix)
+        self.image_ids: List[str] = []
+        self.positions = {}
+        self._ids_bytes = 0
+        self.refresh()
+
+    @staticmethod
+    def _paths(prefix: str):
+        return prefix + ".kp.f32", prefix + ".desc.u8", prefix + ".offsets.i64", prefix + ".ids.jsonl"
+
+    @classmethod
+    def exists(cls, prefix: str) -> bool:
+        return bool(prefix) and (os.path.exists(cls._paths(prefix)[3]) or os.path.exists(prefix + ".ids.json"))
+
+    @classmethod
+    def _migrate_legacy(cls, prefix: str):
+        # Stores written before the files became append-only kept offsets.npy and a JSON list of ids
+        _, _, offsets_path, ids_path = cls._paths(prefix)
+        np.load(prefix + ".offsets.npy").astype(np.int64).tofile(offsets_path + ".tmp")
+        os.replace(offsets_path + ".tmp", offsets_path)
+        with open(prefix + ".ids.json", "r") as f:
+            image_ids = json.load(f)
+        with open(ids_path + ".tmp", "w") as f:
+            f.writelines(json.dumps(image_id) + "\n" for image_id in image_ids)
+        os.replace(ids_path + ".tmp", ids_path)
+
+    @classmethod
+    def create(cls, prefix: str) -> "LocalFeatureStore":
+        kp_path, desc_path, offsets_path, ids_path = cls._paths(prefix)
+        open(kp_path, "wb").close()
+        open(desc_path, "wb").close()
+        np.zeros(1, dtype=np.int64).tofile(offsets_path)
+        open(ids_path, "w").close()
+        return cls(prefix)
+
+    def refresh(self):
+        """
+        Pick up images appended since the last refresh; only the new id lines are read.
+        """
+        kp_path, desc_path, offsets_path, ids_path = self._paths(self.prefix)
+        with open(ids_path, "rb") as f:
+            f.seek(self._ids_bytes)
+            tail = f.read()
+        complete = tail[:tail.rfind(b"\n") + 1]
+        new_ids = [json.loads(line) for line in complete.splitlines()]
+
+        # Maps first, positions last, so a concurrent get() never indexes past the offsets it sees
+        count = len(self.image_ids) + len(new_ids)
+        offsets = np.memmap(offsets_path, dtype=np.int64, mode="r", shape=(count + 1,))
+        rows = int(offsets[-1])
+        if rows:
+            self.points = np.memmap(kp_path, dtype=np.float32, mode="r", shape=(rows, 2))
+            self.descriptors = np.memmap(desc_path, dtype=np.uint8, mode="r", shape=(rows, DESCRIPTOR_BYTES))
+        else:
+            self.points = np.zeros((0, 2), dtype=np.float32)
+            self.descriptors = np.zeros((0, DESCRIPTOR_BYTES), dtype=np.uint8)
+        self.offsets = offsets
+        for image_id in new_ids:
+            self.positions[image_id] = len(self.image_ids)
+            self.image_ids.append(image_id)
+        self._ids_bytes += len(complete)
+
+    def __len__(self) -> int:
+        return len(self.image_ids)
+
+    def get(self, image_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self.positions.get(image_id)
+        if i is None:
+            return None
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return np.asarray(self.points[start:end]), np.asarray(self.descriptors[start:end])
+
+    def append(self, image_ids: List[str], features: List[Tuple[np.ndarray, np.ndarray]]):
+        kp_path, desc_path, offsets_path, ids_path = self._paths(self.prefix)
+        offsets = [int(self.offsets[-1])]
+        with open(kp_path, "ab") as kp_file, open(desc_path, "ab") as desc_file:
+            for points, descriptors in features:
+                kp_file.write(np.ascontiguousarray(points, dtype=np.float32).tobytes())
+                desc_file.write(np.ascontiguousarray(descriptors, dtype=np.uint8).tobytes())
+                offsets.append(offsets[-1] + len(points))
+        with open(offsets_path, "ab") as f:
+            f.write(np.array(offsets[1:], dtype=np.int64).tobytes())
+        # The id lines publish the images, so they go last
+        with open(ids_path, "a") as f:
+            f.write("".join(json.dumps(image_id) + "\n" for image_id in image_ids))
+        self.refresh()
+
+
+# Process-pool side: each worker opens the store once and verifies a chunk of candidates
+_worker_store = None
+
+def init_verification_worker(prefix: str):
+    global _worker_store
+    _worker_store = LocalFeatureStore(prefix)
+
+def verify_candidates(query_points, query_desc, image_ids: List[str], store_version: int) -> List[int]:
+    # Pick up images appended since the worker opened the store
+    if len(_worker_store) < store_version:
+        _worker_store.refresh()
+    counts = []
+    for image_id in image_ids:
+        features = _worker_store.get(image_id)
+        counts.append(count_inliers(query_points, query_desc, *features) if features else 0)
+    return counts
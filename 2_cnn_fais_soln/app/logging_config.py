@@ -0,0 +1,24 @@
+import logging
+import sys
+
+def configure_logging(level: str = "INFO", fmt: str = "json"):
+    """
+    Leveled logging for the API, as JSON lines when python-json-logger is installed.
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    formatter = None
+    if fmt == "json":
+        try:
+            from pythonjsonlogger.json import JsonFormatter
+        except ImportError:
+            try:
+                from pythonjsonlogger.jsonlogger import JsonFormatter
+            except ImportError:
+                JsonFormatter = None
+        if JsonFormatter is not None:
+            formatter = JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    handler.setFormatter(formatter or logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
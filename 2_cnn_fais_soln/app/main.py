@@ -1,23 +1,106 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.config import SHOE_IMAGES_FOLDER, FAISS_INDEX_PATH, CLIP_FAISS_INDEX_PATH
-from app.model import extract_embedding, extract_clip_embedding
+from app.config import (
+    SHOE_IMAGES_FOLDER,
+    FAISS_INDEX_PATH,
+    CLIP_FAISS_INDEX_PATH,
+    CNN_EMBEDDINGS_PATH,
+    CLIP_EMBEDDINGS_PATH,
+    CNN_PQ_INDEX_PATH,
+    CLIP_PQ_INDEX_PATH,
+    TWO_STAGE_CANDIDATES,
+    LOCAL_FEATURES_PATH,
+    GEOMETRIC_CANDIDATES,
+    GEOMETRIC_MIN_INLIERS,
+    GEOMETRIC_WORKERS,
+    ITEM_NAME_EMBEDDINGS_PATH,
+    TEXT_SEARCH_NAME_WEIGHT,
+    PRODUCT_CACHE_MAX_SIZE,
+    PRODUCT_CACHE_POLL_SECONDS,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_KEEP,
+    INFERENCE_SOCKET_PATH,
+    INFERENCE_TIMEOUT_SECONDS,
+    INFERENCE_FALLBACK,
+    SEARCH_MAX_CONCURRENT,
+    SEARCH_MAX_QUEUE,
+    SEARCH_DEGRADE_QUEUE_DEPTH,
+    SEARCH_LATENCY_BUDGET_MS,
+    THUMBNAILS_FOLDER,
+    THUMBNAIL_CACHE_MAX_BYTES,
+    PHASH_INDEX_PATH,
+    CNN_BINARY_INDEX_PATH,
+    CLIP_BINARY_INDEX_PATH,
+    BINARY_CANDIDATES,
+    CATALOGS_ROOT,
+    DEFAULT_CATALOG_NAME,
+    CATALOG_MEMORY_BUDGET_BYTES,
+    DRIFT_WINDOW,
+    DRIFT_RESERVOIR_SIZE,
+    DRIFT_SCORE_DROP,
+    MAX_REQUEST_BYTES,
+)
+from app.logging_config import configure_logging
+from app.metrics import INDEX_VECTORS
+from app.profiling import SearchProfiler
+from app.model import (
+    extract_embedding,
+    extract_clip_embedding,
+    extract_embeddings_batch,
+    extract_clip_embeddings_batch,
+    extract_text_embedding,
+    load_models,
+    use_inference_server,
+)
+from app.inference_client import InferenceClient
 from app.search import load_index, load_embedding_metadata, save_index, search, load_product_metadata
+from app.embedding_store import EmbeddingStore, IndexVectors, KeyedEmbeddingStore
+from app.local_features import LocalFeatureStore, init_verification_worker
+from app.db.mongo import embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, products_col, catalog_meta_col
+from app.product_cache import ProductCache, ProductCacheWatcher
 
 from app.services.cnn_faiss import CNNFaissSearch
 from app.services.clip_faiss import CLIPFaissSearch
+from app.services.two_stage_faiss import TwoStageFaissSearch, CNNCLIPRerankSearch
+from app.services.geometric_rerank import GeometricRerankSearch
+from app.services.clip_text import CLIPTextSearch
 from app.controllers.search_controller import SearchController
+from app.admission import AdmissionController, ReadWriteLock
+from app.calibration import load_calibration, register_calibration, search_knob
 from app.controllers.products_controller import ProductsController
 from app.controllers.add_controller import AddController
 
 from app.routes import search as search_routes
 from app.routes import products as products_routes
 from app.routes import add as add_routes
+from app.routes import metrics as metrics_routes
+from app.routes import admin as admin_routes
+from app.routes import thumbs as thumbs_routes
+from app.routes import ingest as ingest_routes
+from app.routes import catalogs as catalogs_routes
+from app.catalogs import Catalog, CatalogRegistry
+from app.ingest import IngestManager
+from app.thumbnails import ThumbnailDiskCache
+from app.uploads import RequestSizeLimitMiddleware
+from app.perceptual_hash import PerceptualHashIndex
+from app.binary_index import BinaryCoarseIndex
+from app.drift import DriftMonitor, load_catalog_stats
+
+configure_logging(LOG_LEVEL, LOG_FORMAT)
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Added before CORS so that 413 answers still carry the CORS headers
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -26,31 +109,225 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Models live in the shared inference process when configured, otherwise in this worker
+if INFERENCE_SOCKET_PATH:
+    use_inference_server(InferenceClient(INFERENCE_SOCKET_PATH, INFERENCE_TIMEOUT_SECONDS), INFERENCE_FALLBACK)
+    logger.info("Embedding through inference server at %s (fallback=%s)", INFERENCE_SOCKET_PATH, INFERENCE_FALLBACK)
+else:
+    load_models()
+
 # Load FAISS index and embedding metadata
 index = load_index(FAISS_INDEX_PATH)
 clip_index = load_index(CLIP_FAISS_INDEX_PATH)
 
+# Recall/latency tables of approximate indexes, used to pick nprobe/efSearch per request
+for index_name, loaded_index, index_path in [("cnn", index, FAISS_INDEX_PATH), ("clip", clip_index, CLIP_FAISS_INDEX_PATH)]:
+    calibration = load_calibration(index_path)
+    if calibration is not None:
+        register_calibration(loaded_index, calibration)
+        if calibration.ntotal != loaded_index.ntotal:
+            logger.info("%s index has %s vectors, calibrated at %s", index_name, loaded_index.ntotal, calibration.ntotal)
+
+# Optional two-stage retrieval inputs: full-precision stores and compressed PQ indexes
+def _load_optional_store(path):
+    return EmbeddingStore(path) if path and os.path.exists(path) else None
+
+def _load_optional_index(path):
+    return load_index(path) if path and os.path.exists(path) else None
+
+cnn_store = _load_optional_store(CNN_EMBEDDINGS_PATH)
+clip_store = _load_optional_store(CLIP_EMBEDDINGS_PATH)
+cnn_pq_index = _load_optional_index(CNN_PQ_INDEX_PATH)
+clip_pq_index = _load_optional_index(CLIP_PQ_INDEX_PATH)
+
+def _load_optional_binary_index(path):
+    return BinaryCoarseIndex.load(path) if path and os.path.exists(path) else None
+
+cnn_binary_index = _load_optional_binary_index(CNN_BINARY_INDEX_PATH)
+clip_binary_index = _load_optional_binary_index(CLIP_BINARY_INDEX_PATH)
+
+def _exact_vectors(store, index):
+    # Re-scoring needs the vectors as added: the mmap'd store, else the main index if it is flat
+    if store is not None:
+        return store
+    return IndexVectors(index) if IndexVectors.is_exact(index) else None
+
+cnn_exact_vectors = _exact_vectors(cnn_store, index)
+clip_exact_vectors = _exact_vectors(clip_store, clip_index)
+
+# Index sizes are read at scrape time, so adds show up without extra bookkeeping
+for index_name, loaded_index, index_path, metadata_col in [
+    ("cnn", index, FAISS_INDEX_PATH, embedding_cnn_faiss_metadata_col),
+    ("clip", clip_index, CLIP_FAISS_INDEX_PATH, embedding_clip_faiss_metadata_col),
+    ("cnn_pq", cnn_pq_index, CNN_PQ_INDEX_PATH, embedding_cnn_faiss_metadata_col),
+    ("clip_pq", clip_pq_index, CLIP_PQ_INDEX_PATH, embedding_clip_faiss_metadata_col),
+    ("cnn_binary", cnn_binary_index, CNN_BINARY_INDEX_PATH, embedding_cnn_faiss_metadata_col),
+    ("clip_binary", clip_binary_index, CLIP_BINARY_INDEX_PATH, embedding_clip_faiss_metadata_col),
+]:
+    if loaded_index is not None:
+        INDEX_VECTORS.labels(index_name).set_function(lambda loaded_index=loaded_index: loaded_index.ntotal)
+        admin_routes.indexes[index_name] = (loaded_index, index_path, metadata_col)
+
 # Mount static files for images
 app.mount("/images", StaticFiles(directory=SHOE_IMAGES_FOLDER), name="images")
 
+# Thumbnails: precomputed under THUMBNAILS_FOLDER, missing ones generated into an LRU disk cache
+if THUMBNAILS_FOLDER:
+    thumbs_routes.thumbnail_cache = ThumbnailDiskCache(os.path.join(THUMBNAILS_FOLDER, "_cache"), THUMBNAIL_CACHE_MAX_BYTES)
+    app.include_router(thumbs_routes.router)
+
+# Query stream statistics against the catalog statistics saved at build time. Only the
+# search services see the wrapped extractors, so catalog adds do not count as queries.
+drift_monitor = DriftMonitor(
+    {"cnn": load_catalog_stats(FAISS_INDEX_PATH), "clip": load_catalog_stats(CLIP_FAISS_INDEX_PATH)},
+    DRIFT_WINDOW, DRIFT_RESERVOIR_SIZE, DRIFT_SCORE_DROP,
+)
+extract_embedding = drift_monitor.observe("cnn", extract_embedding)
+extract_clip_embedding = drift_monitor.observe("clip", extract_clip_embedding)
+
 # Initialize services and controllers
-cnn_faiss_service = CNNFaissSearch(index, extract_embedding, search)
-clip_faiss_service = CLIPFaissSearch(clip_index, extract_clip_embedding, search)
+cnn_faiss_service = CNNFaissSearch(index, extract_embedding, search, extract_embeddings_batch)
+clip_faiss_service = CLIPFaissSearch(clip_index, extract_clip_embedding, search, extract_clip_embeddings_batch)
+
+# Searches run in a bounded thread pool behind a bounded queue; see app/admission.py
+search_admission = AdmissionController(SEARCH_MAX_CONCURRENT, SEARCH_MAX_QUEUE, SEARCH_DEGRADE_QUEUE_DEPTH)
+# Searches read the indexes while /add_product appends to them; see ReadWriteLock
+index_lock = ReadWriteLock()
+search_controller = SearchController(
+    cnn_faiss_service, clip_faiss_service, search_admission, latency_budget_ms=SEARCH_LATENCY_BUDGET_MS or None,
+    index_lock=index_lock,
+)
+search_controller.drift_monitor = drift_monitor
+
+# Perceptual-hash fast path for copies of catalog images, when the hash index was built
+hash_index = None
+if PerceptualHashIndex.exists(PHASH_INDEX_PATH):
+    hash_index = PerceptualHashIndex(PHASH_INDEX_PATH)
+    search_controller.hash_index = hash_index
+    logger.info("Perceptual-hash index loaded with %d images", len(hash_index))
+
+# Two-stage methods: PQ candidates re-ranked with exact vectors from the mmap'd stores.
+# Without a PQ index the CNN stage falls back to the (possibly PCA-reduced) main index.
+cnn_coarse_index = cnn_pq_index if cnn_pq_index is not None else index
+if cnn_store is not None:
+    search_controller.register_service("cnn_two_stage", TwoStageFaissSearch(
+        cnn_coarse_index, cnn_store, extract_embedding, search, embedding_cnn_faiss_metadata_col, TWO_STAGE_CANDIDATES
+    ))
+if clip_store is not None and clip_pq_index is not None:
+    search_controller.register_service("clip_two_stage", TwoStageFaissSearch(
+        clip_pq_index, clip_store, extract_clip_embedding, search, embedding_clip_faiss_metadata_col, TWO_STAGE_CANDIDATES
+    ))
+# Under load an exhaustive (flat) main index degrades to its two-stage method, which scans PQ codes
+# instead of full vectors. IVF/HNSW indexes are already sublinear and the PQ stage would cost more.
+if cnn_pq_index is not None and cnn_store is not None and search_knob(index) is None:
+    search_controller.degraded_methods["cnn_faiss"] = "cnn_two_stage"
+if "clip_two_stage" in search_controller.services and search_knob(clip_index) is None:
+    search_controller.degraded_methods["clip_faiss"] = "clip_two_stage"
+# Binary methods: Hamming candidates from the 1-bit index, re-scored with exact float vectors
+# (mmap'd store when available, otherwise the main index if it is flat)
+for model, binary_index, exact_vectors, extract, metadata_col in [
+    ("cnn", cnn_binary_index, cnn_exact_vectors, extract_embedding, embedding_cnn_faiss_metadata_col),
+    ("clip", clip_binary_index, clip_exact_vectors, extract_clip_embedding, embedding_clip_faiss_metadata_col),
+]:
+    if binary_index is None:
+        continue
+    if exact_vectors is None:
+        logger.warning("%s_binary disabled: it needs the embedding store when the main index is not flat", model)
+        continue
+    search_controller.register_service(f"{model}_binary", TwoStageFaissSearch(
+        binary_index, exact_vectors, extract, search, metadata_col, BINARY_CANDIDATES
+    ))
+if clip_exact_vectors is not None:
+    search_controller.register_service("cnn_clip_rerank", CNNCLIPRerankSearch(
+        cnn_coarse_index,
+        extract_embedding,
+        clip_exact_vectors,
+        extract_clip_embedding,
+        search,
+        embedding_cnn_faiss_metadata_col,
+        embedding_clip_faiss_metadata_col,
+    ))
+else:
+    logger.warning("cnn_clip_rerank disabled: it needs the CLIP embedding store when the CLIP index is not flat")
 
-search_controller = SearchController(cnn_faiss_service, clip_faiss_service)
-products_controller = ProductsController()
+# Geometric re-verification of CNN/CLIP candidates with precomputed ORB features
+local_feature_store = None
+if LocalFeatureStore.exists(LOCAL_FEATURES_PATH):
+    local_feature_store = LocalFeatureStore(LOCAL_FEATURES_PATH)
+    # spawn: workers only need OpenCV and the store, not a forked copy of the torch models
+    verification_pool = ProcessPoolExecutor(
+        max_workers=GEOMETRIC_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_verification_worker,
+        initargs=(LOCAL_FEATURES_PATH,),
+    )
+    app.add_event_handler("shutdown", verification_pool.shutdown)
+    for method, base_service in [("cnn_geometric", cnn_faiss_service), ("clip_geometric", clip_faiss_service)]:
+        search_controller.register_service(method, GeometricRerankSearch(
+            base_service, local_feature_store, verification_pool, GEOMETRIC_WORKERS,
+            GEOMETRIC_CANDIDATES, GEOMETRIC_MIN_INLIERS,
+        ))
+
+# Text-to-image search on the CLIP index, hybrid with item_name embeddings when built
+item_name_store = KeyedEmbeddingStore(ITEM_NAME_EMBEDDINGS_PATH) if KeyedEmbeddingStore.exists(ITEM_NAME_EMBEDDINGS_PATH) else None
+search_controller.text_search = CLIPTextSearch(
+    clip_index, extract_text_embedding, search, item_name_store, TEXT_SEARCH_NAME_WEIGHT
+)
+
+# Product catalog cache, warmed now and kept fresh by a change stream / version poller
+product_cache = None
+if PRODUCT_CACHE_MAX_SIZE:
+    product_cache = ProductCache(PRODUCT_CACHE_MAX_SIZE)
+    product_cache.warm(products_col, embedding_cnn_faiss_metadata_col)
+    logger.info("Product cache warmed with %d products", len(product_cache))
+    product_cache_watcher = ProductCacheWatcher(product_cache, products_col, catalog_meta_col, PRODUCT_CACHE_POLL_SECONDS)
+    product_cache_watcher.start()
+    app.add_event_handler("shutdown", product_cache_watcher.stop)
+
+products_controller = ProductsController(product_cache)
 add_controller = AddController(
     faiss_cnn_index=index, 
-    faiss_clip_index = clip_index
+    faiss_clip_index = clip_index,
+    cnn_store=cnn_store,
+    clip_store=clip_store,
+    cnn_pq_index=cnn_pq_index,
+    clip_pq_index=clip_pq_index,
+    local_feature_store=local_feature_store,
+    product_cache=product_cache,
+    hash_index=hash_index,
+    cnn_binary_index=cnn_binary_index,
+    clip_binary_index=clip_binary_index,
+    item_name_store=item_name_store,
+    index_lock=index_lock,
 )
 
 
+# The catalog above is the default one; named catalogs under CATALOGS_ROOT load on first use
+# and share the models, the search thread pool and admission control with it
+default_catalog = Catalog(DEFAULT_CATALOG_NAME, search_controller, products_controller, add_controller, SHOE_IMAGES_FOLDER)
+catalog_registry = CatalogRegistry(
+    default_catalog, CATALOGS_ROOT, search_admission, SEARCH_LATENCY_BUDGET_MS or None, CATALOG_MEMORY_BUDGET_BYTES
+)
+
 # Inject controllers into routers
-search_routes.search_controller = search_controller
-products_routes.products_controller = products_controller
-add_routes.add_controller = add_controller
+search_routes.catalog_registry = catalog_registry
+search_profiler = SearchProfiler(PROFILE_SAMPLE_RATE, PROFILE_KEEP)
+search_routes.search_profiler = search_profiler
+admin_routes.search_profiler = search_profiler
+products_routes.catalog_registry = catalog_registry
+add_routes.catalog_registry = catalog_registry
+catalogs_routes.catalog_registry = catalog_registry
+admin_routes.catalog_registry = catalog_registry
+admin_routes.drift_monitor = drift_monitor
+ingest_manager = IngestManager(add_controller)
+app.add_event_handler("shutdown", ingest_manager.shutdown)
+ingest_routes.ingest_manager = ingest_manager
 
 # Include routers
 app.include_router(search_routes.router)
 app.include_router(products_routes.router)
 app.include_router(add_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(admin_routes.router)
+app.include_router(ingest_routes.router)
+app.include_router(catalogs_routes.router)
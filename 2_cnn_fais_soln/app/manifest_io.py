@@ -0,0 +1,60 @@
+"""
+Catalog manifests (products and image paths) as JSON Lines or JSON arrays, optionally gzip-compressed.
+Written by dataset_download/src and read by the app; dependency-free so both sides import this one module.
+"""
+import gzip
+import json
+from typing import Iterator
+
+
+def _open_text(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _is_jsonl(path: str) -> bool:
+    return path.endswith((".jsonl", ".jsonl.gz"))
+
+
+class RecordWriter:
+    """
+    Streams records to a .jsonl file (one JSON object per line) or, for any other
+    extension, to a JSON array written element by element, which is what
+    older readers of the manifests expect. Use as a context manager.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = _is_jsonl(path)
+        self.count = 0
+
+    def __enter__(self) -> "RecordWriter":
+        self._f = _open_text(self.path, "w")
+        if not self.jsonl:
+            self._f.write("[")
+        return self
+
+    def write(self, record: dict):
+        if self.jsonl:
+            self._f.write(json.dumps(record) + "\n")
+        else:
+            self._f.write(("," if self.count else "") + "\n  " + json.dumps(record))
+        self.count += 1
+
+    def __exit__(self, *exc):
+        if not self.jsonl:
+            self._f.write("\n]\n")
+        self._f.close()
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """
+    Records of a .jsonl(.gz) file line by line, or of a JSON array file.
+    """
+    with _open_text(path, "r") as f:
+        if _is_jsonl(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
@@ -0,0 +1,103 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+
+# Search method of the request being served; set by SearchController so that
+# stages timed deep inside models and services are labelled with it
+current_method: ContextVar[str] = ContextVar("current_method", default="none")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+SEARCH_STAGE_SECONDS = Histogram(
+    "search_stage_seconds",
+    "Latency of one stage of the search pipeline",
+    ["method", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "End-to-end latency of API requests",
+    ["endpoint", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being served",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+INDEX_VECTORS = Gauge(
+    "faiss_index_vectors",
+    "Number of vectors in a loaded FAISS index",
+    ["index"],
+    multiprocess_mode="max",
+)
+INDEX_VERSION = Gauge(
+    "faiss_index_version",
+    "Number of changes applied to a loaded FAISS index since startup",
+    ["index"],
+    multiprocess_mode="max",
+)
+
+CATALOG_EVENTS = Counter(
+    "catalog_events_total",
+    "Named catalogs loaded into or evicted from memory",
+    ["catalog", "event"],
+)
+
+# Drift of the query stream (app/drift.py), as means over the last DRIFT_WINDOW searches of each worker;
+# the lowest top-1 and highest distance across workers are exported, as they show a drift first
+SEARCH_TOP1_SCORE = Gauge(
+    "search_top1_score",
+    "Mean top-1 score of recent searches",
+    ["method"],
+    multiprocess_mode="livemin",
+)
+QUERY_CENTROID_DISTANCE = Gauge(
+    "query_centroid_distance",
+    "Mean cosine distance of recent query embeddings to the catalog centroid",
+    ["model"],
+    multiprocess_mode="livemax",
+)
+
+SEARCH_QUEUE_DEPTH = Gauge(
+    "search_queue_depth",
+    "Searches waiting for an execution slot",
+    multiprocess_mode="livesum",
+)
+SEARCH_REJECTED = Counter(
+    "search_rejected_total",
+    "Searches refused by admission control, by reason (queue_full, queue_timeout, deadline_exceeded)",
+    ["reason"],
+)
+SEARCH_DEGRADED = Counter(
+    "search_degraded_total",
+    "Searches served with cheaper settings because the service was overloaded",
+    ["method"],
+)
+
+@contextmanager
+def stage_timer(stage: str, method: str = None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SEARCH_STAGE_SECONDS.labels(method or current_method.get(), stage).observe(time.perf_counter() - start)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def render_metrics() -> bytes:
+    # With several uvicorn workers, PROMETHEUS_MULTIPROC_DIR aggregates all of them
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
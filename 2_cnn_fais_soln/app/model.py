@@ -1,49 +1,168 @@
 from PIL import Image
+from typing import List
+from functools import lru_cache
+import logging
+import threading
 import torch
 from torchvision import models, transforms
 import numpy as np
 import clip
+from app.metrics import stage_timer, record_cache
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+logger = logging.getLogger(__name__)
 
-# Load pretrained ResNet50 without classification head
-model = models.resnet50(pretrained=True)
-model = torch.nn.Sequential(*list(model.children())[:-1]).to(device)
-model.eval()
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
-clip_model.eval()
+TEXT_EMBEDDING_CACHE_SIZE = 4096
 
 preprocess = transforms.Compose([
     transforms.Resize((224, 224)),
     transforms.ToTensor(),
     transforms.Normalize(
-        mean=[0.485, 0.456, 0.406], 
+        mean=[0.485, 0.456, 0.406],
         std=[0.229, 0.224, 0.225]
     )
 ])
 
+# Same pipeline clip.load("ViT-B/32") returns, defined here so that API workers
+# can preprocess without loading the CLIP weights
+clip_preprocess = transforms.Compose([
+    transforms.Resize(224, interpolation=transforms.InterpolationMode.BICUBIC),
+    transforms.CenterCrop(224),
+    transforms.ToTensor(),
+    transforms.Normalize(
+        mean=[0.48145466, 0.4578275, 0.40821073],
+        std=[0.26862954, 0.26130258, 0.27577711]
+    )
+])
+
+# Recorded next to built indexes, so vectors from different models are never mixed unnoticed
+CNN_MODEL_NAME = "torchvision-resnet50-imagenet"
+CLIP_MODEL_NAME = "ViT-B/32"
+
+model = None
+clip_model = None
+_load_lock = threading.Lock()
+
+# Set by use_inference_server(); embeddings are then computed by the shared inference process
+_inference_client = None
+_inference_fallback = True
+
+
+def load_models():
+    """
+    Load pretrained ResNet50 (without classification head) and CLIP ViT-B/32.
+    """
+    global model, clip_model
+    with _load_lock:
+        if model is None:
+            resnet = models.resnet50(pretrained=True)
+            model = torch.nn.Sequential(*list(resnet.children())[:-1]).to(device)
+            model.eval()
+        if clip_model is None:
+            clip_model, _ = clip.load(CLIP_MODEL_NAME, device=device)
+            clip_model.eval()
+
+
+def use_inference_server(client, fallback: bool = True):
+    """
+    Route model forward passes to the shared inference process.
+    With fallback, a failed call loads the models in this process and runs locally.
+    """
+    global _inference_client, _inference_fallback
+    _inference_client = client
+    _inference_fallback = fallback
+
+
+def run_model(kind: str, x: np.ndarray) -> np.ndarray:
+    """
+    Forward pass of preprocessed inputs in this process.
+    kind is "cnn" or "clip" (N x 3 x 224 x 224 float32) or "text" (N x 77 tokens).
+    Returns L2-normalized float32 embeddings, one row per input.
+    """
+    if model is None or clip_model is None:
+        load_models()
+    inputs = torch.from_numpy(x).to(device)
+    with torch.no_grad():
+        if kind == "cnn":
+            embs = model(inputs).reshape(len(x), -1)
+        elif kind == "clip":
+            embs = clip_model.encode_image(inputs)
+        elif kind == "text":
+            embs = clip_model.encode_text(inputs)
+        else:
+            raise ValueError(f"Unknown model kind: {kind}")
+    embs = embs.float().cpu().numpy()
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    return embs.astype("float32")
+
+
+def _embed(kind: str, x: np.ndarray) -> np.ndarray:
+    with stage_timer("embed"):
+        if _inference_client is not None:
+            try:
+                return _inference_client.embed(kind, x)
+            except ConnectionError as e:
+                if not _inference_fallback:
+                    raise
+                logger.warning("Inference server unavailable (%s), embedding in-process", e)
+        return run_model(kind, x)
+
+
+def _preprocess_batch(images: List[Image.Image], transform) -> np.ndarray:
+    with stage_timer("preprocess"):
+        return torch.stack([transform(image.convert("RGB")) for image in images]).numpy()
+
+
 def extract_embedding(image: Image.Image) -> np.ndarray:
     """
     Extract a normalized 2048-dim embedding from a PIL image.
     """
-    image = image.convert("RGB")
-    x = preprocess(image).unsqueeze(0).to(device)
-    with torch.no_grad():
-        emb = model(x).squeeze().cpu().numpy()
-    emb /= np.linalg.norm(emb)
-    return emb.astype("float32")
+    return _embed("cnn", _preprocess_batch([image], preprocess))[0]
 
 
 def extract_clip_embedding(image: Image.Image) -> np.ndarray:
     """
     Extract a normalized embedding from a PIL image using CLIP model.
     """
-    image = image.convert("RGB")
-    # Preprocess image for CLIP
-    x = clip_preprocess(image).unsqueeze(0).to(device)
-    with torch.no_grad():
-        emb = clip_model.encode_image(x)
-    emb = emb.squeeze().cpu().numpy()
-    emb /= np.linalg.norm(emb)
-    return emb.astype("float32")
+    return _embed("clip", _preprocess_batch([image], clip_preprocess))[0]
+
+
+def extract_embeddings_batch(images: List[Image.Image]) -> np.ndarray:
+    """
+    Extract normalized 2048-dim embeddings for several images in one forward pass.
+    """
+    return _embed("cnn", _preprocess_batch(images, preprocess))
+
+
+def extract_clip_embeddings_batch(images: List[Image.Image]) -> np.ndarray:
+    """
+    Extract normalized CLIP embeddings for several images in one forward pass.
+    """
+    return _embed("clip", _preprocess_batch(images, clip_preprocess))
+
+
+def extract_text_embeddings_batch(texts: List[str]) -> np.ndarray:
+    """
+    Extract normalized CLIP text embeddings, tokenizing all texts as one batch.
+    """
+    with stage_timer("tokenize"):
+        tokens = clip.tokenize(texts, truncate=True).numpy()
+    return _embed("text", tokens)
+
+
+@lru_cache(maxsize=TEXT_EMBEDDING_CACHE_SIZE)
+def _cached_text_embedding(text: str) -> np.ndarray:
+    emb = extract_text_embeddings_batch([text])[0]
+    emb.setflags(write=False)  # shared by every caller of the cache
+    return emb
+
+
+def extract_text_embedding(text: str) -> np.ndarray:
+    """
+    Normalized CLIP embedding of a text query, cached on the normalized text.
+    """
+    misses = _cached_text_embedding.cache_info().misses
+    emb = _cached_text_embedding(" ".join(text.lower().split()))
+    record_cache("text_embedding", hit=_cached_text_embedding.cache_info().misses == misses)
+    return emb
@@ -1,15 +1,22 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Dict
 
 class SearchRequest(BaseModel):
     method: str = Field(description="Search method")
     top_k: int = Field(default=5, ge=1, le=50, description="Number of top results to return")
+    tta: Literal["none", "mean", "max"] = Field(default="none", description="Test-time augmentation fusion: none, mean or max")
+    latency_budget_ms: Optional[float] = Field(default=None, gt=0, description="Target FAISS search latency, picks nprobe/efSearch on approximate indexes")
 
 class SearchResultItem(BaseModel):
     image_id: str
     item_id: Optional[str]
     image_path: str
     score: float
+    inliers: Optional[int] = None  # RANSAC-verified local feature matches, geometric methods only
+    hash_distance: Optional[int] = None  # perceptual hash Hamming distance, set when the hash fast path answered
 
 class SearchResponse(BaseModel):
     results: List[SearchResultItem]
+    products: Optional[Dict[str, dict]] = None  # item_id -> product, only with include_products
+    profile: Optional[dict] = None  # cProfile/torch report, only with profile=true
+    degraded: bool = False  # served with cheaper settings because the service was overloaded
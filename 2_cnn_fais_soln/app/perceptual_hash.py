@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+from typing import List, Tuple
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8 x 8 = 64-bit hashes
+PHASH_SAMPLE_SIZE = 32
+
+# DCT-II basis for pHash, computed once
+_n = np.arange(PHASH_SAMPLE_SIZE)
+_DCT = np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:, None] / (2 * PHASH_SAMPLE_SIZE))
+
+# Bit counts of every byte value, for numpy versions without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    Difference hash: whether each pixel of a 9 x 8 grayscale thumbnail is brighter than its right neighbour.
+    """
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.float32)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """
+    DCT hash: low-frequency 8 x 8 DCT coefficients of a 32 x 32 grayscale thumbnail compared to their median.
+    More robust than dhash to re-encoding, light resizing and contrast changes.
+    """
+    pixels = np.asarray(image.convert("L").resize((PHASH_SAMPLE_SIZE, PHASH_SAMPLE_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only encodes mean brightness and is left out of the median
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+
+HASH_FUNCTIONS = {"phash": phash, "dhash": dhash}
+
+
+def image_hash(image: Image.Image, kind: str = "phash") -> int:
+    return HASH_FUNCTIONS[kind](image)
+
+
+def image_hash_from_path(image_path: str, kind: str = "phash") -> int:
+    # Process-pool entry point for index builds
+    # Same RGB conversion as search queries, so identical files hash identically
+    with Image.open(image_path) as image:
+        return image_hash(image.convert("RGB"), kind)
+
+
+def hamming_distances(hashes: np.ndarray, query: int) -> np.ndarray:
+    """
+    Hamming distance between a 64-bit query hash and every packed uint64 hash.
+    """
+    xor = hashes ^ np.uint64(query)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+class PerceptualHashIndex:
+    """
+    64-bit perceptual hashes of catalog images, searched by brute-force Hamming distance:
+      {prefix}.meta.json     kind of hash
+      {prefix}.hashes.u64    packed uint64 hashes, one per row
+      {prefix}.images.jsonl  [image_id, item_id, image_path] of each row, one JSON list per line
+    The rows are kept in memory so a hit is answered without a Mongo round trip. Both row files
+    are append-only and an append writes the hashes first, so only rows with a complete line count.
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        if not os.path.exists(self._paths(prefix)[2]) and os.path.exists(prefix + ".hashes.npy"):
+            self._migrate_legacy(prefix)
+        meta_path = self._paths(prefix)[0]
+        with open(meta_path, "r") as f:
+            self.kind = json.load(f)["kind"]
+        # (hashes, images) swapped as one tuple, so a search never sees hashes without their rows
+        self._rows = (np.zeros(0, dtype=np.uint64), [])
+        self._images_bytes = 0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @staticmethod
+    def _paths(prefix: str):
+        return prefix + ".meta.json", prefix + ".hashes.u64", prefix + ".images.jsonl"
+
+    @classmethod
+    def exists(cls, prefix: str) -> bool:
+        return bool(prefix) and (os.path.exists(cls._paths(prefix)[2]) or os.path.exists(prefix + ".hashes.npy"))
+
+    @classmethod
+    def _migrate_legacy(cls, prefix: str):
+        # Indexes written before the files became append-only kept hashes.npy and every row in meta.json
+        meta_path, hashes_path, images_path = cls._paths(prefix)
+        np.load(prefix + ".hashes.npy").astype(np.uint64).tofile(hashes_path + ".tmp")
+        os.replace(hashes_path + ".tmp", hashes_path)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        with open(images_path + ".tmp", "w") as f:
+            f.writelines(json.dumps(image) + "\n" for image in meta["images"])
+        os.replace(images_path + ".tmp", images_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"kind": meta["kind"]}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def create(cls, prefix: str, kind: str = "phash") -> "PerceptualHashIndex":
+        meta_path, hashes_path, images_path = cls._paths(prefix)
+        with open(meta_path, "w") as f:
+            json.dump({"kind": kind}, f)
+        open(hashes_path, "wb").close()
+        open(images_path, "w").close()
+        return cls(prefix)
+
+    def refresh(self):
+        """
+        Pick up rows appended since the last refresh; only the new lines and hashes are read.
+        """
+        _, hashes_path, images_path = self._paths(self.prefix)
+        with self._lock:
+            hashes, images = self._rows
+            with open(images_path, "rb") as f:
+                f.seek(self._images_bytes)
+                tail = f.read()
+            complete = tail[:tail.rfind(b"\n") + 1]
+            new_images = [json.loads(line) for line in complete.splitlines()]
+            if not new_images:
+                return
+            new_hashes = np.fromfile(hashes_path, dtype=np.uint64, count=len(new_images), offset=len(hashes) * 8)
+            self._rows = (np.concatenate([hashes, new_hashes]), images + new_images)
+            self._images_bytes += len(complete)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self._rows[0]
+
+    @property
+    def images(self) -> List[list]:
+        return self._rows[1]
+
+    def __len__(self) -> int:
+        return len(self._rows[1])
+
+    def hash(self, image: Image.Image) -> int:
+        return image_hash(image, self.kind)
+
+    def append(self, images: List[Tuple[str, str, str]], hashes: List[int]):
+        """
+        Add (image_id, item_id, image_path) rows with their hashes to the end of both files.
+        """
+        _, hashes_path, images_path = self._paths(self.prefix)
+        with open(hashes_path, "ab") as f:
+            f.write(np.array(hashes, dtype=np.uint64).tobytes())
+        # The row lines publish the hashes, so they go last
+        with open(images_path, "a") as f:
+            f.write("".join(json.dumps(list(image)) + "\n" for image in images))
+        self.refresh()
+
+    def search(self, query: int, max_distance: int, top_k: int) -> List[dict]:
+        """
+        Images within max_distance bits of the query hash, closest first, as search result dicts.
+        """
+        hashes, images = self._rows
+        if not len(hashes):
+            return []
+        distances = hamming_distances(hashes, query)
+        matches = np.flatnonzero(distances <= max_distance)
+        matches = matches[np.argsort(distances[matches], kind="stable")][:top_k]
+        results = []
+        for position in matches.tolist():
+            image_id, item_id, image_path = images[position]
+            distance = int(distances[position])
+            results.append({
+                "image_id": image_id,
+                "item_id": item_id,
+                "image_path": image_path,
+                "score": 1.0 - distance / (HASH_SIZE * HASH_SIZE),
+                "hash_distance": distance,
+            })
+        return results
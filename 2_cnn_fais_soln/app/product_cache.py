@@ -0,0 +1,209 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from app.data_loading import transform_product
+from app.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+WARM_BATCH_SIZE = 1000
+PRODUCTS_VERSION_ID = "products"
+PRODUCT_CHANGES_KEPT = 100  # change entries kept for pollers; one that falls further behind clears its cache
+MAX_CHANGE_ITEM_IDS = 10000  # larger changes are recorded as "clear everything"
+INVALIDATIONS_KEPT = 10000  # recent per-item invalidations remembered for puts of reads in flight
+
+class ProductCache:
+    """
+    Resident map of transformed product records keyed by item_id,
+    bounded by LRU eviction when max_size is set.
+
+    A reader takes generation() before reading the database and passes it to put(), which
+    drops the record if the item was invalidated since, instead of caching a stale read.
+    """
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size
+        self._products = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # item_id -> generation of its last invalidation, the most recent INVALIDATIONS_KEPT only;
+        # reads older than _floor cannot be checked against the forgotten ones and are not cached
+        self._invalidated = OrderedDict()
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def get(self, item_id: str) -> Optional[dict]:
+        with self._lock:
+            product = self._products.get(item_id)
+            record_cache("products", hit=product is not None)
+            if product is not None:
+                self._products.move_to_end(item_id)
+            return product
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, product: dict, since: int = None):
+        """
+        Cache product. With since (a generation() taken before the read), nothing is cached
+        when the item was invalidated after it.
+        """
+        with self._lock:
+            if since is not None and (since < self._floor or self._invalidated.get(product["item_id"], -1) > since):
+                return
+            self._products[product["item_id"]] = product
+            self._products.move_to_end(product["item_id"])
+            if self.max_size and len(self._products) > self.max_size:
+                self._products.popitem(last=False)
+
+    def invalidate(self, item_id: str):
+        with self._lock:
+            self._products.pop(item_id, None)
+            self._generation += 1
+            self._invalidated[item_id] = self._generation
+            self._invalidated.move_to_end(item_id)
+            if len(self._invalidated) > INVALIDATIONS_KEPT:
+                _, dropped = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, dropped)
+
+    def clear(self):
+        with self._lock:
+            self._products.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._floor = self._generation
+
+    def warm(self, products_col, embedding_metadata_col):
+        """
+        Load products (up to max_size) with their image paths, in batches
+        of WARM_BATCH_SIZE products and one $in metadata query per batch.
+        """
+        generation = self.generation()
+        cursor = products_col.find({}, {"_id": 0}).batch_size(WARM_BATCH_SIZE)
+        if self.max_size:
+            cursor = cursor.limit(self.max_size)
+
+        batch = []
+        for product in cursor:
+            batch.append(product)
+            if len(batch) >= WARM_BATCH_SIZE:
+                self._warm_batch(batch, embedding_metadata_col, generation)
+                batch = []
+        if batch:
+            self._warm_batch(batch, embedding_metadata_col, generation)
+
+    def _warm_batch(self, products: List[dict], embedding_metadata_col, generation: int):
+        image_ids = [img_id for p in products for img_id in _image_ids(p)]
+        docs = embedding_metadata_col.find({"image_id": {"$in": image_ids}}, {"image_id": 1, "image_path": 1})
+        embedding_dict = {doc["image_id"]: doc for doc in docs}
+        for product in products:
+            self.put(transform_product(product, embedding_dict), since=generation)
+
+
+def _image_ids(product: dict) -> Iterable[str]:
+    if product.get("main_image_id"):
+        yield product["main_image_id"]
+    yield from product.get("other_image_id", [])
+
+
+def bump_products_version(catalog_meta_col, changed_item_ids: Iterable[str] = ()):
+    """
+    Signal product changes to the polling watchers of other workers. changed_item_ids are the
+    products whose existing records changed; inserts need none, as no worker has cached them yet.
+    The counter and the change entry move in one update, so a poller never sees one without the other.
+    """
+    changed_item_ids = list(changed_item_ids)
+    change = {"item_ids": changed_item_ids if len(changed_item_ids) <= MAX_CHANGE_ITEM_IDS else None}
+    catalog_meta_col.update_one(
+        {"_id": PRODUCTS_VERSION_ID},
+        {"$inc": {"version": 1}, "$push": {"changes": {"$each": [change], "$slice": -PRODUCT_CHANGES_KEPT}}},
+        upsert=True,
+    )
+
+
+class ProductCacheWatcher:
+    """
+    Background invalidation of a ProductCache, per item_id. Uses a Mongo change stream on the
+    products collection when available (replica sets), otherwise polls the products version
+    counter bumped by writers and invalidates the item_ids of the changes it missed.
+    """
+    def __init__(self, cache: ProductCache, products_col, catalog_meta_col, poll_seconds: float = 5.0):
+        self.cache = cache
+        self.products_col = products_col
+        self.catalog_meta_col = catalog_meta_col
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="product-cache-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        use_change_stream = True
+        while not self._stop.is_set():
+            try:
+                if use_change_stream:
+                    self._watch_change_stream()
+                else:
+                    self._poll_version()
+            except OperationFailure as e:
+                if not use_change_stream:
+                    self._recover(e)
+                    continue
+                # Standalone mongod: change streams need a replica set
+                logger.info("Change streams unavailable (%s), polling products version every %ss", e, self.poll_seconds)
+                use_change_stream = False
+            except PyMongoError as e:
+                self._recover(e)
+
+    def _recover(self, error: Exception):
+        # Changes made while disconnected were missed, so nothing cached can be trusted
+        logger.warning("Product cache watcher lost MongoDB (%s), clearing the cache and reconnecting in %ss",
+                       error, self.poll_seconds)
+        self.cache.clear()
+        self._stop.wait(self.poll_seconds)
+
+    def _watch_change_stream(self):
+        with self.products_col.watch(full_document="updateLookup", max_await_time_ms=int(self.poll_seconds * 1000)) as stream:
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None or change["operationType"] == "insert":
+                    # A new product is not cached by any worker yet; the writer put it itself
+                    continue
+                item_id = (change.get("fullDocument") or {}).get("item_id")
+                if item_id is None:
+                    # Deletes and replacements without the document: drop everything to be safe
+                    self.cache.clear()
+                else:
+                    self.cache.invalidate(item_id)
+
+    def _version_doc(self) -> dict:
+        return self.catalog_meta_col.find_one({"_id": PRODUCTS_VERSION_ID}) or {"version": 0, "changes": []}
+
+    def _poll_version(self):
+        version = self._version_doc()["version"]
+        while not self._stop.wait(self.poll_seconds):
+            doc = self._version_doc()
+            missed = doc["version"] - version
+            if missed:
+                self._apply_changes(doc.get("changes", []), missed)
+                version = doc["version"]
+
+    def _apply_changes(self, changes: List[dict], missed: int):
+        if missed > len(changes):
+            # Older entries were already trimmed from the log
+            self.cache.clear()
+            return
+        for change in changes[len(changes) - missed:]:
+            if change["item_ids"] is None:
+                self.cache.clear()
+                return
+            for item_id in change["item_ids"]:
+                self.cache.invalidate(item_id)
@@ -0,0 +1,99 @@
+import asyncio
+import cProfile
+import contextvars
+import io
+import pstats
+import random
+import time
+import tracemalloc
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Tuple
+import torch
+
+# cProfile only sees its own thread; searches run in admission worker threads,
+# which pick the request's profiler up from here (see run_profiled)
+active_profiler: contextvars.ContextVar[Optional[cProfile.Profile]] = contextvars.ContextVar("active_profiler", default=None)
+
+CPROFILE_ROWS = 40
+TORCH_OP_ROWS = 20
+
+class SearchProfiler:
+    """
+    Captures cProfile and torch profiler reports of single search calls, either on
+    demand or for a random sample of traffic, keeping the most recent reports.
+    cProfile covers the work wrapped in run_profiled, i.e. the search itself in its worker thread.
+    The torch profiler is process-wide, so one search is profiled at a time; its op table still
+    includes ops of unprofiled searches running in the same window.
+    """
+    def __init__(self, sample_rate: float = 0.0, keep: int = 20):
+        self.sample_rate = sample_rate
+        self.reports = deque(maxlen=keep)
+        self._lock = asyncio.Lock()
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def profile(self, label: str, call: Callable[[], Awaitable], wait: bool = True) -> Tuple[object, Optional[dict]]:
+        """
+        Run call() under the profilers. With wait=False (sampled traffic) the call runs
+        unprofiled, returning no report, when another search is being profiled.
+        """
+        if not wait and self._lock.locked():
+            return await call(), None
+        async with self._lock:
+            return await self._profile(label, call)
+
+    async def _profile(self, label: str, call: Callable[[], Awaitable]) -> Tuple[object, dict]:
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        token = active_profiler.set(profiler)
+        try:
+            with torch.profiler.profile(activities=activities) as torch_profiler:
+                result = await call()
+        finally:
+            active_profiler.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        stats_out = io.StringIO()
+        pstats.Stats(profiler, stream=stats_out).sort_stats("cumulative").print_stats(CPROFILE_ROWS)
+        report = {
+            "label": label,
+            "timestamp": time.time(),
+            "wall_ms": round(wall_ms, 3),
+            "cprofile": stats_out.getvalue(),
+            "torch_ops": torch_profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=TORCH_OP_ROWS),
+        }
+        self.reports.append(report)
+        return result, report
+
+
+def run_profiled(fn: Callable, *args):
+    """
+    Call fn(*args), under the current request's cProfile profiler if it is being profiled.
+    """
+    profiler = active_profiler.get()
+    if profiler is None:
+        return fn(*args)
+    profiler.enable()
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+
+
+def tracemalloc_top(limit: int = 25, key_type: str = "lineno") -> List[dict]:
+    """
+    Top allocation sites of the current tracemalloc snapshot.
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    return [
+        {"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics(key_type)[:limit]
+    ]
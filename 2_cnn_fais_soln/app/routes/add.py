@@ -2,11 +2,12 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from typing import List, Optional
 import json
 
-from app.controllers.add_controller import AddController
+from app.catalogs import CatalogRegistry
+from app.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT
 
 router = APIRouter()
 
-add_controller:AddController = None 
+catalog_registry: CatalogRegistry = None  # Initialized in main.py
 
 
 @router.post("/add_product")
@@ -16,6 +17,7 @@ async def add_product(
     item_name: str = Form(...),  # can be JSON string or plain string
     main_image: UploadFile = File(...),
     other_images: Optional[List[UploadFile]] = File(None),
+    catalog: Optional[str] = Form(None, description="Named catalog to add to (default catalog when omitted)"),
 ):
     # Try to parse item_name as JSON list
     try:
@@ -32,12 +34,14 @@ async def add_product(
     # Wrap product_type string in list for your add_product method
     product_type_list = [product_type]
 
-    result = await add_controller.add_product(
-        item_id=item_id,
-        product_type=product_type_list,
-        item_name=item_name_list,
-        main_image=main_image,
-        other_images=other_images,
-    )
+    with REQUESTS_IN_FLIGHT.labels("add_product").track_inprogress(), REQUEST_SECONDS.labels("add_product", "").time():
+        current = await catalog_registry.get(catalog)
+        result = await current.add_controller.add_product(
+            item_id=item_id,
+            product_type=product_type_list,
+            item_name=item_name_list,
+            main_image=main_image,
+            other_images=other_images,
+        )
     return result
 
@@ -0,0 +1,74 @@
+import secrets
+import tracemalloc
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from app.config import ADMIN_TOKEN
+from app.profiling import SearchProfiler, tracemalloc_top
+from app.index_info import describe_index
+from app.catalogs import CatalogRegistry
+from app.drift import DriftMonitor
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and secrets.compare_digest(token, ADMIN_TOKEN)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+search_profiler: SearchProfiler = None  # Initialized in main.py
+indexes: dict = {}  # name -> (index, index_path, metadata_col), set in main.py
+catalog_registry: CatalogRegistry = None  # Initialized in main.py
+drift_monitor: DriftMonitor = None  # Initialized in main.py
+
+@router.get("/profiles")
+async def get_profiles(limit: int = Query(5, ge=1, le=100)):
+    return {"profiles": list(search_profiler.reports)[-limit:]}
+
+@router.post("/tracemalloc/start")
+async def start_tracemalloc(frames: int = Query(10, ge=1, le=50)):
+    tracemalloc.start(frames)
+    return {"tracing": True, "frames": frames}
+
+@router.post("/tracemalloc/stop")
+async def stop_tracemalloc():
+    tracemalloc.stop()
+    return {"tracing": False}
+
+@router.get("/tracemalloc")
+async def get_tracemalloc(
+    limit: int = Query(25, ge=1, le=200),
+    key_type: Literal["lineno", "filename", "traceback"] = Query("lineno"),
+):
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is not running, POST /admin/tracemalloc/start first")
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "current_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "top": tracemalloc_top(limit, key_type),
+    }
+
+@router.get("/indexes")
+async def get_indexes(measure: bool = Query(True, description="Time a few random queries per index for the latency projections")):
+    # Mongo counts and timed searches block, so the report is built off the event loop
+    def describe_all():
+        return {name: describe_index(index, index_path, metadata_col, measure) for name, (index, index_path, metadata_col) in indexes.items()}
+    return {"indexes": await run_in_threadpool(describe_all)}
+
+@router.get("/catalogs")
+async def get_catalogs():
+    loaded = [catalog.to_dict() for catalog in list(catalog_registry.loaded.values())]
+    return {
+        "memory_budget_bytes": catalog_registry.memory_budget,
+        "loaded_bytes": sum(catalog["bytes"] for catalog in loaded),
+        "loaded": loaded,  # least recently used first
+        "available": catalog_registry.names(),
+    }
+
+@router.get("/drift")
+async def get_drift():
+    # Statistics of this worker's queries; the search_top1_score / query_centroid_distance gauges cover all workers
+    return drift_monitor.report()
@@ -0,0 +1,21 @@
+import os
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from app.catalogs import CatalogRegistry
+
+router = APIRouter()
+
+catalog_registry: CatalogRegistry = None  # Initialized in main.py
+
+@router.get("/catalogs")
+async def list_catalogs():
+    return {"default": catalog_registry.default.name, "catalogs": catalog_registry.names()}
+
+@router.get("/catalog_images/{catalog}/{image_path:path}")
+async def get_catalog_image(catalog: str, image_path: str):
+    # Images of named catalogs; the default catalog's are under /images
+    images_root = os.path.realpath((await catalog_registry.get(catalog)).images_folder)
+    path = os.path.realpath(os.path.join(images_root, image_path))
+    if os.path.commonpath([images_root, path]) != images_root or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path)
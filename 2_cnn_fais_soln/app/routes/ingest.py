@@ -0,0 +1,33 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from app.ingest import IngestManager
+from app.routes.admin import require_admin
+
+router = APIRouter(prefix="/admin/ingest", dependencies=[Depends(require_admin)])
+
+ingest_manager: IngestManager = None  # Initialized in main.py
+
+class IngestRequest(BaseModel):
+    manifest_path: str  # JSON Lines product manifest, on the server
+    images_path: str  # image directory or tar archive, on the server
+
+@router.post("", status_code=202)
+async def start_ingest(request: IngestRequest):
+    if not os.path.isfile(request.manifest_path):
+        raise HTTPException(status_code=400, detail=f"Manifest not found: {request.manifest_path}")
+    if not os.path.exists(request.images_path):
+        raise HTTPException(status_code=400, detail=f"Images not found: {request.images_path}")
+    job = ingest_manager.submit(request.manifest_path, request.images_path)
+    return job.to_dict()
+
+@router.get("")
+async def list_ingests():
+    return {"jobs": [job.to_dict() for job in list(ingest_manager.jobs.values())]}
+
+@router.get("/{job_id}")
+async def get_ingest(job_id: str):
+    job = ingest_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job.to_dict()
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
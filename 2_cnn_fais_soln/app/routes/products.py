@@ -1,10 +1,28 @@
-from fastapi import APIRouter
-from app.controllers.products_controller import ProductsController
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.catalogs import CatalogRegistry
+from app.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT
 
 router = APIRouter()
 
-products_controller: ProductsController = None  # Initialized in main.py
+catalog_registry: CatalogRegistry = None  # Initialized in main.py
+
+MAX_BULK_PRODUCTS = 100
+
+@router.get("/products")
+async def get_products(
+    ids: str = Query(..., description="Comma-separated item_ids"),
+    catalog: Optional[str] = Query(None, description="Named catalog (default catalog when omitted)"),
+):
+    item_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if len(item_ids) > MAX_BULK_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_PRODUCTS} ids per request")
+    with REQUESTS_IN_FLIGHT.labels("products_bulk").track_inprogress(), REQUEST_SECONDS.labels("products_bulk", "").time():
+        current = await catalog_registry.get(catalog)
+        return {"products": await current.products_controller.get_products(item_ids)}
 
 @router.get("/products/{item_id}")
-async def get_product(item_id: str):
-    return await products_controller.get_product(item_id)
+async def get_product(item_id: str, catalog: Optional[str] = Query(None, description="Named catalog (default catalog when omitted)")):
+    with REQUESTS_IN_FLIGHT.labels("products").track_inprogress(), REQUEST_SECONDS.labels("products", "").time():
+        current = await catalog_registry.get(catalog)
+        return await current.products_controller.get_product(item_id)
@@ -1,22 +1,85 @@
-from fastapi import APIRouter, Form, UploadFile, File, Depends
+import logging
+from fastapi import APIRouter, Form, UploadFile, File, Depends, Header, HTTPException, Query
+from typing import Literal, Optional
 from app.models.search_models import SearchRequest, SearchResponse
-from app.controllers.search_controller import SearchController
+from app.catalogs import CatalogRegistry
+from app.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, stage_timer
+from app.profiling import SearchProfiler
+from app.routes.admin import is_admin
+from app.admission import search_degraded
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-search_controller: SearchController = None  # Initialized in main.py
+catalog_registry: CatalogRegistry = None  # Initialized in main.py
+search_profiler: SearchProfiler = None  # Initialized in main.py
+
+CATALOG_DESCRIPTION = "Named catalog to search (default catalog when omitted)"
+
+async def _build_response(results, include_products: bool, products_controller) -> SearchResponse:
+    products = None
+    if include_products:
+        with stage_timer("products"):
+            item_ids = list(dict.fromkeys(r["item_id"] for r in results if r.get("item_id")))
+            products = {p["item_id"]: p for p in await products_controller.get_products(item_ids)}
+    with stage_timer("serialize"):
+        return SearchResponse(results=results, products=products, degraded=search_degraded.get())
+
+@router.get("/search/methods")
+async def search_methods(catalog: Optional[str] = Query(None, description=CATALOG_DESCRIPTION)):
+    # Optional methods are only registered when their artifacts were built, so clients ask first
+    current = await catalog_registry.get(catalog)
+    return {"methods": list(current.search_controller.services)}
+
 @router.post("/search/", response_model=SearchResponse)
 async def search_image(
     file: UploadFile = File(...),
-    method: str = Form("cnn_faiss", description="Search method: cnn_faiss or clip_faiss"),
-    top_k: int = Form(5, ge=1, le=50, description="Number of top results to return")
+    method: str = Form("cnn_faiss", description="Search method: cnn_faiss, clip_faiss, cnn_two_stage, clip_two_stage, cnn_binary, clip_binary, cnn_clip_rerank, cnn_geometric or clip_geometric"),
+    top_k: int = Form(5, ge=1, le=50, description="Number of top results to return"),
+    tta: Literal["none", "mean", "max"] = Form("none", description="Test-time augmentation: none, mean (mean embedding) or max (max-score fusion)"),
+    include_products: bool = Form(False, description="Also return the matched products with their image paths"),
+    profile: bool = Form(False, description="Return a cProfile/torch profiler report of this search (admin only)"),
+    deadline_ms: Optional[float] = Form(None, gt=0, description="Give up after this many milliseconds (capped by SEARCH_DEADLINE_MS)"),
+    latency_budget_ms: Optional[float] = Form(None, gt=0, description="Target FAISS search latency; picks nprobe/efSearch on calibrated approximate indexes"),
+    catalog: Optional[str] = Form(None, description=CATALOG_DESCRIPTION),
+    x_admin_token: Optional[str] = Header(None),
+):
+    if profile and not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling requires an admin token")
+    current = await catalog_registry.get(catalog)
+    search_controller = current.search_controller
+    logger.debug("Received search request: method=%s, top_k=%s, tta=%s", method, top_k, tta)
+    params = SearchRequest(method=method, top_k=top_k, tta=tta, latency_budget_ms=latency_budget_ms)
+    # Unknown methods are rejected later; keep them out of the metric labels
+    method_label = method if method in search_controller.services else "unknown"
+    with REQUESTS_IN_FLIGHT.labels("search").track_inprogress(), REQUEST_SECONDS.labels("search", method_label).time():
+        if profile or search_profiler.should_sample():
+            # Requested profiles wait their turn; sampled ones are skipped while another runs
+            results, report = await search_profiler.profile(
+                f"search method={method} top_k={top_k} tta={tta}",
+                lambda: search_controller.search(file, params, deadline_ms),
+                wait=profile,
+            )
+            response = await _build_response(results, include_products, current.products_controller)
+            if profile:
+                response.profile = report
+            return response
+        results = await search_controller.search(file, params, deadline_ms)
+        return await _build_response(results, include_products, current.products_controller)
+
+@router.post("/search/text", response_model=SearchResponse)
+async def search_text(
+    query: str = Form(..., description="Text describing the product"),
+    top_k: int = Form(5, ge=1, le=50, description="Number of top results to return"),
+    hybrid: bool = Form(False, description="Blend image scores with item_name text similarity"),
+    include_products: bool = Form(False, description="Also return the matched products with their image paths"),
+    deadline_ms: Optional[float] = Form(None, gt=0, description="Give up after this many milliseconds (capped by SEARCH_DEADLINE_MS)"),
+    latency_budget_ms: Optional[float] = Form(None, gt=0, description="Target FAISS search latency; picks nprobe/efSearch on calibrated approximate indexes"),
+    catalog: Optional[str] = Form(None, description=CATALOG_DESCRIPTION),
 ):
-    print(f"Received search request: method={method}, top_k={top_k}")
-    class Params:
-        def __init__(self, method, top_k):
-            self.method = method
-            self.top_k = top_k
-
-    params = Params(method, top_k)
-    results = await search_controller.search(file, params)
-    return SearchResponse(results=results)
\ No newline at end of file
+    current = await catalog_registry.get(catalog)
+    logger.debug("Received text search request: query=%r, top_k=%s, hybrid=%s", query, top_k, hybrid)
+    with REQUESTS_IN_FLIGHT.labels("search_text").track_inprogress(), REQUEST_SECONDS.labels("search_text", "text").time():
+        results = await current.search_controller.search_text(query, top_k, hybrid, deadline_ms, latency_budget_ms)
+        return await _build_response(results, include_products, current.products_controller)
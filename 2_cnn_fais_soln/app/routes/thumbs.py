@@ -0,0 +1,44 @@
+import os
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from app.thumbnails import ThumbnailDiskCache, render_thumbnail, thumbnail_relpath
+from app.config import SHOE_IMAGES_FOLDER, THUMBNAILS_FOLDER, THUMBNAIL_SIZES, THUMBNAIL_QUALITY
+from app.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT
+
+router = APIRouter()
+
+thumbnail_cache: ThumbnailDiskCache = None  # Initialized in main.py
+
+# Catalog images never change in place (new uploads get new image_ids), so thumbnails can be cached forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _source_path(image_path: str) -> str:
+    images_root = os.path.realpath(SHOE_IMAGES_FOLDER)
+    src_path = os.path.realpath(os.path.join(images_root, image_path))
+    if os.path.commonpath([images_root, src_path]) != images_root or not os.path.isfile(src_path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return src_path
+
+@router.get("/thumbs/{size}/{image_path:path}")
+async def get_thumbnail(size: int, image_path: str, request: Request):
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=404, detail=f"Thumbnail sizes: {THUMBNAIL_SIZES}")
+    with REQUESTS_IN_FLIGHT.labels("thumbs").track_inprogress(), REQUEST_SECONDS.labels("thumbs", "").time():
+        src_path = _source_path(image_path)
+        # Strong validator derived from the source file, identical across workers and regenerations
+        stat = os.stat(src_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{size}-{THUMBNAIL_QUALITY}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        relpath = thumbnail_relpath(image_path, size)
+        path = os.path.join(THUMBNAILS_FOLDER, relpath)
+        if not os.path.exists(path):
+            path = thumbnail_cache.get(relpath)
+        if path is None:
+            data = await run_in_threadpool(render_thumbnail, src_path, size, THUMBNAIL_QUALITY)
+            await run_in_threadpool(thumbnail_cache.put, relpath, data)
+            return Response(data, media_type="image/webp", headers=headers)
+        return FileResponse(path, media_type="image/webp", headers=headers)
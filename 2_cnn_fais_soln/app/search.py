@@ -1,7 +1,11 @@
 import faiss
 import json
 import numpy as np
-from typing import List, Tuple
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+from app.metrics import stage_timer
+from app.calibration import params_for_budget
+from app.manifest_io import iter_records
 
 def load_index(index_path: str) -> faiss.IndexFlatIP:
     return faiss.read_index(index_path)
@@ -9,17 +13,19 @@ def load_index(index_path: str) -> faiss.IndexFlatIP:
 def save_index(index: faiss.IndexFlatIP, index_path: str):
     faiss.write_index(index, index_path)
 
+def iter_batches(records: Iterable, size: int) -> Iterator[list]:
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
 def load_image_paths(json_path: str) -> List[str]:
-    with open(json_path, "r") as f:
-        return json.load(f)
+    return list(iter_records(json_path))
 
 def load_embedding_metadata(json_path: str) -> List[str]:
-    with open(json_path, "r") as f:
-        return json.load(f)
-        
+    return list(iter_records(json_path))
+
 def load_product_metadata(json_path: str)-> List[dict]:
-    with open(json_path, "r") as f:
-        return json.load(f)
+    return list(iter_records(json_path))
 
 def save_image_paths(paths: List[str], json_path: str):
     with open(json_path, "w") as f:
@@ -31,6 +37,74 @@ def build_faiss_index(embeddings: np.ndarray) -> faiss.IndexFlatIP:
     index.add(embeddings)
     return index
 
+def build_pq_index(embeddings: np.ndarray, m: int, nbits: int = 8) -> faiss.IndexPQ:
+    """
+    Compressed inner-product index storing m * nbits bits per vector,
+    used as the candidate stage of two-stage search.
+    """
+    dimension = embeddings.shape[1]
+    index = faiss.IndexPQ(dimension, m, nbits, faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def build_factory_index(embeddings: np.ndarray, factory: str) -> faiss.Index:
+    """
+    Build an inner-product index from a faiss index_factory string,
+    e.g. "IVF1024,Flat" or "HNSW32,Flat" for approximate search.
+    """
+    dimension = embeddings.shape[1]
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def build_pca_faiss_index(embeddings: np.ndarray, out_dim: int, whiten: bool = False) -> faiss.IndexPreTransform:
+    """
+    Build an inner-product index over PCA-reduced, re-normalized embeddings.
+    The PCA matrix is stored inside the index, so faiss applies it to query
+    vectors at search time and to new vectors on add().
+    """
+    dimension = embeddings.shape[1]
+    pca = faiss.PCAMatrix(dimension, out_dim, -0.5 if whiten else 0.0)
+    normalize = faiss.NormalizationTransform(out_dim, 2.0)
+    index = faiss.IndexPreTransform(normalize, faiss.IndexFlatIP(out_dim))
+    index.prepend_transform(pca)
+    index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def measure_recall(reference_index: faiss.Index, index: faiss.Index, queries: np.ndarray, top_k: int = 5) -> float:
+    """
+    Fraction of the reference index's top_k neighbours that the other index also returns.
+    """
+    _, expected = reference_index.search(queries, top_k)
+    _, found = index.search(queries, top_k)
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected.tolist(), found.tolist()))
+    return hits / expected.size
+
 def search(index: faiss.IndexFlatIP, query_emb: np.ndarray, top_k: int = 5) -> Tuple[List[int], List[float]]:
-    D, I = index.search(query_emb.reshape(1, -1), top_k)
+    # nprobe/efSearch follow the request's latency budget on calibrated approximate indexes
+    with stage_timer("faiss_search"):
+        D, I = index.search(query_emb.reshape(1, -1), top_k, params=params_for_budget(index))
     return I[0].tolist(), D[0].tolist()
+
+def search_fused(index: faiss.Index, query_embs: np.ndarray, top_k: int = 5, fusion: str = "mean") -> Tuple[List[int], List[float]]:
+    """
+    Search with several views of one query.
+    "mean" searches once with the re-normalized mean embedding,
+    "max" searches all views in one batch and keeps each id's best score.
+    """
+    if fusion == "mean":
+        query = query_embs.mean(axis=0)
+        query /= np.linalg.norm(query)
+        return search(index, query.astype("float32"), top_k)
+
+    with stage_timer("faiss_search"):
+        D, I = index.search(query_embs, top_k, params=params_for_budget(index))
+    best = {}
+    for idx, score in zip(I.ravel().tolist(), D.ravel().tolist()):
+        if idx != -1 and score > best.get(idx, -np.inf):
+            best[idx] = score
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [idx for idx, _ in ranked], [score for _, score in ranked]
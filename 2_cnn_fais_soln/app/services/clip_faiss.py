@@ -2,46 +2,32 @@ from PIL import Image
 from typing import List
 from app.models.search_models import SearchResultItem
 from app.db.mongo import embedding_clip_faiss_metadata_col
+from app.augmentation import augmented_views
+from app.search import search_fused
+from app.services.metadata import resolve_results
 import numpy as np
 
 class CLIPFaissSearch:
-    def __init__(self, index, extract_clip_embedding, search_func):
+    def __init__(self, index, extract_clip_embedding, search_func, extract_batch_func=None, metadata_col=embedding_clip_faiss_metadata_col):
         self.index = index
+        self.metadata_col = metadata_col
         self.extract_embedding = extract_clip_embedding
         self.search = search_func
+        self.extract_batch = extract_batch_func
 
-    async def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
+    def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
         # Extract embedding (assumed synchronous)
         emb = self.extract_embedding(image)  # numpy array shape (dim,)
         emb = emb.reshape(1, -1).astype('float32')  # FAISS expects 2D array
 
-        print("inside the search image clip method")
-
         # Perform FAISS search: FAISS returns (scores, indices)
         indices, scores = self.search(self.index, emb, top_k)
-        print("the scores and indices", scores, indices)
-
-        results: List[SearchResultItem] = []
-
-        # Iterate over the first query's results (assuming single query)
-        for idx, score in zip(indices, scores):
-            # Skip invalid indices
-            if idx == -1:
-                continue
-
-            embedding_doc = embedding_clip_faiss_metadata_col.find_one({"faiss_index": int(idx)})
-            if not embedding_doc:
-                continue
-
-            image_id = embedding_doc.get("image_id")
-            image_path = embedding_doc.get("image_path")
-            item_id = embedding_doc.get("item_id")
 
-            results.append({
-                "image_id": image_id,
-                "item_id": item_id,
-                "image_path": image_path,
-                "score": float(score)
-            })
+        # One $in query for all hits instead of a find_one per hit
+        return resolve_results(self.metadata_col, indices, scores)
 
-        return results
+    def search_image_tta(self, image: Image.Image, top_k: int, fusion: str = "mean") -> List[SearchResultItem]:
+        # All augmented views go through the model as one batch
+        embs = self.extract_batch(augmented_views(image))
+        indices, scores = search_fused(self.index, embs, top_k, fusion)
+        return resolve_results(self.metadata_col, indices, scores)
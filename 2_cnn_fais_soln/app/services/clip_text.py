@@ -0,0 +1,37 @@
+from typing import List
+from app.models.search_models import SearchResultItem
+from app.db.mongo import embedding_clip_faiss_metadata_col
+from app.services.metadata import resolve_results
+
+class CLIPTextSearch:
+    """
+    Text-to-image search over the CLIP image index, which shares CLIP's text-image space.
+    With item_name embeddings loaded, hybrid ranking blends the image score with
+    the similarity between the query and the product name.
+    """
+    def __init__(self, index, extract_text_embedding_func, search_func, name_store=None, name_weight: float = 0.3):
+        self.index = index
+        self.extract_text_embedding = extract_text_embedding_func
+        self.search = search_func
+        self.name_store = name_store  # KeyedEmbeddingStore of item_name embeddings by item_id
+        self.name_weight = name_weight
+
+    @property
+    def supports_hybrid(self) -> bool:
+        return self.name_store is not None
+
+    def search_text(self, query: str, top_k: int, hybrid: bool = False) -> List[SearchResultItem]:
+        emb = self.extract_text_embedding(query)
+        hybrid = hybrid and self.supports_hybrid
+        # Hybrid re-ranking needs a wider candidate pool than the final page
+        indices, scores = self.search(self.index, emb, top_k * 4 if hybrid else top_k)
+        results = resolve_results(embedding_clip_faiss_metadata_col, indices, scores)
+        if not hybrid:
+            return results
+
+        for result in results:
+            name_emb = self.name_store.get(result["item_id"])
+            name_score = float(name_emb @ emb) if name_emb is not None else 0.0
+            result["score"] = (1 - self.name_weight) * result["score"] + self.name_weight * name_score
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:top_k]
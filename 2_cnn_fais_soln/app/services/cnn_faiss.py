@@ -2,31 +2,27 @@ from PIL import Image
 from typing import List
 from app.models.search_models import SearchResultItem
 from app.db.mongo import embedding_cnn_faiss_metadata_col
+from app.augmentation import augmented_views
+from app.search import search_fused
+from app.services.metadata import resolve_results
 
 class CNNFaissSearch:
-    def __init__(self, index,  extract_embedding_func, search_func):
+    def __init__(self, index,  extract_embedding_func, search_func, extract_batch_func=None, metadata_col=embedding_cnn_faiss_metadata_col):
         self.index = index
+        self.metadata_col = metadata_col
         self.extract_embedding = extract_embedding_func
         self.search = search_func
+        self.extract_batch = extract_batch_func
 
-    async def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
+    def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
         emb = self.extract_embedding(image)
+        # A PCA-reduced index (CNN_PCA_DIM) carries its projection, so the raw 2048-d query is passed as is
         indices, scores = self.search(self.index, emb, top_k)
-        results = []
-        for idx, score in zip(indices, scores):
-            # Query embedding metadata by index or image_id
-            embedding_doc = embedding_cnn_faiss_metadata_col.find_one({"faiss_index": idx})
-            if not embedding_doc:
-                continue
-            image_id = embedding_doc["image_id"]
-            image_path = embedding_doc["image_path"]
-            item_id = embedding_doc.get("item_id")
+        # One $in query for all hits instead of a find_one per hit
+        return resolve_results(self.metadata_col, indices, scores)
 
-            results.append({
-                "image_id": image_id,
-                "item_id": item_id,
-                "image_path": image_path,
-                "score": float(score)
-            })
-
-        return results
+    def search_image_tta(self, image: Image.Image, top_k: int, fusion: str = "mean") -> List[SearchResultItem]:
+        # All augmented views go through the model as one batch
+        embs = self.extract_batch(augmented_views(image))
+        indices, scores = search_fused(self.index, embs, top_k, fusion)
+        return resolve_results(self.metadata_col, indices, scores)
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from typing import List
+from app.models.search_models import SearchResultItem
+from app.metrics import stage_timer
+from app.local_features import LocalFeatureStore, extract_local_features, verify_candidates
+
+class GeometricRerankSearch:
+    """
+    Re-ranks the top candidates of another search service by the number of
+    RANSAC-verified ORB matches, so near-duplicate photos of the same product
+    move to the top. Verification runs in a process pool over the mmap'd store.
+    """
+    def __init__(
+        self,
+        base_search,
+        feature_store: LocalFeatureStore,
+        pool: ProcessPoolExecutor,
+        n_workers: int,
+        n_candidates: int = 20,
+        min_inliers: int = 12,
+    ):
+        self.base_search = base_search
+        self.feature_store = feature_store
+        self.pool = pool
+        self.n_workers = n_workers
+        self.n_candidates = n_candidates
+        self.min_inliers = min_inliers
+
+    def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
+        results = self.base_search.search_image(image, max(self.n_candidates, top_k))
+        if not results:
+            return results
+
+        with stage_timer("local_features"):
+            query_points, query_desc = extract_local_features(image)
+        image_ids = [r["image_id"] for r in results]
+
+        # One task per worker rather than per candidate keeps IPC small
+        chunk_size = -(-len(image_ids) // self.n_workers)
+        chunks = [image_ids[i:i + chunk_size] for i in range(0, len(image_ids), chunk_size)]
+        with stage_timer("geometric_verify"):
+            futures = [
+                self.pool.submit(verify_candidates, query_points, query_desc, chunk, len(self.feature_store))
+                for chunk in chunks
+            ]
+            chunk_counts = [future.result() for future in futures]
+        inliers = [count for counts in chunk_counts for count in counts]
+
+        for result, count in zip(results, inliers):
+            result["inliers"] = count
+        # Verified matches first (by inlier count), then the rest in their original order
+        results.sort(
+            key=lambda r: r["inliers"] if r["inliers"] >= self.min_inliers else 0,
+            reverse=True,
+        )
+        return results[:top_k]
@@ -0,0 +1,25 @@
+from typing import List
+from app.metrics import stage_timer
+
+def resolve_results(metadata_col, indices: List[int], scores: List[float]) -> List[dict]:
+    """
+    Turn FAISS ids and scores into search result dicts with one $in query,
+    keeping the ranking order and skipping ids without metadata.
+    """
+    wanted = [int(idx) for idx in indices if idx != -1]
+    with stage_timer("metadata"):
+        docs = metadata_col.find({"faiss_index": {"$in": wanted}})
+        by_index = {doc["faiss_index"]: doc for doc in docs}
+
+    results = []
+    for idx, score in zip(indices, scores):
+        embedding_doc = by_index.get(int(idx))
+        if not embedding_doc:
+            continue
+        results.append({
+            "image_id": embedding_doc["image_id"],
+            "item_id": embedding_doc.get("item_id"),
+            "image_path": embedding_doc["image_path"],
+            "score": float(score)
+        })
+    return results
@@ -0,0 +1,88 @@
+from PIL import Image
+from typing import List
+import numpy as np
+from app.models.search_models import SearchResultItem
+from app.services.metadata import resolve_results
+from app.metrics import stage_timer
+
+class TwoStageFaissSearch:
+    """
+    Coarse candidates from a compressed index (PQ, PCA-reduced or binary),
+    re-ranked with exact inner products against full-precision vectors.
+    The coarse index only needs search(x, k, params=None) and ntotal.
+    """
+    def __init__(self, coarse_index, vectors, extract_embedding_func, search_func, metadata_col, n_candidates: int = 200):
+        self.coarse_index = coarse_index
+        self.vectors = vectors  # EmbeddingStore or IndexVectors, row == faiss_index
+        self.extract_embedding = extract_embedding_func
+        self.search = search_func
+        self.metadata_col = metadata_col
+        self.n_candidates = n_candidates
+
+    def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
+        emb = self.extract_embedding(image)
+        indices, _ = self.search(self.coarse_index, emb, max(self.n_candidates, top_k))
+
+        # Vectors added after the store was opened are not re-rankable yet
+        candidates = np.array([i for i in indices if 0 <= i < len(self.vectors)], dtype="int64")
+        if candidates.size == 0:
+            return []
+
+        with stage_timer("rerank"):
+            scores = self.vectors.get(candidates) @ emb
+            order = np.argsort(-scores)[:top_k]
+        return resolve_results(self.metadata_col, candidates[order].tolist(), scores[order].tolist())
+
+
+class CNNCLIPRerankSearch:
+    """
+    CNN candidates re-ranked by CLIP similarity. Candidates are matched across
+    the two indexes by image_id, since their faiss_index spaces are independent.
+    """
+    def __init__(
+        self,
+        cnn_index,
+        extract_embedding_func,
+        clip_vectors,
+        extract_clip_embedding_func,
+        search_func,
+        cnn_metadata_col,
+        clip_metadata_col,
+        n_candidates: int = 50,
+    ):
+        self.cnn_index = cnn_index
+        self.extract_embedding = extract_embedding_func
+        self.clip_vectors = clip_vectors
+        self.extract_clip_embedding = extract_clip_embedding_func
+        self.search = search_func
+        self.cnn_metadata_col = cnn_metadata_col
+        self.clip_metadata_col = clip_metadata_col
+        self.n_candidates = n_candidates
+
+    def search_image(self, image: Image.Image, top_k: int) -> List[SearchResultItem]:
+        cnn_emb = self.extract_embedding(image)
+        indices, _ = self.search(self.cnn_index, cnn_emb, max(self.n_candidates, top_k))
+        indices = [int(i) for i in indices if i != -1]
+
+        with stage_timer("metadata"):
+            cnn_docs = self.cnn_metadata_col.find({"faiss_index": {"$in": indices}}, {"image_id": 1})
+            image_ids = [doc["image_id"] for doc in cnn_docs]
+            clip_docs = list(self.clip_metadata_col.find({"image_id": {"$in": image_ids}}))
+        clip_docs = [doc for doc in clip_docs if doc["faiss_index"] < len(self.clip_vectors)]
+        if not clip_docs:
+            return []
+
+        clip_emb = self.extract_clip_embedding(image)
+        with stage_timer("rerank"):
+            scores = self.clip_vectors.get([doc["faiss_index"] for doc in clip_docs]) @ clip_emb
+            order = np.argsort(-scores)[:top_k]
+
+        return [
+            {
+                "image_id": clip_docs[i]["image_id"],
+                "item_id": clip_docs[i].get("item_id"),
+                "image_path": clip_docs[i]["image_path"],
+                "score": float(scores[i])
+            }
+            for i in order
+        ]
@@ -1,77 +1,119 @@
-import json
+import os
 import numpy as np
+from typing import Optional
 from pathlib import Path
 from PIL import Image
-import cv2
-from sklearn.cluster import MiniBatchKMeans
-import pickle
+from concurrent.futures import ProcessPoolExecutor
 from app.db.mongo import embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, products_col
-from app.model import extract_embedding, extract_clip_embedding
-from app.search import build_faiss_index, save_index
+from app.model import extract_embedding, extract_clip_embedding, extract_text_embeddings_batch, CNN_MODEL_NAME, CLIP_MODEL_NAME
+from app.manifest_io import iter_records
+from app.search import iter_batches, build_faiss_index, build_factory_index, build_pca_faiss_index, build_pq_index, measure_recall, load_index, save_index
+from app.calibration import calibrate, save_calibration, calibration_path, search_knob
+from app.embedding_store import EmbeddingStore, IndexVectors, KeyedEmbeddingStore
+from app.data_loading import product_text
+from app.index_info import save_build_info
+from app.drift import catalog_stats, save_catalog_stats, stats_path
+from app.embedding_export import load_export, load_manifest
+from app.local_features import LocalFeatureStore, extract_local_features_from_path
+from app.thumbnails import generate_thumbnails
+from app.binary_index import BinaryQuantizer, BinaryCoarseIndex
+from app.perceptual_hash import PerceptualHashIndex, image_hash_from_path
 from app.config import (
     FAISS_INDEX_PATH,
-    FAISS_HYBRID_INDEX_PATH,
     IMAGE_PATHS_JSON,
     SHOE_IMAGES_FOLDER,
-    KMEANS_MODEL_PATH,
     SHOE_PRODUCT_JSON_PATH, 
-    CLIP_FAISS_INDEX_PATH
+    CLIP_FAISS_INDEX_PATH,
+    CNN_PCA_DIM,
+    CNN_PCA_WHITEN,
+    CNN_EMBEDDINGS_PATH,
+    CLIP_EMBEDDINGS_PATH,
+    LOCAL_FEATURES_PATH,
+    GEOMETRIC_WORKERS,
+    ITEM_NAME_EMBEDDINGS_PATH,
+    CNN_INDEX_FACTORY,
+    CLIP_INDEX_FACTORY,
+    CALIBRATION_QUERIES,
+    CALIBRATION_TOP_K,
+    THUMBNAILS_FOLDER,
+    THUMBNAIL_SIZES,
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_WORKERS,
+    PHASH_INDEX_PATH,
+    PHASH_KIND,
+    PHASH_WORKERS,
+    BINARY_QUANTIZER,
+    BINARY_HNSW_M,
+    ITQ_ITERATIONS,
+    ITQ_TRAIN_SIZE,
+    CATALOG_STATS_SAMPLE,
 )
 import time
 
 def build_products_col():
-    print("Loading product data from JSON...")
-    with open(SHOE_PRODUCT_JSON_PATH, "r") as f:
-        products = json.load(f)
-
-    if not products:
-        print("No products found in JSON file.")
-        return
-
-    # Deduplicate products by 'item_id'
-    unique_products = {}
-    for product in products:
+    print(f"Loading product data from {SHOE_PRODUCT_JSON_PATH}...")
+
+    # Deduplicate products by 'item_id' while streaming, inserting in bounded unordered chunks.
+    # The old products are only dropped once the first chunk parsed, so an unreadable file keeps them.
+    seen_item_ids = set()
+    total_products = 0
+    batch = []
+    cleared = False
+    for product in iter_records(SHOE_PRODUCT_JSON_PATH):
+        total_products += 1
         item_id = product.get("item_id")
-        if item_id and item_id not in unique_products:
-            unique_products[item_id] = product
-
-    deduped_products = list(unique_products.values())
-    print(f"Original products count: {len(products)}")
-    print(f"Deduplicated products count: {len(deduped_products)}")
+        if not item_id or item_id in seen_item_ids:
+            continue
+        seen_item_ids.add(item_id)
+        batch.append(product)
+        if len(batch) >= PRODUCT_INSERT_BATCH_SIZE:
+            if not cleared:
+                products_col.delete_many({})
+                cleared = True
+            products_col.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        if not cleared:
+            products_col.delete_many({})
+        products_col.insert_many(batch, ordered=False)
+
+    if not seen_item_ids:
+        print("No products found in the product file.")
+        return
 
-    print(f"Inserting {len(deduped_products)} products into MongoDB...")
-    
-    products_col.delete_many({})
-    products_col.insert_many(deduped_products)
+    print(f"Original products count: {total_products}")
+    print(f"Deduplicated products inserted into MongoDB: {len(seen_item_ids)}")
 
     # Create an index on 'item_id' for fast lookups
     products_col.create_index("item_id", unique=True)
     print("Product data inserted successfully with index on 'item_id'.")
 
 BATCH_SIZE = 1000
+PRODUCT_INSERT_BATCH_SIZE = 1000
+TEXT_BATCH_SIZE = 256
 LOG_FILE_PATH = "faiss_build_time.log"  # You can customize the log file path
 
 CLIP_LOG_FILE_PATH = "clip_faiss_build_time.log"  # Separate log file for CLIP
+PCA_RECALL_SAMPLE_SIZE = 1000
+PCA_RECALL_TOP_K = 5
 
 def build_clip_faiss_index():
-    with open(IMAGE_PATHS_JSON, "r") as f:
-        original_metadata = json.load(f)
-
-    total_images = len(original_metadata)
-    print(f"Processing {total_images} images for CLIP FAISS index in batches of {BATCH_SIZE}...")
+    print(f"Processing images of {IMAGE_PATHS_JSON} for CLIP FAISS index in batches of {BATCH_SIZE}...")
+    build_start = time.perf_counter()
 
     # Clear existing metadata before starting
     embedding_clip_faiss_metadata_col.delete_many({})
 
     all_embeddings = []
-    all_metadata_docs = []
+    total_images = 0
 
     total_time_ms = 0
     batch_times = []
 
-    for batch_start in range(0, total_images, BATCH_SIZE):
-        batch_end = min(batch_start + BATCH_SIZE, total_images)
-        batch_metadata = original_metadata[batch_start:batch_end]
+    # The manifest is streamed, one batch of records in memory at a time
+    for batch_metadata in iter_batches(iter_records(IMAGE_PATHS_JSON), BATCH_SIZE):
+        batch_start = total_images
+        batch_end = total_images = batch_start + len(batch_metadata)
 
         batch_embeddings = []
         batch_metadata_docs = []
@@ -94,7 +136,8 @@ def build_clip_faiss_index():
                 batch_embeddings.append(emb)
 
                 batch_metadata_docs.append({
-                    "faiss_index": idx,
+                    # Position in the index, which drifts from idx once an image is skipped
+                    "faiss_index": len(all_embeddings) + len(batch_embeddings) - 1,
                     "image_id": image_id,
                     "item_id": item_id,
                     "image_path": str(relative_path)
@@ -103,8 +146,8 @@ def build_clip_faiss_index():
             except Exception as e:
                 print(f"Failed to process {relative_path}: {e}")
 
-            if (idx + 1) % 100 == 0 or (idx + 1) == total_images:
-                print(f"Processed {idx + 1}/{total_images} images")
+            if (idx + 1) % 100 == 0:
+                print(f"Processed {idx + 1} images")
 
         batch_end_time = time.perf_counter()
         batch_duration_ms = (batch_end_time - batch_start_time) * 1000
@@ -121,7 +164,6 @@ def build_clip_faiss_index():
         embedding_clip_faiss_metadata_col.insert_many(batch_metadata_docs)
 
         all_embeddings.extend(batch_embeddings)
-        all_metadata_docs.extend(batch_metadata_docs)
 
     if not all_embeddings:
         print("No embeddings extracted overall. Exiting CLIP FAISS build.")
@@ -129,8 +171,20 @@ def build_clip_faiss_index():
 
     embeddings_np = np.stack(all_embeddings).astype("float32")
 
-    index = build_faiss_index(embeddings_np)
+    if CLIP_INDEX_FACTORY:
+        print(f"Training {CLIP_INDEX_FACTORY} index on {len(embeddings_np)} vectors...")
+        index = build_factory_index(embeddings_np, CLIP_INDEX_FACTORY)
+    else:
+        index = build_faiss_index(embeddings_np)
     save_index(index, CLIP_FAISS_INDEX_PATH)
+    save_build_info(CLIP_FAISS_INDEX_PATH, index, CLIP_MODEL_NAME, time.perf_counter() - build_start,
+                    factory=CLIP_INDEX_FACTORY, images_total=total_images, images_skipped=total_images - len(embeddings_np))
+    calibrate_index(index, embeddings_np, CLIP_FAISS_INDEX_PATH)
+    save_index_stats(index, embeddings_np, CLIP_FAISS_INDEX_PATH)
+
+    if CLIP_EMBEDDINGS_PATH:
+        EmbeddingStore.create(CLIP_EMBEDDINGS_PATH, embeddings_np.shape[1]).append(embeddings_np)
+        print(f"CLIP embeddings saved to {CLIP_EMBEDDINGS_PATH}")
 
     # Create index on faiss_index for faster queries
     embedding_clip_faiss_metadata_col.create_index("faiss_index")
@@ -149,24 +203,22 @@ def build_clip_faiss_index():
 
 
 def build_cnn_faiss_index():
-    with open(IMAGE_PATHS_JSON, "r") as f:
-        original_metadata = json.load(f)
-
-    total_images = len(original_metadata)
-    print(f"Processing {total_images} images for CNN FAISS index in batches of {BATCH_SIZE}...")
+    print(f"Processing images of {IMAGE_PATHS_JSON} for CNN FAISS index in batches of {BATCH_SIZE}...")
+    build_start = time.perf_counter()
 
     # Clear existing metadata before starting
     embedding_cnn_faiss_metadata_col.delete_many({})
 
     all_embeddings = []
-    all_metadata_docs = []
+    total_images = 0
 
     total_time_ms = 0
     batch_times = []
 
-    for batch_start in range(0, total_images, BATCH_SIZE):
-        batch_end = min(batch_start + BATCH_SIZE, total_images)
-        batch_metadata = original_metadata[batch_start:batch_end]
+    # The manifest is streamed, one batch of records in memory at a time
+    for batch_metadata in iter_batches(iter_records(IMAGE_PATHS_JSON), BATCH_SIZE):
+        batch_start = total_images
+        batch_end = total_images = batch_start + len(batch_metadata)
 
         batch_embeddings = []
         batch_metadata_docs = []
@@ -189,7 +241,8 @@ def build_cnn_faiss_index():
                 batch_embeddings.append(emb)
 
                 batch_metadata_docs.append({
-                    "faiss_index": idx,
+                    # Position in the index, which drifts from idx once an image is skipped
+                    "faiss_index": len(all_embeddings) + len(batch_embeddings) - 1,
                     "image_id": image_id,
                     "item_id": item_id,
                     "image_path": str(relative_path)
@@ -198,8 +251,8 @@ def build_cnn_faiss_index():
             except Exception as e:
                 print(f"Failed to process {relative_path}: {e}")
 
-            if (idx + 1) % 100 == 0 or (idx + 1) == total_images:
-                print(f"Processed {idx + 1}/{total_images} images")
+            if (idx + 1) % 100 == 0:
+                print(f"Processed {idx + 1} images")
 
         batch_end_time = time.perf_counter()
         batch_duration_ms = (batch_end_time - batch_start_time) * 1000
@@ -216,7 +269,6 @@ def build_cnn_faiss_index():
         embedding_cnn_faiss_metadata_col.insert_many(batch_metadata_docs)
 
         all_embeddings.extend(batch_embeddings)
-        all_metadata_docs.extend(batch_metadata_docs)
 
     if not all_embeddings:
         print("No embeddings extracted overall. Exiting CNN FAISS build.")
@@ -224,8 +276,37 @@ def build_cnn_faiss_index():
 
     embeddings_np = np.stack(all_embeddings).astype("float32")
 
-    index = build_faiss_index(embeddings_np)
+    pca_recall = None
+    if CNN_INDEX_FACTORY:
+        # PCA, when configured, goes in front of the approximate index
+        factory = CNN_INDEX_FACTORY
+        if CNN_PCA_DIM:
+            factory = f"PCA{'W' if CNN_PCA_WHITEN else ''}{CNN_PCA_DIM},L2norm,{factory}"
+        print(f"Training {factory} index on {len(embeddings_np)} vectors...")
+        index = build_factory_index(embeddings_np, factory)
+    elif CNN_PCA_DIM:
+        print(f"Training PCA {embeddings_np.shape[1]} -> {CNN_PCA_DIM} dims (whiten={CNN_PCA_WHITEN})...")
+        index = build_pca_faiss_index(embeddings_np, CNN_PCA_DIM, CNN_PCA_WHITEN)
+
+        # Measure how many exact neighbours survive the reduction on a catalog sample
+        rng = np.random.default_rng(0)
+        sample_size = min(PCA_RECALL_SAMPLE_SIZE, len(embeddings_np))
+        queries = embeddings_np[rng.choice(len(embeddings_np), sample_size, replace=False)]
+        pca_recall = measure_recall(build_faiss_index(embeddings_np), index, queries, PCA_RECALL_TOP_K)
+        print(f"PCA recall@{PCA_RECALL_TOP_K} vs full-dimension index: {pca_recall:.4f}")
+    else:
+        index = build_faiss_index(embeddings_np)
     save_index(index, FAISS_INDEX_PATH)
+    save_build_info(FAISS_INDEX_PATH, index, CNN_MODEL_NAME, time.perf_counter() - build_start,
+                    factory=CNN_INDEX_FACTORY, pca_dim=CNN_PCA_DIM, pca_recall=pca_recall,
+                    images_total=total_images, images_skipped=total_images - len(embeddings_np))
+    calibrate_index(index, embeddings_np, FAISS_INDEX_PATH)
+    save_index_stats(index, embeddings_np, FAISS_INDEX_PATH)
+
+    if CNN_EMBEDDINGS_PATH:
+        # Raw 2048-d vectors, also when the index itself is PCA-reduced
+        EmbeddingStore.create(CNN_EMBEDDINGS_PATH, embeddings_np.shape[1]).append(embeddings_np)
+        print(f"CNN embeddings saved to {CNN_EMBEDDINGS_PATH}")
 
     embedding_cnn_faiss_metadata_col.create_index("faiss_index")
 
@@ -234,94 +315,295 @@ def build_cnn_faiss_index():
     # Write timing info to log file
     with open(LOG_FILE_PATH, "w") as log_file:
         log_file.write(f"Processed {total_images} images in {total_time_ms / 1000:.2f} seconds\n")
+        if pca_recall is not None:
+            log_file.write(f"PCA {embeddings_np.shape[1]} -> {CNN_PCA_DIM} dims (whiten={CNN_PCA_WHITEN}), "
+                           f"recall@{PCA_RECALL_TOP_K} vs full-dimension index: {pca_recall:.4f}\n")
         log_file.write("Batch processing times (ms):\n")
         for i, t in enumerate(batch_times):
             log_file.write(f"Batch {i + 1}: {t:.2f} ms\n")
 
     print(f"Timing log saved to {LOG_FILE_PATH}")
 
-# def extract_sift_descriptors(image):
-#     gray = np.array(image.convert("L"))
-#     sift = cv2.SIFT_create()
-#     _, descriptors = sift.detectAndCompute(gray, None)
-#     return descriptors if descriptors is not None else np.zeros((1, 128), dtype=np.float32)
-
-
-# def build_cnn_sift_hybrid_index(k=64, batch_size=1000):
-#     with open(IMAGE_PATHS_JSON, "r") as f:
-#         original_metadata = json.load(f)
-
-#     cnn_embeddings = []
-#     sift_descriptors_all = []
-#     metadata_docs = []
-
-#     print(f"Extracting CNN and SIFT features for {len(original_metadata)} images...")
-
-#     for idx, record in enumerate(original_metadata):
-#         relative_path = Path(record["image_path"])
-#         image_id = record["image_id"]
-#         item_id = record["item_id"]
-#         image_file_path = Path(SHOE_IMAGES_FOLDER) / relative_path
-
-#         if not image_file_path.exists():
-#             print(f"Image not found: {image_file_path}")
-#             continue
-
-#         try:
-#             image = Image.open(image_file_path).convert("RGB")
-#             cnn_emb = extract_embedding(image)
-#             cnn_embeddings.append(cnn_emb)
-
-#             sift_desc = extract_sift_descriptors(image)
-#             sift_descriptors_all.append(sift_desc)
-
-#             metadata_docs.append({
-#                 "faiss_index": idx,
-#                 "image_id": image_id,
-#                 "item_id": item_id,
-#                 "image_path": str(relative_path)
-#             })
-
-#         except Exception as e:
-#             print(f"Failed to process {relative_path}: {e}")
-
-#         if (idx + 1) % 100 == 0 or (idx + 1) == len(original_metadata):
-#             print(f"Extracted features for {idx + 1}/{len(original_metadata)} images")
-
-#     if not cnn_embeddings or not sift_descriptors_all:
-#         print("No features extracted. Exiting hybrid index build.")
-#         return
-
-#     all_sift_desc = np.vstack(sift_descriptors_all).astype(np.float32)
-
-#     print(f"Fitting KMeans with k={k} on {all_sift_desc.shape[0]} SIFT descriptors...")
-#     kmeans = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, verbose=1)
-#     kmeans.fit(all_sift_desc)
-
-#     with open(KMEANS_MODEL_PATH, "wb") as f:
-#         pickle.dump(kmeans, f)
-#     print(f"KMeans model saved to {KMEANS_MODEL_PATH}")
-
-#     sift_histograms = []
-#     for sift_desc in sift_descriptors_all:
-#         words = kmeans.predict(sift_desc)
-#         hist = np.bincount(words, minlength=k).astype(np.float32)
-#         hist /= (hist.sum() + 1e-7)
-#         sift_histograms.append(hist)
-
-#     cnn_embeddings = np.stack(cnn_embeddings)
-#     sift_histograms = np.stack(sift_histograms)
-#     hybrid_embeddings = np.hstack([cnn_embeddings, sift_histograms])
-
-#     embedding_meta_hybrid_col.delete_many({})
-#     if metadata_docs:
-#         embedding_meta_hybrid_col.insert_many(metadata_docs)
-#         embedding_meta_hybrid_col.create_index("faiss_index")
-
-#     print(f"Building FAISS index for hybrid embeddings with shape {hybrid_embeddings.shape}...")
-#     index = build_faiss_index(hybrid_embeddings)
-#     save_index(index, FAISS_HYBRID_INDEX_PATH)
+def calibrate_index(index, embeddings_np: np.ndarray, index_path: str):
+    """
+    Measure recall/latency of an approximate index for each nprobe/efSearch value on
+    catalog vectors used as queries, and save the table next to the index.
+    Exact indexes have nothing to tune and are skipped before the ground truth is computed.
+    """
+    if search_knob(index) is None:
+        return
+    rng = np.random.default_rng(0)
+    sample_size = min(CALIBRATION_QUERIES, len(embeddings_np))
+    queries = embeddings_np[rng.choice(len(embeddings_np), sample_size, replace=False)]
+    _, ground_truth = build_faiss_index(embeddings_np).search(queries, CALIBRATION_TOP_K)
 
-#     print(f"Hybrid FAISS index saved to {FAISS_HYBRID_INDEX_PATH}")
+    calibration = calibrate(index, queries, ground_truth, CALIBRATION_TOP_K)
+    if calibration is None:
+        return
+    save_calibration(calibration, index_path)
+    print(f"Calibration of {calibration.knob} saved to {calibration_path(index_path)}:")
+    for point in calibration.points:
+        print(f"  {calibration.knob}={point['value']}: recall@{CALIBRATION_TOP_K}={point['recall']:.4f}, "
+              f"p50={point['p50_ms']:.3f} ms, p95={point['p95_ms']:.3f} ms")
+
+def calibrate_index_from_store(index_path: str, embeddings_path: str):
+    """
+    Re-calibrate a saved index against its embedding store, e.g. after many images were added.
+    """
+    store = EmbeddingStore(embeddings_path)
+    if not len(store):
+        print(f"No embeddings found in {embeddings_path}. Skipping calibration.")
+        return
+    calibrate_index(load_index(index_path), np.asarray(store.vectors), index_path)
+
+def save_index_stats(index, embeddings_np: np.ndarray, index_path: str):
+    """
+    Catalog statistics the API compares its query stream with (app/drift.py), saved next to the index.
+    """
+    stats = catalog_stats(embeddings_np, index, CATALOG_STATS_SAMPLE)
+    save_catalog_stats(stats, index_path)
+    print(f"Catalog statistics saved to {stats_path(index_path)}: top-1 score p50={stats['top1_score']['p50']:.4f}, "
+          f"centroid distance p50={stats['centroid_distance']['p50']:.4f}")
+
+def build_index_stats_from_saved(index_path: str, embeddings_path: str):
+    """
+    Recompute the catalog statistics of a saved index, e.g. after many images were added, from
+    the embedding store when there is one, otherwise from the vectors of the index if it is flat.
+    """
+    index = load_index(index_path)
+    vectors = _saved_vectors(index_path, embeddings_path, index)
+    if vectors is None:
+        print(f"{index_path} does not keep exact vectors and {embeddings_path} does not exist. Skipping catalog statistics.")
+        return
+    if not len(vectors):
+        print(f"No vectors found for {index_path}. Skipping catalog statistics.")
+        return
+    save_index_stats(index, vectors, index_path)
+
+def build_pq_index_from_store(embeddings_path: str, pq_index_path: str, m: int):
+    """
+    Train and fill a PQ index from a saved embedding store, without re-running the models.
+    """
+    store = EmbeddingStore(embeddings_path)
+    if not len(store):
+        print(f"No embeddings found in {embeddings_path}. Skipping PQ index build.")
+        return
 
+    embeddings_np = np.asarray(store.vectors)
+    print(f"Training PQ index (m={m}) on {len(store)} vectors of dim {store.dim}...")
+    start_time = time.perf_counter()
+    index = build_pq_index(embeddings_np, m)
+    save_index(index, pq_index_path)
+    save_build_info(pq_index_path, index, None, time.perf_counter() - start_time, source=embeddings_path, pq_m=m)
+    print(f"PQ index saved to {pq_index_path} in {time.perf_counter() - start_time:.2f} seconds "
+          f"({index.code_size} bytes per vector instead of {store.dim * 4})")
+
+def _saved_vectors(index_path: str, embeddings_path: str, index=None) -> Optional[np.ndarray]:
+    """
+    Exact vectors of a saved index: its embedding store when there is one, otherwise the
+    index's own vectors if it is flat. None when neither is available.
+    """
+    if embeddings_path and os.path.exists(embeddings_path):
+        vectors = EmbeddingStore(embeddings_path).vectors
+        print(f"Reading {len(vectors)} vectors from {embeddings_path}")
+        return vectors
+    index = index if index is not None else load_index(index_path)
+    if not IndexVectors.is_exact(index):
+        return None
+    vectors = index.reconstruct_n(0, index.ntotal)
+    print(f"Reconstructed {len(vectors)} vectors from {index_path}")
+    return vectors
+
+def build_binary_index_from_saved(index_path: str, embeddings_path: str, binary_index_path: str):
+    """
+    Build the binary-quantized first stage from already computed vectors: the embedding
+    store when there is one, otherwise the vectors of the saved FAISS index if it is flat.
+    """
+    vectors = _saved_vectors(index_path, embeddings_path)
+    if vectors is None:
+        print(f"{index_path} does not keep exact vectors and {embeddings_path} does not exist. Skipping binary index build.")
+        return
+    if not len(vectors):
+        print("No vectors found. Skipping binary index build.")
+        return
 
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(0)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(ITQ_TRAIN_SIZE, len(vectors)), replace=False))])
+    print(f"Training {BINARY_QUANTIZER} quantizer on {len(sample)} vectors of dim {vectors.shape[1]}...")
+    quantizer = BinaryQuantizer.train(sample, BINARY_QUANTIZER, ITQ_ITERATIONS)
+
+    binary_index = BinaryCoarseIndex.build(vectors, quantizer, BINARY_HNSW_M)
+    binary_index.save(binary_index_path)
+    save_build_info(binary_index_path, binary_index, None, time.perf_counter() - start_time,
+                    source=embeddings_path if embeddings_path and os.path.exists(embeddings_path) else index_path,
+                    quantizer=BINARY_QUANTIZER, hnsw_m=BINARY_HNSW_M)
+    print(f"Binary index saved to {binary_index_path} in {time.perf_counter() - start_time:.2f} seconds "
+          f"({vectors.shape[1] // 8} bytes per vector instead of {vectors.shape[1] * 4})")
+
+def build_index_from_export(export_dir: str, index_path: str, factory: str = None, metadata_col=None, embeddings_path: str = None):
+    """
+    Build an index from an embedding export (app/embedding_export.py) without running the models:
+    flat IndexFlatIP, or any index_factory string. With metadata_col, its documents are replaced
+    by the export rows; without it the index is only a file to try out.
+    Returns whether the index was built.
+
+    The PQ, binary, local-feature and hash structures of the live catalog are keyed by the current
+    positions and image_ids, so rows renumbered by the export (rows without metadata are not
+    exported) cannot be imported into it: that raises ValueError before anything is written.
+    """
+    manifest = load_manifest(export_dir)
+    vectors, rows = load_export(export_dir)
+    if not len(vectors):
+        print(f"No vectors found in {export_dir}. Skipping index build.")
+        return False
+    renumbered = any(row["faiss_index"] != position for position, row in enumerate(rows))
+    if renumbered and metadata_col is not None:
+        raise ValueError(f"{export_dir} has gaps in faiss_index (rows without metadata were not exported), importing it "
+                         "would misalign the PQ, binary, local-feature and hash structures of the catalog. "
+                         "Rebuild the catalog with the build_* functions of run_startup.py, or write a separate index.")
+    print(f"Building {factory or 'IndexFlatIP'} index from {len(vectors)} vectors of dim {manifest['dim']} "
+          f"(model {manifest['model']}, exported from {manifest['source']})...")
+
+    start_time = time.perf_counter()
+    index = build_factory_index(vectors, factory) if factory else build_faiss_index(vectors)
+    save_index(index, index_path)
+    save_build_info(index_path, index, manifest["model"], time.perf_counter() - start_time,
+                    factory=factory, source=export_dir)
+    calibrate_index(index, vectors, index_path)
+    save_index_stats(index, vectors, index_path)
+    print(f"Index saved to {index_path} in {time.perf_counter() - start_time:.2f} seconds")
+
+    if embeddings_path:
+        EmbeddingStore.create(embeddings_path, vectors.shape[1]).append(vectors)
+        print(f"Embeddings saved to {embeddings_path}")
+
+    if metadata_col is not None:
+        metadata_col.delete_many({})
+        for batch in iter_batches(enumerate(rows), PRODUCT_INSERT_BATCH_SIZE):
+            metadata_col.insert_many([dict(row, faiss_index=position) for position, row in batch], ordered=False)
+        metadata_col.create_index("faiss_index")
+        print(f"{len(rows)} metadata documents written to {metadata_col.name}")
+    elif renumbered:
+        print("Export rows were renumbered (rows without metadata were not exported): "
+              "this index does not line up with the current metadata collection")
+    return True
+
+def _safe_extract_local_features(image_file_path: str):
+    try:
+        return extract_local_features_from_path(image_file_path)
+    except Exception as e:
+        print(f"Failed to extract local features from {image_file_path}: {e}")
+        return None
+
+def build_local_feature_store():
+    """
+    Extract ORB features for every catalog image in a process pool and write
+    them to the memory-mapped store used for geometric re-verification.
+    """
+    records = [r for r in iter_records(IMAGE_PATHS_JSON) if (Path(SHOE_IMAGES_FOLDER) / r["image_path"]).exists()]
+    paths = [str(Path(SHOE_IMAGES_FOLDER) / r["image_path"]) for r in records]
+    print(f"Extracting ORB features for {len(records)} images with {GEOMETRIC_WORKERS} workers...")
+
+    store = LocalFeatureStore.create(LOCAL_FEATURES_PATH)
+    start_time = time.perf_counter()
+    image_ids, features = [], []
+
+    with ProcessPoolExecutor(max_workers=GEOMETRIC_WORKERS) as pool:
+        for idx, (record, feats) in enumerate(zip(records, pool.map(_safe_extract_local_features, paths, chunksize=64)), start=1):
+            if feats is not None:
+                image_ids.append(record["image_id"])
+                features.append(feats)
+            if len(image_ids) >= BATCH_SIZE:
+                store.append(image_ids, features)
+                image_ids, features = [], []
+            if idx % 1000 == 0 or idx == len(records):
+                print(f"Extracted local features for {idx}/{len(records)} images")
+
+    if image_ids:
+        store.append(image_ids, features)
+
+    print(f"Local feature store saved to {LOCAL_FEATURES_PATH}.* with {len(store)} images "
+          f"({store.descriptors.nbytes / 1e6:.1f} MB of descriptors) in {time.perf_counter() - start_time:.2f} seconds")
+
+def _safe_generate_thumbnails(image_path: str) -> int:
+    try:
+        return generate_thumbnails(image_path, SHOE_IMAGES_FOLDER, THUMBNAILS_FOLDER, THUMBNAIL_SIZES, THUMBNAIL_QUALITY)
+    except Exception as e:
+        print(f"Failed to generate thumbnails for {image_path}: {e}")
+        return 0
+
+def build_thumbnails():
+    """
+    Precompute WebP thumbnails of every catalog image in a process pool.
+    Existing thumbnails are kept, so re-running only fills in what is missing.
+    """
+    paths = [r["image_path"] for r in iter_records(IMAGE_PATHS_JSON) if (Path(SHOE_IMAGES_FOLDER) / r["image_path"]).exists()]
+    print(f"Generating {THUMBNAIL_SIZES} px thumbnails for {len(paths)} images with {THUMBNAIL_WORKERS} workers...")
+    start_time = time.perf_counter()
+    generated = 0
+    with ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS) as pool:
+        for idx, count in enumerate(pool.map(_safe_generate_thumbnails, paths, chunksize=64), start=1):
+            generated += count
+            if idx % 1000 == 0 or idx == len(paths):
+                print(f"Thumbnails done for {idx}/{len(paths)} images")
+    print(f"{generated} thumbnails written to {THUMBNAILS_FOLDER} in {time.perf_counter() - start_time:.2f} seconds")
+
+def _safe_image_hash(image_file_path: str):
+    try:
+        return image_hash_from_path(image_file_path, PHASH_KIND)
+    except Exception as e:
+        print(f"Failed to hash {image_file_path}: {e}")
+        return None
+
+def build_perceptual_hash_index():
+    """
+    Hash every catalog image (64-bit pHash or dHash) in a process pool for the
+    duplicate fast path of /search/.
+    """
+    records = [r for r in iter_records(IMAGE_PATHS_JSON) if (Path(SHOE_IMAGES_FOLDER) / r["image_path"]).exists()]
+    paths = [str(Path(SHOE_IMAGES_FOLDER) / r["image_path"]) for r in records]
+    print(f"Computing {PHASH_KIND} of {len(records)} images with {PHASH_WORKERS} workers...")
+
+    hash_index = PerceptualHashIndex.create(PHASH_INDEX_PATH, PHASH_KIND)
+    start_time = time.perf_counter()
+    images, hashes = [], []
+    with ProcessPoolExecutor(max_workers=PHASH_WORKERS) as pool:
+        for idx, (record, image_hash) in enumerate(zip(records, pool.map(_safe_image_hash, paths, chunksize=64)), start=1):
+            if image_hash is not None:
+                images.append((record["image_id"], record["item_id"], record["image_path"]))
+                hashes.append(image_hash)
+            if idx % 1000 == 0 or idx == len(records):
+                print(f"Hashed {idx}/{len(records)} images")
+
+    # One append at the end, a single refresh of the in-memory rows
+    hash_index.append(images, hashes)
+    print(f"Perceptual hash index saved to {PHASH_INDEX_PATH}.* with {len(hash_index)} images "
+          f"in {time.perf_counter() - start_time:.2f} seconds")
+
+def build_item_name_embeddings():
+    """
+    Encode every product's item_name with CLIP's text encoder, in batches,
+    for hybrid text+image ranking on /search/text.
+    """
+    item_ids, texts, seen = [], [], set()
+    for product in iter_records(SHOE_PRODUCT_JSON_PATH):
+        item_id = product.get("item_id")
+        if item_id and item_id not in seen:
+            seen.add(item_id)
+            item_ids.append(item_id)
+            texts.append(product_text(product))
+
+    print(f"Encoding item names of {len(item_ids)} products in batches of {TEXT_BATCH_SIZE}...")
+    start_time = time.perf_counter()
+    store = None
+    for batch_start in range(0, len(texts), TEXT_BATCH_SIZE):
+        embs = extract_text_embeddings_batch(texts[batch_start:batch_start + TEXT_BATCH_SIZE])
+        if store is None:
+            store = KeyedEmbeddingStore.create(ITEM_NAME_EMBEDDINGS_PATH, embs.shape[1])
+        store.append(item_ids[batch_start:batch_start + TEXT_BATCH_SIZE], embs)
+
+    if store is None:
+        print("No products found. Skipping item name embeddings.")
+        return
+    print(f"Item name embeddings saved to {ITEM_NAME_EMBEDDINGS_PATH} in {time.perf_counter() - start_time:.2f} seconds")
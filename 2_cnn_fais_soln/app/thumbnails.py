@@ -0,0 +1,113 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+from PIL import Image
+from app.metrics import record_cache
+
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_EXT = ".webp"
+
+
+def thumbnail_relpath(image_path: str, size: int) -> str:
+    # "if2e/2e3af037.jpg" -> "256/if2e/2e3af037.webp"
+    return str(Path(str(size)) / Path(image_path).with_suffix(THUMBNAIL_EXT))
+
+
+def render_thumbnail(src_path: str, size: int, quality: int = 80) -> bytes:
+    """
+    WebP thumbnail fitting in size x size, keeping the aspect ratio.
+    """
+    with Image.open(src_path) as img:
+        # JPEGs decode directly at a reduced scale, much cheaper than a full decode
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, THUMBNAIL_FORMAT, quality=quality, method=4)
+        return out.getvalue()
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)  # readers never see a partial file
+
+
+def generate_thumbnails(image_path: str, images_folder: str, thumbnails_folder: str, sizes: Iterable[int], quality: int = 80) -> int:
+    """
+    Write the thumbnails of one catalog image (path relative to images_folder) that are
+    not there yet. Returns how many were generated. Safe to call from worker processes.
+    """
+    src_path = os.path.join(images_folder, image_path)
+    generated = 0
+    for size in sizes:
+        dst_path = os.path.join(thumbnails_folder, thumbnail_relpath(image_path, size))
+        if os.path.exists(dst_path):
+            continue
+        _write_atomic(dst_path, render_thumbnail(src_path, size, quality))
+        generated += 1
+    return generated
+
+
+class ThumbnailDiskCache:
+    """
+    Thumbnails generated on request for images without a precomputed one,
+    kept on disk up to max_bytes and evicted least recently served first.
+    The folder is rescanned on start, so the cache survives restarts.
+    """
+    def __init__(self, folder: str, max_bytes: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._sizes = OrderedDict()  # relpath -> bytes, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+        entries = []
+        for root, _, files in os.walk(folder):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, os.path.relpath(path, folder), stat.st_size))
+        for _, relpath, size in sorted(entries):
+            self._sizes[relpath] = size
+            self._total += size
+
+    def get(self, relpath: str) -> Optional[str]:
+        with self._lock:
+            hit = relpath in self._sizes
+            record_cache("thumbnails", hit=hit)
+            if not hit:
+                return None
+            self._sizes.move_to_end(relpath)
+        path = os.path.join(self.folder, relpath)
+        try:
+            os.utime(path)  # recency survives a restart
+        except FileNotFoundError:
+            # Evicted by another worker sharing the folder
+            with self._lock:
+                self._total -= self._sizes.pop(relpath, 0)
+            return None
+        return path
+
+    def put(self, relpath: str, data: bytes) -> str:
+        path = os.path.join(self.folder, relpath)
+        _write_atomic(path, data)
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(relpath, 0)
+            self._sizes[relpath] = len(data)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old_relpath, old_size = self._sizes.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(os.path.join(self.folder, old_relpath))
+                except FileNotFoundError:
+                    pass
+        return path
@@ -0,0 +1,100 @@
+import io
+import os
+from typing import Optional, Union
+from fastapi import UploadFile, HTTPException
+from starlette.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+from app.config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES, MAX_IMAGE_PIXELS
+
+# PIL warns above MAX_IMAGE_PIXELS and refuses above twice that; decode_image enforces the limit itself
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes // 1024 ** 2} MB")
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an upload in chunks, giving up with 413 as soon as it passes max_bytes
+    instead of buffering the whole body first.
+    """
+    data = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        data += chunk
+        if len(data) > max_bytes:
+            raise _too_large(max_bytes)
+    return bytes(data)
+
+
+async def save_upload(file: UploadFile, path: str, max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Stream an upload to path chunk by chunk. A file over max_bytes is removed and answered with 413.
+    """
+    written = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Refuse request bodies over max_bytes with 413 before the app parses them. Starlette spools
+    a whole multipart body to temporary files before the route runs, so the per-file limits of
+    read_upload/save_upload cannot bound what a client sends. A declared Content-Length is
+    checked up front; a chunked body is counted as it streams in and cut off past the limit.
+    """
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _detail(self) -> str:
+        return f"Request body exceeds {self.max_bytes // 1024 ** 2} MB"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            return await JSONResponse({"detail": self._detail()}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the body parsing of the route, answered like any HTTPException
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def decode_image(source: Union[bytes, str], draft_size: Optional[int] = None) -> Image.Image:
+    """
+    Decode image bytes or a file path to RGB, refusing decompression bombs and non-images with 400.
+    With draft_size, JPEGs are decoded by the DCT at the smallest 1/2, 1/4 or 1/8 scale
+    that still covers draft_size x draft_size, much cheaper than a full decode of a large photo.
+    """
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+            # Only the header has been read so far
+            if img.width * img.height > MAX_IMAGE_PIXELS:
+                raise HTTPException(status_code=400, detail=f"Image is larger than {MAX_IMAGE_PIXELS} pixels")
+            if draft_size:
+                img.draft("RGB", (draft_size, draft_size))
+            return img.convert("RGB")
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=400, detail=f"Image is larger than {MAX_IMAGE_PIXELS} pixels")
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise HTTPException(status_code=400, detail="Could not decode image")
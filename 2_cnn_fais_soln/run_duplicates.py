@@ -0,0 +1,68 @@
+import contextlib
+import logging
+import os
+import faiss
+from app.duplicates import UnionFind, find_duplicate_pairs, iter_clusters, write_clusters_jsonl, write_clusters_mongo
+from app.embedding_store import EmbeddingStore
+from app.search import load_index
+from app.calibration import load_calibration, apply_calibration
+from app.db.mongo import embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, duplicate_clusters_col
+from app.config import (
+    FAISS_INDEX_PATH,
+    CLIP_FAISS_INDEX_PATH,
+    CNN_EMBEDDINGS_PATH,
+    CLIP_EMBEDDINGS_PATH,
+    DUPLICATE_CNN_THRESHOLD,
+    DUPLICATE_CLIP_THRESHOLD,
+    DUPLICATE_BLOCK_SIZE,
+    DUPLICATE_MAX_NEIGHBORS,
+    DUPLICATE_THREADS,
+    DUPLICATE_PAIRS_PATH,
+    DUPLICATE_CLUSTERS_PATH,
+    SEARCH_LATENCY_BUDGET_MS,
+)
+
+logger = logging.getLogger("run_duplicates")
+
+def _optional_store(path):
+    return EmbeddingStore(path) if path and os.path.exists(path) else None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    # FAISS parallelizes each block of queries across these threads
+    faiss.omp_set_num_threads(DUPLICATE_THREADS)
+
+    union_find = UnionFind()
+    sources = [
+        ("cnn", FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH, embedding_cnn_faiss_metadata_col, DUPLICATE_CNN_THRESHOLD),
+        ("clip", CLIP_FAISS_INDEX_PATH, CLIP_EMBEDDINGS_PATH, embedding_clip_faiss_metadata_col, DUPLICATE_CLIP_THRESHOLD),
+    ]
+    with open(DUPLICATE_PAIRS_PATH, "w") if DUPLICATE_PAIRS_PATH else contextlib.nullcontext() as pairs_file:
+        for name, index_path, embeddings_path, metadata_col, threshold in sources:
+            index = load_index(index_path)
+            # Same nprobe/efSearch as the API under SEARCH_LATENCY_BUDGET_MS, the most accurate one without it
+            calibration = load_calibration(index_path)
+            if calibration is not None:
+                point = apply_calibration(index, calibration, SEARCH_LATENCY_BUDGET_MS or None)
+                logger.info("%s: %s=%s (recall@%s %.3f)", name, calibration.knob, point["value"], calibration.top_k, point["recall"])
+            logger.info("Searching %s index (%s vectors) for pairs scoring >= %s", name, index.ntotal, threshold)
+            try:
+                found = find_duplicate_pairs(
+                    name, index, metadata_col, union_find, threshold,
+                    store=_optional_store(embeddings_path),
+                    block_size=DUPLICATE_BLOCK_SIZE,
+                    k=DUPLICATE_MAX_NEIGHBORS,
+                    pairs_file=pairs_file,
+                )
+            except ValueError as e:
+                raise SystemExit(f"{name}: {e}")
+            logger.info("%s: %s duplicate pairs across item_ids", name, found)
+            del index
+
+    if DUPLICATE_CLUSTERS_PATH:
+        count = write_clusters_jsonl(iter_clusters(union_find), DUPLICATE_CLUSTERS_PATH)
+        logger.info("%s duplicate clusters written to %s", count, DUPLICATE_CLUSTERS_PATH)
+    else:
+        count = write_clusters_mongo(iter_clusters(union_find), duplicate_clusters_col)
+        logger.info("%s duplicate clusters written to the duplicate_clusters collection", count)
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+from app.embedding_export import export_embeddings
+from app.embedding_store import EmbeddingStore, IndexVectors
+from app.search import load_index
+from app.model import CNN_MODEL_NAME, CLIP_MODEL_NAME
+from app.startup import build_index_from_export, build_pq_index_from_store, build_binary_index_from_saved
+from app.db.mongo import embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col
+from app.config import (
+    FAISS_INDEX_PATH,
+    CLIP_FAISS_INDEX_PATH,
+    CNN_EMBEDDINGS_PATH,
+    CLIP_EMBEDDINGS_PATH,
+    CNN_PQ_INDEX_PATH,
+    CLIP_PQ_INDEX_PATH,
+    CNN_PQ_M,
+    CLIP_PQ_M,
+    CNN_BINARY_INDEX_PATH,
+    CLIP_BINARY_INDEX_PATH,
+)
+
+# kind -> (index path, embedding store path, metadata collection, model)
+CATALOGS = {
+    "cnn": (FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH, embedding_cnn_faiss_metadata_col, CNN_MODEL_NAME),
+    "clip": (CLIP_FAISS_INDEX_PATH, CLIP_EMBEDDINGS_PATH, embedding_clip_faiss_metadata_col, CLIP_MODEL_NAME),
+}
+
+# kind -> (PQ index path, PQ m, binary index path): first stages derived from the vectors
+DERIVED_INDEXES = {
+    "cnn": (CNN_PQ_INDEX_PATH, CNN_PQ_M, CNN_BINARY_INDEX_PATH),
+    "clip": (CLIP_PQ_INDEX_PATH, CLIP_PQ_M, CLIP_BINARY_INDEX_PATH),
+}
+
+
+def export_command(args):
+    index_path, embeddings_path, metadata_col, model = CATALOGS[args.kind]
+    if embeddings_path and os.path.exists(embeddings_path):
+        # Full-precision vectors, also when the index is PCA-reduced or compressed
+        store, source = EmbeddingStore(embeddings_path), embeddings_path
+    else:
+        index = load_index(index_path)
+        if not IndexVectors.is_exact(index):
+            raise SystemExit(f"{index_path} does not keep exact vectors and {embeddings_path} does not exist: nothing to export")
+        store, source = IndexVectors(index), index_path
+    manifest = export_embeddings(args.out_dir, store, metadata_col, model, source, args.chunk_rows)
+    print(f"Exported {manifest['count']} {args.kind} vectors of dim {manifest['dim']} to {args.out_dir}")
+
+
+def import_command(args):
+    index_path, embeddings_path, metadata_col, _ = CATALOGS[args.kind]
+    if args.index_path:
+        # Trying out an index: the live catalog files and metadata stay as they are
+        build_index_from_export(args.export_dir, args.index_path, args.factory)
+    else:
+        try:
+            built = build_index_from_export(args.export_dir, index_path, args.factory, metadata_col, embeddings_path)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if not built:
+            return
+        # Rebuilt from the imported store, so their rows line up with the new index
+        pq_index_path, pq_m, binary_index_path = DERIVED_INDEXES[args.kind]
+        if pq_index_path and os.path.exists(pq_index_path) and embeddings_path:
+            build_pq_index_from_store(embeddings_path, pq_index_path, pq_m)
+        if binary_index_path and os.path.exists(binary_index_path):
+            build_binary_index_from_saved(index_path, embeddings_path, binary_index_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export catalog embeddings, or rebuild indexes from an export without running the models")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write vectors, ids and metadata to a portable folder")
+    export_parser.add_argument("kind", choices=CATALOGS)
+    export_parser.add_argument("out_dir")
+    export_parser.add_argument("--chunk-rows", type=int, default=100000, help="rows per .npy / Parquet chunk")
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = commands.add_parser("import", help="build an index (and metadata) from an export")
+    import_parser.add_argument("kind", choices=CATALOGS)
+    import_parser.add_argument("export_dir")
+    import_parser.add_argument("--factory", help="faiss index_factory string, e.g. IVF1024,Flat or HNSW32 (default flat)")
+    import_parser.add_argument("--index-path", help="only write an index here, leaving the catalog index, store and metadata alone")
+    import_parser.set_defaults(func=import_command)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,62 @@
+import argparse
+import json
+import logging
+import os
+from app.model import load_models
+from app.search import load_index
+from app.embedding_store import EmbeddingStore, KeyedEmbeddingStore
+from app.local_features import LocalFeatureStore
+from app.perceptual_hash import PerceptualHashIndex
+from app.binary_index import BinaryCoarseIndex
+from app.controllers.add_controller import AddController
+from app.ingest import IngestJob
+from app.config import (
+    FAISS_INDEX_PATH,
+    CLIP_FAISS_INDEX_PATH,
+    CNN_EMBEDDINGS_PATH,
+    CLIP_EMBEDDINGS_PATH,
+    CNN_PQ_INDEX_PATH,
+    CLIP_PQ_INDEX_PATH,
+    CNN_BINARY_INDEX_PATH,
+    CLIP_BINARY_INDEX_PATH,
+    LOCAL_FEATURES_PATH,
+    PHASH_INDEX_PATH,
+    INGEST_BATCH_SIZE,
+    ITEM_NAME_EMBEDDINGS_PATH,
+)
+
+logger = logging.getLogger("run_ingest")
+
+def _exists(path):
+    return bool(path) and os.path.exists(path)
+
+
+if __name__ == "__main__":
+    # Writes the index files directly: run with the API stopped, or use POST /admin/ingest instead
+    parser = argparse.ArgumentParser(description="Bulk-add products from a JSON Lines manifest and an image directory or tar archive")
+    parser.add_argument("manifest", help="JSON Lines manifest, one product per line")
+    parser.add_argument("images", help="image directory or tar archive the manifest paths are relative to")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    load_models()
+
+    add_controller = AddController(
+        faiss_cnn_index=load_index(FAISS_INDEX_PATH),
+        faiss_clip_index=load_index(CLIP_FAISS_INDEX_PATH),
+        cnn_store=EmbeddingStore(CNN_EMBEDDINGS_PATH) if _exists(CNN_EMBEDDINGS_PATH) else None,
+        clip_store=EmbeddingStore(CLIP_EMBEDDINGS_PATH) if _exists(CLIP_EMBEDDINGS_PATH) else None,
+        cnn_pq_index=load_index(CNN_PQ_INDEX_PATH) if _exists(CNN_PQ_INDEX_PATH) else None,
+        clip_pq_index=load_index(CLIP_PQ_INDEX_PATH) if _exists(CLIP_PQ_INDEX_PATH) else None,
+        local_feature_store=LocalFeatureStore(LOCAL_FEATURES_PATH) if LocalFeatureStore.exists(LOCAL_FEATURES_PATH) else None,
+        hash_index=PerceptualHashIndex(PHASH_INDEX_PATH) if PerceptualHashIndex.exists(PHASH_INDEX_PATH) else None,
+        cnn_binary_index=BinaryCoarseIndex.load(CNN_BINARY_INDEX_PATH) if _exists(CNN_BINARY_INDEX_PATH) else None,
+        clip_binary_index=BinaryCoarseIndex.load(CLIP_BINARY_INDEX_PATH) if _exists(CLIP_BINARY_INDEX_PATH) else None,
+        item_name_store=KeyedEmbeddingStore(ITEM_NAME_EMBEDDINGS_PATH) if KeyedEmbeddingStore.exists(ITEM_NAME_EMBEDDINGS_PATH) else None,
+    )
+
+    job = IngestJob(add_controller, args.manifest, args.images, args.batch_size)
+    job.run()
+    print(json.dumps(job.to_dict(), indent=2))
+    raise SystemExit(0 if job.status == "done" else 1)
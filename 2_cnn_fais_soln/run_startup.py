@@ -1,4 +1,5 @@
-from app.startup import build_cnn_faiss_index, build_products_col, build_clip_faiss_index
+from app.startup import build_cnn_faiss_index, build_products_col, build_clip_faiss_index, build_pq_index_from_store, build_local_feature_store, build_item_name_embeddings, calibrate_index_from_store, build_thumbnails, build_perceptual_hash_index, build_binary_index_from_saved, build_index_stats_from_saved
+from app.config import CNN_BINARY_INDEX_PATH, CLIP_BINARY_INDEX_PATH, FAISS_INDEX_PATH, CLIP_FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH, CNN_PQ_INDEX_PATH, CNN_PQ_M, CLIP_EMBEDDINGS_PATH, CLIP_PQ_INDEX_PATH, CLIP_PQ_M
 
 
 if __name__ == "__main__":
@@ -7,3 +8,31 @@ if __name__ == "__main__":
 
     # build_cnn_faiss_index()
     build_clip_faiss_index()
+
+    # Compressed first-stage indexes for two-stage search (need the embedding stores)
+    # build_pq_index_from_store(CNN_EMBEDDINGS_PATH, CNN_PQ_INDEX_PATH, CNN_PQ_M)
+    # build_pq_index_from_store(CLIP_EMBEDDINGS_PATH, CLIP_PQ_INDEX_PATH, CLIP_PQ_M)
+
+    # Binary-quantized first stages, from the saved stores or indexes (no model runs)
+    # build_binary_index_from_saved(FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH, CNN_BINARY_INDEX_PATH)
+    # build_binary_index_from_saved(CLIP_FAISS_INDEX_PATH, CLIP_EMBEDDINGS_PATH, CLIP_BINARY_INDEX_PATH)
+
+    # Re-measure nprobe/efSearch recall/latency of approximate indexes (done automatically on build)
+    # calibrate_index_from_store(FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH)
+    # calibrate_index_from_store(CLIP_FAISS_INDEX_PATH, CLIP_EMBEDDINGS_PATH)
+
+    # Catalog statistics for drift monitoring (/admin/drift), also saved automatically on build
+    # build_index_stats_from_saved(FAISS_INDEX_PATH, CNN_EMBEDDINGS_PATH)
+    # build_index_stats_from_saved(CLIP_FAISS_INDEX_PATH, CLIP_EMBEDDINGS_PATH)
+
+    # ORB features for geometric re-verification (LOCAL_FEATURES_PATH)
+    # build_local_feature_store()
+
+    # CLIP text embeddings of item names for hybrid /search/text (ITEM_NAME_EMBEDDINGS_PATH)
+    # build_item_name_embeddings()
+
+    # WebP thumbnails served by /thumbs (THUMBNAILS_FOLDER)
+    # build_thumbnails()
+
+    # Perceptual hashes for the duplicate fast path of /search/ (PHASH_INDEX_PATH)
+    # build_perceptual_hash_index()
@@ -0,0 +1,275 @@
+"""
+HTTP load generator for /search/, /products/{item_id} and /add_product.
+
+In-process against a tiny synthetic catalog (local Mongo, separate database):
+    python -m tests.loadgen --synthetic /tmp/vpi-load --products 500 --concurrency 16 --duration 60 --out run.json
+
+Against a running server and its catalog, at a fixed arrival rate:
+    python -m tests.loadgen --url http://localhost:8000 --images ../data/test_images --rate 20 --duration 120
+
+Compare with an earlier run (exit code 1 on regression):
+    python -m tests.loadgen ... --out new.json --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+import httpx
+
+PERCENTILES = (50, 90, 95, 99)
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def parse_mix(text: str) -> dict:
+    # "search=0.8,products=0.15,add=0.05" -> normalized weights
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("search", "products", "add"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        mix[name.strip()] = float(weight)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    # Nearest rank
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def load_images(folder: str, limit: int) -> list:
+    paths = sorted(p for p in Path(folder).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)[:limit]
+    if not paths:
+        raise SystemExit(f"No images found in {folder}")
+    return [(p.name, p.read_bytes()) for p in paths]
+
+
+class Recorder:
+    """
+    Latency and status of every request, per endpoint.
+    """
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(latency_ms, status)]
+
+    def record(self, endpoint: str, latency_ms: float, status):
+        self.samples[endpoint].append((latency_ms, status))
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = dict(self.samples)
+        endpoints["all"] = [s for samples in self.samples.values() for s in samples]
+        report = {}
+        for endpoint, samples in endpoints.items():
+            latencies = sorted(latency for latency, _ in samples)
+            statuses = Counter(str(status) for _, status in samples)
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            report[endpoint] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+                "statuses": dict(statuses),
+                "latency_ms": {
+                    **{f"p{p}": round(percentile(latencies, p), 2) for p in PERCENTILES},
+                    "max": round(latencies[-1], 2),
+                    "mean": round(sum(latencies) / len(latencies), 2),
+                } if latencies else None,
+            }
+        return report
+
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, images: list, item_ids: list, mix: dict, search_methods: list, top_k: int, seed: int):
+        self.client = client
+        self.images = images
+        self.item_ids = item_ids
+        self.mix = mix
+        self.search_methods = search_methods
+        self.top_k = top_k
+        self.random = random.Random(seed)
+        self.run_id = f"{int(time.time()):x}"
+        self.added = 0
+        self.recorder = Recorder()
+
+    def _image(self):
+        name, data = self.random.choice(self.images)
+        return {"file": (name, data, "image/jpeg")}
+
+    async def search(self) -> httpx.Response:
+        files = self._image()
+        data = {"method": self.random.choice(self.search_methods), "top_k": str(self.top_k)}
+        return await self.client.post("/search/", files=files, data=data)
+
+    async def products(self) -> httpx.Response:
+        return await self.client.get(f"/products/{self.random.choice(self.item_ids)}")
+
+    async def add(self) -> httpx.Response:
+        self.added += 1
+        item_id = f"LOADTEST{self.run_id}{self.added:06d}"
+        _, (name, data, content_type) = self._image().popitem()
+        return await self.client.post("/add_product", files={"main_image": (name, data, content_type)}, data={
+            "item_id": item_id,
+            "product_type": "SHOES",
+            "item_name": f"Load test product {self.added}",
+        })
+
+    async def request(self, scheduled: float = None, record: bool = True):
+        """
+        One request of a random endpoint from the mix. Open-loop latency is measured from the
+        scheduled arrival time, so time spent waiting for a client slot is not hidden.
+        """
+        endpoint = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            status = (await getattr(self, endpoint)()).status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if record:
+            self.recorder.record(endpoint, (time.perf_counter() - start) * 1000, status)
+
+    async def run_closed(self, concurrency: int, duration: float):
+        # Each worker sends its next request as soon as the previous one returns
+        end = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < end:
+                await self.request()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open(self, rate: float, concurrency: int, duration: float):
+        # Poisson arrivals at `rate` per second, whatever the response times are
+        slots = asyncio.Semaphore(concurrency)
+        end = time.perf_counter() + duration
+        tasks = []
+
+        async def send(scheduled):
+            async with slots:
+                await self.request(scheduled)
+
+        next_arrival = time.perf_counter()
+        while next_arrival < end:
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            tasks.append(asyncio.create_task(send(next_arrival)))
+            next_arrival += self.random.expovariate(rate)
+        await asyncio.gather(*tasks)
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> bool:
+    """
+    Print per-endpoint changes against a baseline run. False when p95 latency grew by more
+    than max_regression (relative) or the error rate by more than a percentage point.
+    """
+    ok = True
+    print(f"\n{'endpoint':<10} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for endpoint, now in current["summary"].items():
+        before = baseline["summary"].get(endpoint)
+        if before is None or not now["latency_ms"] or not before["latency_ms"]:
+            continue
+        rows = [("throughput_rps", before["throughput_rps"], now["throughput_rps"])]
+        rows += [(f"p{p}_ms", before["latency_ms"][f"p{p}"], now["latency_ms"][f"p{p}"]) for p in PERCENTILES]
+        rows += [("error_rate", before["error_rate"], now["error_rate"])]
+        for metric, old, new in rows:
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{endpoint:<10} {metric:<15} {old:>10} {new:>10} {change:>8}")
+        p95_old, p95_new = before["latency_ms"]["p95"], now["latency_ms"]["p95"]
+        if p95_old and (p95_new - p95_old) / p95_old > max_regression:
+            print(f"REGRESSION: {endpoint} p95 {p95_old} -> {p95_new} ms")
+            ok = False
+        if now["error_rate"] - before["error_rate"] > 0.01:
+            print(f"REGRESSION: {endpoint} error rate {before['error_rate']} -> {now['error_rate']}")
+            ok = False
+    return ok
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> int:
+    if args.synthetic:
+        # The app reads its configuration at import time, so the environment comes first
+        from tests.synthetic_catalog import synthetic_env
+        os.environ.update(synthetic_env(args.synthetic, args.db_name))
+        from tests.synthetic_catalog import build_synthetic_catalog
+        item_ids = build_synthetic_catalog(args.products, args.seed)
+        print(f"Synthetic catalog of {len(item_ids)} products in {args.synthetic} (database {args.db_name})")
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+        images_folder = args.images or os.environ["SHOE_IMAGES_FOLDER"]
+    else:
+        from app.db.mongo import products_col
+        sample = products_col.aggregate([{"$sample": {"size": 1000}}, {"$project": {"item_id": 1}}])
+        item_ids = [doc["item_id"] for doc in sample]
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        images_folder = args.images
+        if not images_folder:
+            raise SystemExit("--images is required with --url")
+
+    generator = LoadGenerator(client, load_images(images_folder, args.max_images), item_ids, args.mix,
+                              args.search_methods.split(","), args.top_k, args.seed)
+    async with client:
+        for _ in range(args.warmup):
+            await generator.request(record=False)
+        started_at = time.time()
+        start = time.perf_counter()
+        if args.rate:
+            await generator.run_open(args.rate, args.concurrency, args.duration)
+        else:
+            await generator.run_closed(args.concurrency, args.duration)
+        elapsed = time.perf_counter() - start
+
+    result = {
+        "started_at": started_at,
+        "elapsed_s": round(elapsed, 2),
+        "commit": _git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        "summary": generator.recorder.summary(elapsed),
+    }
+    print(json.dumps(result["summary"], indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to {args.out}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            return 0 if compare(result, json.load(f), args.max_regression) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load test of the visual search API")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--synthetic", metavar="FOLDER", help="build a synthetic catalog in FOLDER and run app.main:app in-process")
+    parser.add_argument("--products", type=int, default=500, help="synthetic catalog size")
+    parser.add_argument("--db-name", default="visual_product_loadtest", help="Mongo database of the synthetic catalog (wiped)")
+    parser.add_argument("--images", help="query/upload images (default: the synthetic catalog images)")
+    parser.add_argument("--max-images", type=int, default=200)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("search=0.8,products=0.2"),
+                        help="endpoint weights, e.g. search=0.8,products=0.15,add=0.05")
+    parser.add_argument("--search-methods", default="cnn_faiss,clip_faiss")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers, or max requests in flight with --rate")
+    parser.add_argument("--rate", type=float, default=0, help="open-loop arrival rate (requests/s); 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests sent first")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="save results as JSON")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="tolerated relative p95 increase")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+from PIL import Image, ImageDraw
+
+CNN_DIM = 2048
+CLIP_DIM = 512
+
+# Optional structures main.py would otherwise load from .env; the synthetic catalog has none of them
+OPTIONAL_PATHS = [
+    "CNN_EMBEDDINGS_PATH", "CLIP_EMBEDDINGS_PATH", "CNN_PQ_INDEX_PATH", "CLIP_PQ_INDEX_PATH",
+    "CNN_BINARY_INDEX_PATH", "CLIP_BINARY_INDEX_PATH", "LOCAL_FEATURES_PATH", "ITEM_NAME_EMBEDDINGS_PATH",
+    "THUMBNAILS_FOLDER", "PHASH_INDEX_PATH",
+]
+
+
+def synthetic_env(folder: str, db_name: str = "visual_product_loadtest") -> dict:
+    """
+    Environment pointing the app at a synthetic catalog in folder and its own Mongo database.
+    Must be applied before anything from app is imported.
+    """
+    folder = os.path.abspath(folder)
+    env = {name: "" for name in OPTIONAL_PATHS}
+    env.update({
+        "SHOE_IMAGES_FOLDER": os.path.join(folder, "images"),
+        "FAISS_INDEX_PATH": os.path.join(folder, "cnn.index"),
+        "CLIP_FAISS_INDEX_PATH": os.path.join(folder, "clip.index"),
+        "MONGO_DB_NAME": db_name,
+        "EMBEDDING_CLIP_FAISS_METADATA_COLLECTION": os.getenv("EMBEDDING_CLIP_FAISS_METADATA_COLLECTION") or "embedding_clip_faiss_metadata",
+    })
+    return env
+
+
+def synthetic_image(rng: np.random.Generator, size: int = 256) -> Image.Image:
+    # A few random shapes on a random background, so decoding and hashing do real work
+    image = Image.new("RGB", (size, size), tuple(int(c) for c in rng.integers(0, 256, 3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = (int(v) for v in rng.integers(0, size - 32, 2))
+        x1, y1 = x0 + int(rng.integers(16, size - x0)), y0 + int(rng.integers(16, size - y0))
+        draw.ellipse((x0, y0, x1, y1), fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return image
+
+
+def _unit_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_synthetic_catalog(products: int, seed: int = 0):
+    """
+    A tiny catalog matching synthetic_env(): JPEGs, flat CNN/CLIP indexes of random unit vectors
+    and the Mongo products and metadata collections. Embeddings are random, not model outputs:
+    the catalog exercises the serving path (decode, inference, FAISS, Mongo), not search quality.
+    Returns the item_ids.
+    """
+    from app.config import SHOE_IMAGES_FOLDER, FAISS_INDEX_PATH, CLIP_FAISS_INDEX_PATH
+    from app.db.mongo import products_col, embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, catalog_meta_col
+    from app.search import build_faiss_index, save_index
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(SHOE_IMAGES_FOLDER, "synthetic"), exist_ok=True)
+    for col in (products_col, embedding_cnn_faiss_metadata_col, embedding_clip_faiss_metadata_col, catalog_meta_col):
+        col.delete_many({})
+
+    item_ids, metadata_docs, product_docs = [], [], []
+    for i in range(products):
+        item_id = f"SYN{i:06d}"
+        image_id = f"{item_id}IMG"
+        image_path = f"synthetic/{image_id}.jpg"
+        synthetic_image(rng).save(os.path.join(SHOE_IMAGES_FOLDER, image_path), quality=90)
+        item_ids.append(item_id)
+        metadata_docs.append({"faiss_index": i, "image_id": image_id, "item_id": item_id, "image_path": image_path})
+        product_docs.append({
+            "item_id": item_id,
+            "product_type": ["SHOES"],
+            "item_name": [{"language_tag": "en", "value": f"Synthetic shoe {i}"}],
+            "main_image_id": image_id,
+            "other_image_id": [],
+        })
+
+    save_index(build_faiss_index(_unit_vectors(rng, products, CNN_DIM)), FAISS_INDEX_PATH)
+    save_index(build_faiss_index(_unit_vectors(rng, products, CLIP_DIM)), CLIP_FAISS_INDEX_PATH)
+    # insert_many adds _id to the dicts, so each collection gets its own copies
+    embedding_cnn_faiss_metadata_col.insert_many([dict(doc) for doc in metadata_docs])
+    embedding_clip_faiss_metadata_col.insert_many([dict(doc) for doc in metadata_docs])
+    embedding_cnn_faiss_metadata_col.create_index("faiss_index")
+    embedding_clip_faiss_metadata_col.create_index("faiss_index")
+    products_col.insert_many(product_docs)
+    products_col.create_index("item_id")
+    return item_ids
@@ -6,7 +6,7 @@ from pymongo import MongoClient
 from starlette.datastructures import UploadFile
 from app.models.search_models import SearchRequest
 from app.controllers.search_controller import SearchController
-from app.model import extract_embedding, extract_clip_embedding
+from app.model import extract_embedding, extract_clip_embedding, extract_embeddings_batch, extract_clip_embeddings_batch
 from app.services.cnn_faiss import CNNFaissSearch
 from app.services.clip_faiss import CLIPFaissSearch
 from app.search import load_index, search
@@ -25,12 +25,15 @@ cnn_index = load_index(FAISS_INDEX_PATH)
 clip_index = load_index(CLIP_FAISS_INDEX_PATH)
 
 # Initialize services
-cnn_faiss_service = CNNFaissSearch(cnn_index, extract_embedding, search)  # Replace None with actual search fn if needed
-clip_faiss_service = CLIPFaissSearch(clip_index, extract_clip_embedding, search)  # Replace None with actual search fn if needed
+cnn_faiss_service = CNNFaissSearch(cnn_index, extract_embedding, search, extract_embeddings_batch)  # Replace None with actual search fn if needed
+clip_faiss_service = CLIPFaissSearch(clip_index, extract_clip_embedding, search, extract_clip_embeddings_batch)  # Replace None with actual search fn if needed
 
 # Initialize controller with both services
 search_controller = SearchController(cnn_faiss_service, clip_faiss_service)
 
+# Test-time augmentation mode for the searches: none, mean or max
+tta_mode = os.getenv("TEST_TTA", "none")
+
 # Ask for test case name
 test_case_name = input("Enter test case name (folder name) to save modified images and logs: ").strip()
 modified_images_folder = os.path.join(TEST_SET_MODIFY_FOLDER, test_case_name)
@@ -88,7 +91,7 @@ async def run_search_test(search_controller, metadata_col, log_file_path, method
 
         upload_file_original = await create_upload_file_from_path(image_abs_path)
         # Create SearchRequest params instance
-        params = SearchRequest(method=method_name, top_k=5)
+        params = SearchRequest(method=method_name, top_k=5, tta=tta_mode)
 
         # Original image search
         search_start = time.time()
@@ -146,6 +149,7 @@ async def run_search_test(search_controller, metadata_col, log_file_path, method
     with open(log_file_path, "w") as log_file:
         log_file.write(f"{method_name} Search Accuracy Test Log\n")
         log_file.write(f"Total images tested: {total}\n")
+        log_file.write(f"Test-time augmentation: {tta_mode}\n")
         log_file.write(f"Original images pass rate: {original_rate:.2f}%\n")
         log_file.write(f"Modified images pass rate: {modified_rate:.2f}%\n")
         log_file.write(f"Total test duration: {total_duration:.2f}s (Average search duration: {avg_search_duration:.4f}s)\n")
@@ -17,13 +17,19 @@ import OtherImages from "./product_modal/other_images";
 
 const IMAGE_BASE_URL = "http://localhost:5000/images/";
 
-export default function ProductModal({ open, onClose, itemId }) {
+export default function ProductModal({ open, onClose, itemId, initialProduct }) {
   const [product, setProduct] = useState(null);
   const [loading, setLoading] = useState(false);
   
   useEffect(() => {
     if (!itemId) return;
 
+    // Product already returned with the search results, no extra request needed
+    if (initialProduct) {
+      setProduct(initialProduct);
+      return;
+    }
+
     setLoading(true);
     setProduct(null);
 
@@ -32,7 +38,7 @@ export default function ProductModal({ open, onClose, itemId }) {
       .then((res) => setProduct(res.data))
       .catch(() => setProduct({ error: "Product not found" }))
       .finally(() => setLoading(false));
-  }, [itemId]);
+  }, [itemId, initialProduct]);
 
   return (
     <Modal
@@ -15,6 +15,7 @@ function Search() {
   const [method, setMethod] = useState("cnn_faiss");  
   const [previewUrl, setPreviewUrl] = useState(null);
   const [results, setResults] = useState([]);
+  const [products, setProducts] = useState({});
   const [loading, setLoading] = useState(false);
 
   const handleFileChange = (e) => {
@@ -37,6 +38,7 @@ function Search() {
     formData.append("file", file);
     formData.append("method", method);  
     formData.append("top_k", 5);
+    formData.append("include_products", true);
 
     setLoading(true);
     try {
@@ -46,6 +48,7 @@ function Search() {
         },
       });
       setResults(response.data.results);
+      setProducts(response.data.products || {});
     } catch (error) {
       console.error("Search error:", error);
       alert("Failed to search. See console for details.");
@@ -90,7 +93,7 @@ function Search() {
         </Box>
       )}
 
-      <SearchResults results={results} method={method} />
+      <SearchResults results={results} products={products} method={method} />
     </Container>
   );
 }
@@ -1,7 +1,37 @@
-import React from "react";
+import React, { useEffect, useState } from "react";
+import axios from "axios";
 import { FormControl, InputLabel, Select, MenuItem } from "@mui/material";
 
+const METHOD_LABELS = {
+  cnn_faiss: "CNN + FAISS",
+  clip_faiss: "CLIP + FAISS",
+  cnn_two_stage: "CNN two-stage (compressed + exact re-rank)",
+  clip_two_stage: "CLIP two-stage (compressed + exact re-rank)",
+  cnn_binary: "CNN binary (1-bit codes + exact re-score)",
+  clip_binary: "CLIP binary (1-bit codes + exact re-score)",
+  cnn_clip_rerank: "CNN candidates + CLIP re-rank",
+  cnn_geometric: "CNN + geometric verification",
+  clip_geometric: "CLIP + geometric verification",
+};
+
 export default function SearchMethodSelect({ method, setMethod }) {
+  // Optional methods only exist when the server built their indexes, so list what it serves
+  const [methods, setMethods] = useState(["cnn_faiss", "clip_faiss"]);
+
+  useEffect(() => {
+    axios
+      .get("http://localhost:5000/search/methods")
+      .then((response) => {
+        const available = response.data.methods;
+        setMethods(available);
+        if (!available.includes(method)) {
+          setMethod(available[0]);
+        }
+      })
+      .catch((error) => console.error("Failed to load search methods:", error));
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
   return (
     <FormControl fullWidth margin="normal">
       <InputLabel id="search-method-label">Search Method</InputLabel>
@@ -11,9 +41,11 @@ export default function SearchMethodSelect({ method, setMethod }) {
         label="Search Method"
         onChange={(e) => setMethod(e.target.value)}
       >
-        <MenuItem value="cnn_faiss">CNN + FAISS</MenuItem>
-        <MenuItem value="clip_faiss">CLIP + FAISS</MenuItem>
-        {/* Add more */}
+        {methods.map((name) => (
+          <MenuItem key={name} value={name}>
+            {METHOD_LABELS[name] || name}
+          </MenuItem>
+        ))}
       </Select>
     </FormControl>
   );
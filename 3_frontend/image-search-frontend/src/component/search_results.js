@@ -9,8 +9,15 @@ import {
 import ProductModal from "./product_modal";
 
 const IMAGE_BASE_URL = "http://localhost:5000/images/";
+// 256px WebP thumbnails; the card falls back to the full image when /thumbs is not enabled
+const THUMB_BASE_URL = "http://localhost:5000/thumbs/256/";
 
-export default function SearchResults({ results }) {
+const fallbackToFullImage = (imagePath) => (e) => {
+  const fullUrl = IMAGE_BASE_URL + imagePath;
+  if (e.currentTarget.src !== fullUrl) e.currentTarget.src = fullUrl;
+};
+
+export default function SearchResults({ results, products = {} }) {
   const [open, setOpen] = useState(false);
   const [selectedItemId, setSelectedItemId] = useState(null);
 
@@ -40,7 +47,9 @@ export default function SearchResults({ results }) {
                 <CardMedia
                   component="img"
                   height="200"
-                  image={IMAGE_BASE_URL + img.image_path}
+                  image={THUMB_BASE_URL + img.image_path}
+                  onError={fallbackToFullImage(img.image_path)}
+                  loading="lazy"
                   alt={`Result ${idx + 1}`}
                 />
                 <Box
@@ -70,7 +79,12 @@ export default function SearchResults({ results }) {
       </Grid>
 
       {selectedItemId && (
-        <ProductModal open={open} onClose={handleClose} itemId={selectedItemId} />
+        <ProductModal
+          open={open}
+          onClose={handleClose}
+          itemId={selectedItemId}
+          initialProduct={products[selectedItemId]}
+        />
       )}
     </>
   );
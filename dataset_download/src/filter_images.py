@@ -1,84 +1,136 @@
-import json
-import gzip
+import argparse
 import csv
+import gzip
 import os
 import shutil
-
-# Load images metadata mapping image_id -> relative path
-image_id_to_path = {}
-with gzip.open('../../data/images.csv.gz', 'rt', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        image_id = row['image_id']
-        path = row['path']  # e.g., 'if2e/2e3af037.jpg'
-        image_id_to_path[image_id] = path
-
-print(f"Loaded {len(image_id_to_path)} image entries.")
-
-# Load shoe products metadata
-with open('../../data/testSet1/limited2_shoe_products.json', 'r') as f:
-    shoe_products = json.load(f)
-
-# first test set
-limited_shoe_products = shoe_products
-
-# Collect all unique (image_id, image_path) tuples needed for shoe products
-required_images = set()
-for product in limited_shoe_products:
-    image_ids = []
-    if product.get('main_image_id'):
-        image_ids.append(product['main_image_id'])
-    if product.get('other_image_id'):
-        image_ids.extend(product['other_image_id'])
-    for img_id in image_ids:
-        path = image_id_to_path.get(img_id)
-        if path:
-            required_images.add((img_id, path, product.get('item_id')))
-
-print(f"Total unique shoe images to download: {len(required_images)}")
-
-image_copy_info = []
-total_images = len(required_images)
-
-source_folder = '../../data/all_images/images/small'  # Folder where all images are downloaded already
-target_folder = '../../data/shoe_images'       # Folder to copy required images into
-os.makedirs(target_folder, exist_ok=True)
-
-
-for idx, (image_id, image_path, item_id) in enumerate(required_images, start=1):
-    print(f"Processing image {idx} of {total_images}: {image_path}")
-
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from manifest_io import RecordWriter, iter_records
+
+PROGRESS_EVERY_SECONDS = 5
+
+
+def required_image_ids(products_path: str) -> dict:
+    """
+    image_id -> item_id for every main and other image of the products, streamed from the products file.
+    """
+    required = {}
+    for product in iter_records(products_path):
+        image_ids = []
+        if product.get('main_image_id'):
+            image_ids.append(product['main_image_id'])
+        if product.get('other_image_id'):
+            image_ids.extend(product['other_image_id'])
+        for img_id in image_ids:
+            required.setdefault(img_id, product.get('item_id'))
+    return required
+
+
+def iter_image_paths(images_csv: str, wanted: dict):
+    """
+    (image_id, relative path) rows of images.csv.gz, keeping only wanted image_ids
+    instead of loading the whole mapping.
+    """
+    with gzip.open(images_csv, 'rt', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['image_id'] in wanted:
+                yield row['image_id'], row['path']  # e.g., 'if2e/2e3af037.jpg'
+
+
+class Progress:
+    """
+    Thread-safe counters of the copy, printed at most every PROGRESS_EVERY_SECONDS.
+    """
+    def __init__(self, total: int):
+        self.total = total
+        self.counts = {"copied": 0, "present": 0, "missing": 0}
+        self.start = self.last_report = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+            now = time.perf_counter()
+            if now - self.last_report >= PROGRESS_EVERY_SECONDS:
+                self.last_report = now
+                self.report()
+
+    def report(self):
+        done = sum(self.counts.values())
+        rate = done / max(time.perf_counter() - self.start, 1e-9)
+        print(f"{done}/{self.total} images ({rate:.0f}/s): " + ", ".join(f"{k} {v}" for k, v in self.counts.items()))
+
+
+def copy_image(source_folder: str, target_folder: str, image_path: str) -> str:
     src_path = os.path.join(source_folder, image_path)
     dst_path = os.path.join(target_folder, image_path)
-
+    if os.path.exists(dst_path):
+        return "present"
+    if not os.path.exists(src_path):
+        return "missing"
     # Ensure target subfolders exist
     os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-
-    if os.path.exists(src_path):
-        if(not os.path.exists(dst_path)):
-            shutil.copy2(src_path, dst_path)
-            print(f"Copied: {image_path}")
-            copied = True
-        else:
-            print(f"Image already exists: {image_path}")
-            copied = True
-    else:
-        print(f"Missing source image: {image_path}")
-        copied = False
-
-    image_copy_info.append({
-        "image_id": image_id,
-        "image_path": image_path,
-        "item_id": item_id,
-        "exist": copied 
-    })
-    print(f"Processed {idx} images.")
-    print(f"image_copy_info: {image_id}, {item_id}")
-
-with open('../../data/testSet1/limited2_image_paths.json', 'w') as f:
-    json.dump(image_copy_info, f, indent=2)
-
-print(f"Saved copy info for {total_images} images to 'limited2_image_paths.json'")
+    shutil.copy2(src_path, dst_path)
+    return "copied"
+
+
+def bounded_map(pool, fn, items, window: int):
+    """
+    Ordered pool.map that keeps at most `window` tasks in flight,
+    so the input is consumed lazily instead of being submitted all at once.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the images of the filtered products and write the image manifest")
+    parser.add_argument('--products', default='../../data/testSet1/limited2_shoe_products.json',
+                        help="Output of listings_filter.py (.json or .jsonl)")
+    parser.add_argument('--images-csv', default='../../data/images.csv.gz')
+    parser.add_argument('--source-folder', default='../../data/all_images/images/small',
+                        help="Folder where all images are downloaded already")
+    parser.add_argument('--target-folder', default='../../data/shoe_images', help="Folder to copy required images into")
+    parser.add_argument('--output', default='../../data/testSet1/limited2_image_paths.json',
+                        help="IMAGE_PATHS_JSON manifest read by startup.py (.json array, or .jsonl)")
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    wanted = required_image_ids(args.products)
+    print(f"Total unique images to copy: {len(wanted)}")
+    os.makedirs(args.target_folder, exist_ok=True)
+
+    progress = Progress(len(wanted))
+
+    def process(row):
+        image_id, image_path = row
+        outcome = copy_image(args.source_folder, args.target_folder, image_path)
+        progress.add(outcome)
+        return {
+            "image_id": image_id,
+            "image_path": image_path,
+            "item_id": wanted[image_id],
+            "exist": outcome != "missing",
+        }
+
+    # Copies are I/O bound, so threads overlap them; results keep images.csv order in the manifest
+    with ThreadPoolExecutor(max_workers=args.threads) as pool, RecordWriter(args.output) as writer:
+        for info in bounded_map(pool, process, iter_image_paths(args.images_csv, wanted), args.threads * 8):
+            writer.write(info)
+
+    progress.report()
+    print(f"Saved copy info for {writer.count} images to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
 
 
 # import boto3
@@ -1,41 +1,78 @@
-import os
+import argparse
 import gzip
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from manifest_io import RecordWriter
+
+
+def product_types(product: dict) -> List[str]:
+    types = product.get('product_type', [])
+    # product_type could be list of dicts or string
+    if isinstance(types, list):
+        return [pt.get('value', '').lower() for pt in types if isinstance(pt, dict)]
+    if isinstance(types, str):
+        return [types.lower()]
+    return []
+
+
+def filter_listing_file(filepath: str, keyword: str = 'shoe') -> List[dict]:
+    """
+    Decompress and parse one listings/metadata/*.json.gz file (JSON Lines),
+    returning the trimmed records whose product type contains keyword.
+    Runs in a worker process; only the matches travel back.
+    """
+    matches = []
+    with gzip.open(filepath, 'rt', encoding='utf-8') as f:
+        for line in f:
+            product = json.loads(line)
+            types = product_types(product)
+            if any(keyword in t for t in types):
+                matches.append({
+                    'item_id': product.get('item_id'),
+                    'product_type': types,
+                    'item_name': product.get('item_name'),
+                    'main_image_id': product.get('main_image_id'),
+                    'other_image_id': product.get('other_image_id', [])
+                })
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract shoe listings from the ABO listings metadata")
+    parser.add_argument('--metadata-dir', default='../../data/listings/metadata')
+    parser.add_argument('--output', default='../../data/testSet1/limited2_shoe_products.json',
+                        help=".jsonl for JSON Lines, anything else writes a JSON array")
+    parser.add_argument('--keyword', default='shoe', help="Keep products whose product_type contains this")
+    parser.add_argument('--limit', type=int, default=0, help="Stop after this many products (0 = all)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    files = [
+        os.path.join(args.metadata_dir, filename)
+        for filename in sorted(os.listdir(args.metadata_dir))
+        if filename.endswith('.json.gz')
+    ]
+    print(f"Parsing {len(files)} listing files with {args.workers} processes...")
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, RecordWriter(args.output) as writer:
+        # map() keeps file order, so the output is deterministic
+        for filepath, matches in zip(files, pool.map(filter_listing_file, files, [args.keyword] * len(files))):
+            for product in matches:
+                if args.limit and writer.count >= args.limit:
+                    break
+                writer.write(product)
+            print(f"{os.path.basename(filepath)}: {len(matches)} matches, {writer.count} written "
+                  f"({time.perf_counter() - start:.1f}s)")
+            if args.limit and writer.count >= args.limit:
+                pool.shutdown(cancel_futures=True)
+                break
+
+    print(f"Saved {writer.count} products to {args.output}")
+
 
-metadata_dir = '../../data/listings/metadata'  # Adjust path if needed
-shoe_products = []
-
-# Iterate over all listings JSON.gz files
-for filename in sorted(os.listdir(metadata_dir)):
-    if filename.endswith('.json.gz'):
-        filepath = os.path.join(metadata_dir, filename)
-        print(f"Processing {filename}...")
-        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-            for line in f:
-                product = json.loads(line)
-                product_types = product.get('product_type', [])
-                types = []
-                # product_type could be list of dicts or string
-                if isinstance(product_types, list):
-                    types = [pt.get('value', '').lower() for pt in product_types if isinstance(pt, dict)]
-                elif isinstance(product_types, str):
-                    types = [product_types.lower()]
-                # Filter for shoes
-                if any('shoe' in t for t in types):
-                    shoe_products.append({
-                        'item_id': product.get('item_id'),
-                        'product_type': types,
-                        'item_name': product.get('item_name'),
-                        'main_image_id': product.get('main_image_id'),
-                        'other_image_id': product.get('other_image_id', [])
-                    })
-
-print(f"Found {len(shoe_products)} shoe products.")
-
-half_length = len(shoe_products) // 2
-shoe_products_half = shoe_products[:half_length]
-
-with open('../../data/testSet1/limited2_shoe_products.json', 'w') as f:
-    json.dump(shoe_products_half, f, indent=2)
-
-print(f"Saved half ({half_length}) of the shoe products metadata to 'limited2_shoe_products.json'")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The manifest format is shared with the app, which owns its reader and writer (app/manifest_io.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "2_cnn_fais_soln"))
+
+from app.manifest_io import RecordWriter, iter_records  # noqa: E402,F401